@@ -0,0 +1,56 @@
+import os
+import sys
+import json
+
+# 默认配置
+DEFAULT_API_URL = "https://api.deepseek.com/v1"
+DEFAULT_MODEL = "deepseek-chat"
+DEFAULT_CHATLOG_URL = "http://127.0.0.1:5030/api/v1"
+
+# 高级设置的默认值
+DEFAULT_CHUNK_TOKEN_BUDGET = 60000
+DEFAULT_MAX_CONCURRENCY = 4
+DEFAULT_CHATLOG_CACHE_MAX_MB = 512
+DEFAULT_SUMMARY_CACHE_MAX_MB = 64
+DEFAULT_SUMMARY_CACHE_MAX_DAYS = 30
+DEFAULT_HTTP_POOL_SIZE = 10
+DEFAULT_HTTP_MAX_RETRIES = 3
+DEFAULT_CHATLOG_FETCH_CONCURRENCY = 4
+DEFAULT_CHATLOG_SHARD_RETRIES = 2
+DEFAULT_BATCH_REQUESTS_PER_MINUTE = 60
+DEFAULT_COMPACT_TRANSCRIPT = True
+# 每百万token的价格（元），用于发送前估算费用；费用预算为0时不限制
+DEFAULT_INPUT_PRICE_PER_M = 2.0
+DEFAULT_OUTPUT_PRICE_PER_M = 8.0
+DEFAULT_COST_BUDGET = 0.0
+
+
+def get_app_dir():
+    """获取程序所在目录，兼容开发环境和打包后的环境"""
+    if getattr(sys, 'frozen', False):
+        # 打包后的环境
+        return os.path.dirname(sys.executable)
+    # 开发环境
+    return os.path.dirname(os.path.abspath(__file__))
+
+
+def get_config_path():
+    """获取配置文件路径，兼容开发环境和打包后的环境"""
+    return os.path.join(get_app_dir(), "config.json")
+
+
+def get_data_path(filename):
+    """获取与config.json同目录的数据文件路径"""
+    return os.path.join(get_app_dir(), filename)
+
+
+def load_config_file():
+    """读取config.json，文件不存在或格式错误时返回空字典"""
+    config_path = get_config_path()
+    if not os.path.exists(config_path):
+        return {}
+    try:
+        with open(config_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception:
+        return {}
@@ -0,0 +1,305 @@
+import os
+from datetime import datetime
+
+from PyQt5.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QLabel, QLineEdit, QPushButton,
+                             QListView, QTableWidget, QTableWidgetItem, QGroupBox, QFormLayout,
+                             QDateEdit, QSpinBox, QFileDialog, QMessageBox, QHeaderView,
+                             QAbstractItemView)
+from PyQt5.QtCore import Qt
+
+from app_config import (get_data_path, DEFAULT_BATCH_REQUESTS_PER_MINUTE, DEFAULT_CHATLOG_CACHE_MAX_MB,
+                        DEFAULT_SUMMARY_CACHE_MAX_MB, DEFAULT_SUMMARY_CACHE_MAX_DAYS)
+from batch_summary import BatchItem, STATUS_PENDING, STATUS_FETCHING, STATUS_SUMMARIZING
+from chatlog_cache import get_chatlog_cache
+from contact_model import ContactListModel
+from summary_cache import get_summary_cache
+from workers import BatchSummaryThread
+
+TABLE_HEADERS = ["名称", "状态", "获取耗时", "总结耗时", "聊天记录tokens(估算)", "输入tokens", "输出tokens"]
+ACTIVE_STATUSES = (STATUS_PENDING, STATUS_FETCHING, STATUS_SUMMARIZING)
+
+
+class BatchSummaryDialog(QDialog):
+    """批量总结对话框：选择多个联系人和日期范围，批量总结并写入输出目录"""
+    def __init__(self, parent, contact_store, contact_index, prompt, config,
+                 start_date, end_date):
+        super().__init__(parent)
+        self.setWindowTitle("批量总结")
+        self.setMinimumWidth(1200)
+        self.setMinimumHeight(800)
+
+        # 索引存在时使用索引对应的联系人列表，保证行号一致
+        self.contact_store = contact_index.store if contact_index is not None else contact_store
+        self.contact_index = contact_index
+        self.prompt = prompt
+        self.config = config
+        self.items = []
+        self.batch_thread = None
+
+        layout = QVBoxLayout(self)
+
+        # 联系人选择和批量列表
+        top_layout = QHBoxLayout()
+
+        contact_group = QGroupBox("选择联系人")
+        contact_layout = QVBoxLayout(contact_group)
+        self.search_input = QLineEdit()
+        self.search_input.setPlaceholderText("输入关键词筛选联系人...")
+        self.search_input.textChanged.connect(self.filter_contacts)
+        self.contact_model = ContactListModel(self)
+        self.contact_model.set_store(self.contact_store)
+        self.contact_view = QListView()
+        self.contact_view.setModel(self.contact_model)
+        self.contact_view.setUniformItemSizes(True)
+        self.contact_view.setSelectionMode(QAbstractItemView.ExtendedSelection)
+        self.contact_view.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.contact_view.doubleClicked.connect(lambda index: self.add_contacts([index]))
+        self.add_button = QPushButton("添加选中 →")
+        self.add_button.clicked.connect(
+            lambda: self.add_contacts(self.contact_view.selectionModel().selectedIndexes()))
+        contact_layout.addWidget(self.search_input)
+        contact_layout.addWidget(self.contact_view)
+        contact_layout.addWidget(self.add_button)
+
+        batch_group = QGroupBox("批量列表")
+        batch_layout = QVBoxLayout(batch_group)
+        self.table = QTableWidget(0, len(TABLE_HEADERS))
+        self.table.setHorizontalHeaderLabels(TABLE_HEADERS)
+        self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.table.horizontalHeader().setSectionResizeMode(0, QHeaderView.Stretch)
+        self.table.verticalHeader().setVisible(False)
+        self.remove_button = QPushButton("移除选中")
+        self.remove_button.clicked.connect(self.remove_selected)
+        batch_layout.addWidget(self.table)
+        batch_layout.addWidget(self.remove_button)
+
+        top_layout.addWidget(contact_group, 1)
+        top_layout.addWidget(batch_group, 2)
+
+        # 批量设置
+        options_group = QGroupBox("批量设置")
+        options_layout = QFormLayout(options_group)
+
+        date_layout = QHBoxLayout()
+        self.start_date_edit = QDateEdit(start_date)
+        self.start_date_edit.setCalendarPopup(True)
+        self.end_date_edit = QDateEdit(end_date)
+        self.end_date_edit.setCalendarPopup(True)
+        date_layout.addWidget(self.start_date_edit)
+        date_layout.addWidget(QLabel("至"))
+        date_layout.addWidget(self.end_date_edit)
+        date_layout.addStretch()
+        options_layout.addRow("日期范围:", date_layout)
+
+        output_layout = QHBoxLayout()
+        default_output = os.path.join(get_data_path("batch_output"),
+                                      datetime.now().strftime("%Y%m%d_%H%M%S"))
+        self.output_dir_input = QLineEdit(default_output)
+        self.browse_button = QPushButton("浏览...")
+        self.browse_button.clicked.connect(self.choose_output_dir)
+        output_layout.addWidget(self.output_dir_input)
+        output_layout.addWidget(self.browse_button)
+        options_layout.addRow("输出目录:", output_layout)
+
+        self.rate_input = QSpinBox()
+        self.rate_input.setRange(1, 6000)
+        self.rate_input.setValue(int(config.get('batch_requests_per_minute',
+                                                DEFAULT_BATCH_REQUESTS_PER_MINUTE)))
+        self.rate_input.setSuffix(" 次/分钟")
+        self.rate_input.setToolTip("发送给DeepSeek的请求速率上限，并发数使用配置页中的最大并发请求数")
+        options_layout.addRow("请求速率上限:", self.rate_input)
+
+        # 按钮和状态
+        button_layout = QHBoxLayout()
+        self.status_label = QLabel("")
+        self.start_button = QPushButton("开始批量总结")
+        self.start_button.clicked.connect(self.start_batch)
+        self.stop_button = QPushButton("停止")
+        self.stop_button.clicked.connect(self.stop_batch)
+        self.stop_button.setEnabled(False)
+        self.close_button = QPushButton("关闭")
+        self.close_button.clicked.connect(self.reject)
+        button_layout.addWidget(self.status_label, 1)
+        button_layout.addWidget(self.start_button)
+        button_layout.addWidget(self.stop_button)
+        button_layout.addWidget(self.close_button)
+
+        layout.addLayout(top_layout, 1)
+        layout.addWidget(options_group)
+        layout.addLayout(button_layout)
+
+        # 设置样式
+        self.setStyleSheet("""
+            QListView, QTableWidget {
+                border: 1px solid #cccccc;
+                border-radius: 4px;
+                background-color: #ffffff;
+            }
+            QPushButton {
+                background-color: #4a86e8;
+                color: white;
+                border: none;
+                padding: 8px 16px;
+                border-radius: 4px;
+                font-weight: bold;
+            }
+            QPushButton:hover {
+                background-color: #3a76d8;
+            }
+            QPushButton:disabled {
+                background-color: #cccccc;
+                color: #666666;
+            }
+        """)
+
+    def filter_contacts(self, text):
+        """筛选可选联系人"""
+        keyword = text.strip()
+        if self.contact_index is not None:
+            self.contact_model.set_rows(self.contact_index.search_rows(keyword))
+            return
+        keyword = keyword.lower()
+        store = self.contact_store
+        self.contact_model.set_rows([
+            row for row in range(len(store))
+            if keyword in store.display_name(row).lower() or keyword in store.user_names[row].lower()
+        ])
+
+    def add_contacts(self, indexes):
+        """将联系人添加到批量列表，已在列表中的联系人不重复添加"""
+        if self.batch_thread is not None:
+            return
+        existing = {item.talker for item in self.items}
+        for index in indexes:
+            contact = index.data(Qt.UserRole)
+            if not contact or contact['userName'] in existing:
+                continue
+            existing.add(contact['userName'])
+            name = contact.get('nickName') or contact.get('remark') or contact['userName']
+            self.items.append(BatchItem(contact['userName'], name))
+            row = self.table.rowCount()
+            self.table.insertRow(row)
+            self.update_row(row, self.items[-1])
+        self.status_label.setText(f"共 {len(self.items)} 个联系人")
+
+    def remove_selected(self):
+        """从批量列表中移除选中的联系人"""
+        if self.batch_thread is not None:
+            return
+        rows = sorted({index.row() for index in self.table.selectedIndexes()}, reverse=True)
+        for row in rows:
+            self.table.removeRow(row)
+            del self.items[row]
+        self.status_label.setText(f"共 {len(self.items)} 个联系人")
+
+    def choose_output_dir(self):
+        path = QFileDialog.getExistingDirectory(self, "选择输出目录", self.output_dir_input.text())
+        if path:
+            self.output_dir_input.setText(path)
+
+    def update_row(self, row, item):
+        """更新批量列表中的一行"""
+        values = [
+            item.name,
+            item.status if not item.error else f"{item.status}: {item.error}",
+            f"{item.fetch_time:.1f}s" if item.fetch_time else "",
+            f"{item.summary_time:.1f}s" if item.summary_time else "",
+            str(item.raw_tokens) if item.raw_tokens else "",
+            self.format_tokens(item, item.input_tokens),
+            self.format_tokens(item, item.output_tokens),
+        ]
+        for column, value in enumerate(values):
+            cell = self.table.item(row, column)
+            if cell is None:
+                cell = QTableWidgetItem()
+                self.table.setItem(row, column, cell)
+            cell.setText(value)
+        if item.output_path:
+            self.table.item(row, 0).setToolTip(item.output_path)
+
+    @staticmethod
+    def format_tokens(item, tokens):
+        """API返回的token数直接显示，估算值（结果来自缓存或尚未收到用量）前面加上“约”"""
+        if not tokens:
+            return ""
+        return f"约 {tokens}" if item.tokens_estimated else str(tokens)
+
+    def start_batch(self):
+        """开始批量总结"""
+        if not self.items:
+            QMessageBox.warning(self, "提示", "请先添加要总结的联系人")
+            return
+        if not self.config.get('api_key'):
+            QMessageBox.warning(self, "配置错误", "请先在配置页面设置DeepSeek API密钥")
+            return
+        output_dir = self.output_dir_input.text().strip()
+        if not output_dir:
+            QMessageBox.warning(self, "提示", "请选择输出目录")
+            return
+
+        start_date = self.start_date_edit.date().toString("yyyy-MM-dd")
+        end_date = self.end_date_edit.date().toString("yyyy-MM-dd")
+        if end_date < start_date:
+            QMessageBox.warning(self, "提示", "结束日期不能早于开始日期")
+            return
+
+        # 重新开始时重置各项状态
+        self.items = [BatchItem(item.talker, item.name) for item in self.items]
+        for row, item in enumerate(self.items):
+            self.update_row(row, item)
+
+        config = dict(self.config)
+        config['batch_requests_per_minute'] = self.rate_input.value()
+        chatlog_cache = get_chatlog_cache()
+        chatlog_cache.max_bytes = config.get('chatlog_cache_max_mb', DEFAULT_CHATLOG_CACHE_MAX_MB) * 1024 * 1024
+        summary_cache = get_summary_cache()
+        summary_cache.max_bytes = config.get('summary_cache_max_mb', DEFAULT_SUMMARY_CACHE_MAX_MB) * 1024 * 1024
+        summary_cache.max_age_days = config.get('summary_cache_max_days', DEFAULT_SUMMARY_CACHE_MAX_DAYS)
+        self.batch_thread = BatchSummaryThread(
+            self.items, start_date, end_date, self.prompt, config, output_dir,
+            chatlog_cache=chatlog_cache, summary_cache=summary_cache
+        )
+        self.batch_thread.item_updated.connect(self.on_item_updated)
+        self.batch_thread.finished_signal.connect(self.on_batch_finished)
+        self.batch_thread.error_signal.connect(self.on_batch_error)
+        self.batch_thread.finished.connect(self.on_thread_finished)
+        self.batch_thread.start()
+
+        self.start_button.setEnabled(False)
+        self.stop_button.setEnabled(True)
+        self.close_button.setEnabled(False)
+        self.status_label.setText("正在批量总结...")
+
+    def on_item_updated(self, index, item):
+        self.update_row(index, item)
+        done = sum(1 for item in self.items if item.status not in ACTIVE_STATUSES)
+        self.status_label.setText(f"已处理 {done}/{len(self.items)}")
+
+    def on_batch_finished(self):
+        output_dir = self.output_dir_input.text().strip()
+        self.status_label.setText(f"批量总结完成，结果已保存到: {output_dir}")
+
+    def on_batch_error(self, error_msg):
+        QMessageBox.critical(self, "批量总结错误", error_msg)
+
+    def on_thread_finished(self):
+        self.batch_thread.deleteLater()
+        self.batch_thread = None
+        self.start_button.setEnabled(True)
+        self.stop_button.setEnabled(False)
+        self.close_button.setEnabled(True)
+
+    def stop_batch(self):
+        """停止批量总结"""
+        if self.batch_thread is not None:
+            self.batch_thread.stop_request()
+            self.stop_button.setEnabled(False)
+            self.status_label.setText("正在停止，等待进行中的请求结束...")
+
+    def reject(self):
+        """批量总结进行中时不允许关闭对话框"""
+        if self.batch_thread is not None:
+            QMessageBox.information(self, "提示", "请先停止批量总结")
+            return
+        super().reject()
@@ -0,0 +1,257 @@
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import chatlog_client
+import deepseek_client
+from app_config import (DEFAULT_CHATLOG_URL, DEFAULT_API_URL, DEFAULT_MODEL,
+                        DEFAULT_CHUNK_TOKEN_BUDGET, DEFAULT_MAX_CONCURRENCY,
+                        DEFAULT_BATCH_REQUESTS_PER_MINUTE, DEFAULT_COMPACT_TRANSCRIPT,
+                        DEFAULT_CHATLOG_FETCH_CONCURRENCY, DEFAULT_HTTP_POOL_SIZE)
+from chunking import estimate_tokens
+from deepseek_client import RateLimiter, SYSTEM_PROMPT
+from map_reduce import MapReduceSummarizer, needs_chunking
+from preflight import check_budget, estimate_summary
+from preprocess import compact_transcript
+from summary_cache import make_summary_key
+from tracing import tracer
+
+STATUS_PENDING = "等待中"
+STATUS_FETCHING = "获取聊天记录"
+STATUS_SUMMARIZING = "总结中"
+STATUS_DONE = "已完成"
+STATUS_CACHED = "已完成（缓存）"
+STATUS_EMPTY = "无聊天记录"
+STATUS_FAILED = "失败"
+STATUS_CANCELLED = "已取消"
+
+REPORT_FILENAME = "batch_report.json"
+
+
+def safe_filename(name):
+    """去掉文件名中不允许的字符"""
+    name = re.sub(r'[\\/:*?"<>|\r\n\t]+', "_", name).strip(" .")
+    return name[:80] or "unnamed"
+
+
+def summarize_transcript(api_key, api_url, model, prompt, chat_content, max_tokens,
+                         max_workers, rate_limiter=None, should_stop=None, on_usage=None):
+    """总结一段聊天记录并返回完整结果，超出token预算时分段总结；被停止时返回None
+
+    on_usage(usage) 接收每次请求返回的token用量。
+    """
+    if needs_chunking(prompt, chat_content, max_tokens):
+        summarizer = MapReduceSummarizer(api_key, api_url, model, max_tokens, max_workers,
+                                         should_stop=should_stop, rate_limiter=rate_limiter,
+                                         on_usage=on_usage)
+        return summarizer.summarize(prompt, chat_content)
+
+    if rate_limiter is not None and not rate_limiter.acquire(should_stop):
+        return None
+    if should_stop and should_stop():
+        return None
+    messages = deepseek_client.build_messages(prompt, chat_content)
+    return deepseek_client.chat_completion(api_key, api_url, model, messages, on_usage=on_usage)
+
+
+class BatchItem:
+    """批量总结中的一项：一个联系人或群聊"""
+    __slots__ = ("talker", "name", "status", "fetch_time", "summary_time", "raw_tokens",
+                 "input_tokens", "output_tokens", "tokens_estimated", "output_path", "error")
+
+    def __init__(self, talker, name=""):
+        self.talker = talker
+        self.name = name or talker
+        self.status = STATUS_PENDING
+        self.fetch_time = 0.0
+        self.summary_time = 0.0
+        self.raw_tokens = 0  # 精简前聊天记录的估算token数
+        self.input_tokens = 0  # API返回的输入/输出token数，分段总结时为各次请求之和
+        self.output_tokens = 0
+        self.tokens_estimated = False  # 结果来自缓存或还没有收到用量时为估算值
+        self.output_path = ""
+        self.error = ""
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class BatchSummaryJob:
+    """批量总结：并发获取多个联系人的聊天记录，再通过受限的线程池和速率限制进行总结
+
+    结果按联系人写入输出目录，并生成汇总报告 batch_report.json。
+    on_update(index, item) 在每一项状态变化时调用（在工作线程中执行）。
+    """
+
+    def __init__(self, items, start_date, end_date, prompt, config, output_dir,
+                 on_update=None, should_stop=None, chatlog_cache=None, summary_cache=None):
+        self.items = items
+        self.start_date = start_date
+        self.end_date = end_date
+        self.prompt = prompt
+        self.output_dir = output_dir
+        self.on_update = on_update
+        self.should_stop = should_stop or (lambda: False)
+        self.chatlog_cache = chatlog_cache
+        self.summary_cache = summary_cache
+
+        self.base_url = config.get('chatlog_service_url') or DEFAULT_CHATLOG_URL
+        self.api_key = config.get('api_key', '')
+        self.api_url = config.get('api_url') or DEFAULT_API_URL
+        self.model = config.get('model') or DEFAULT_MODEL
+        self.max_tokens = config.get('chunk_token_budget', DEFAULT_CHUNK_TOKEN_BUDGET)
+        self.max_workers = max(1, config.get('max_concurrency', DEFAULT_MAX_CONCURRENCY))
+        self.compact = config.get('compact_transcript', DEFAULT_COMPACT_TRANSCRIPT)
+        # 外层线程池同时获取多个联系人，每个联系人按天分片获取的并发数按连接池大小平分，
+        # 避免同时进行的请求数超过连接池
+        pool_size = config.get('http_pool_size', DEFAULT_HTTP_POOL_SIZE)
+        self.fetch_workers = max(1, min(config.get('chatlog_fetch_concurrency', DEFAULT_CHATLOG_FETCH_CONCURRENCY),
+                                        pool_size // self.max_workers))
+        self.config = config
+        self.rate_limiter = RateLimiter(
+            config.get('batch_requests_per_minute', DEFAULT_BATCH_REQUESTS_PER_MINUTE))
+        self._usage_lock = threading.Lock()
+
+    def _update(self, index, status=None):
+        item = self.items[index]
+        if status is not None:
+            item.status = status
+        if self.on_update:
+            self.on_update(index, item)
+
+    def _fetch(self, index):
+        item = self.items[index]
+        self._update(index, STATUS_FETCHING)
+        started = time.perf_counter()
+        with tracer.span("batch.fetch", "batch", talker=item.talker) as span:
+            content = chatlog_client.fetch_chatlog_cached(
+                self.base_url, item.talker, self.start_date, self.end_date, self.chatlog_cache,
+                self.fetch_workers, self.should_stop)
+            span.args["chars"] = len(content)
+        item.fetch_time = time.perf_counter() - started
+        return content
+
+    def _summarize(self, index, chat_content):
+        item = self.items[index]
+        item.raw_tokens = estimate_tokens(chat_content)
+        if self.compact:
+            chat_content, _ = compact_transcript(chat_content)
+        # 发送前先显示估算值，收到API返回的用量后替换为实际值
+        item.input_tokens = estimate_tokens(self.prompt) + estimate_tokens(chat_content)
+        item.output_tokens = 0
+        item.tokens_estimated = True
+        self._update(index, STATUS_SUMMARIZING)
+        started = time.perf_counter()
+
+        summary_key = make_summary_key(chat_content, self.prompt, SYSTEM_PROMPT, self.model)
+        summary = self.summary_cache.get(summary_key) if self.summary_cache is not None else None
+        status = STATUS_CACHED
+        if summary is None:
+            # 预计费用超出预算时不发送请求，该项记为失败
+            check_budget(estimate_summary(self.prompt, chat_content, self.config), self.config)
+            # 外层线程池已经按最大并发数总结多个联系人，分段总结内部使用1个并发，
+            # 避免同时进行的请求数成倍增加
+            summary = summarize_transcript(
+                self.api_key, self.api_url, self.model, self.prompt, chat_content,
+                self.max_tokens, 1, self.rate_limiter, self.should_stop,
+                on_usage=lambda usage: self._add_usage(index, usage))
+            if summary is None:
+                self._update(index, STATUS_CANCELLED)
+                return
+            if self.summary_cache is not None:
+                self.summary_cache.put(summary_key, self.model, summary)
+            status = STATUS_DONE
+
+        item.summary_time = time.perf_counter() - started
+        if item.tokens_estimated:
+            item.output_tokens = estimate_tokens(summary)
+        item.output_path = self._write_result(item, summary)
+        self._update(index, status)
+
+    def _add_usage(self, index, usage):
+        """累加API返回的token用量（分段总结的请求在多个线程中返回）"""
+        item = self.items[index]
+        with self._usage_lock:
+            if item.tokens_estimated:
+                item.input_tokens = item.output_tokens = 0
+                item.tokens_estimated = False
+            item.input_tokens += usage.get('prompt_tokens', 0) or 0
+            item.output_tokens += usage.get('completion_tokens', 0) or 0
+        self._update(index)
+
+    def _write_result(self, item, summary):
+        if self.start_date == self.end_date:
+            date_text = self.start_date
+        else:
+            date_text = f"{self.start_date}_{self.end_date}"
+        # 不同联系人或群聊可能同名，文件名加上微信号避免互相覆盖
+        path = os.path.join(self.output_dir,
+                            f"{safe_filename(item.name)}_{safe_filename(item.talker)}_{date_text}.txt")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(f"联系人: {item.name} ({item.talker})\n")
+            f.write(f"日期: {chatlog_client.build_date_param(self.start_date, self.end_date)}\n")
+            f.write(f"模型: {self.model}\n\n")
+            f.write(summary)
+        return path
+
+    def _fail(self, index, error):
+        self.items[index].error = str(error)
+        self._update(index, STATUS_FAILED)
+
+    def _summarize_safely(self, index, chat_content):
+        try:
+            with tracer.span("batch.summarize", "batch", talker=self.items[index].talker):
+                self._summarize(index, chat_content)
+        except Exception as e:
+            self._fail(index, e)
+
+    def run(self):
+        """执行批量总结，返回全部项"""
+        os.makedirs(self.output_dir, exist_ok=True)
+
+        fetch_pool = ThreadPoolExecutor(max_workers=self.max_workers)
+        summary_pool = ThreadPoolExecutor(max_workers=self.max_workers)
+        try:
+            fetch_futures = {fetch_pool.submit(self._fetch, index): index
+                             for index in range(len(self.items))}
+            summary_futures = []
+            for future in as_completed(fetch_futures):
+                index = fetch_futures[future]
+                if self.should_stop():
+                    break
+                try:
+                    chat_content = future.result()
+                except Exception as e:
+                    self._fail(index, e)
+                    continue
+                if not chat_content.strip():
+                    self._update(index, STATUS_EMPTY)
+                    continue
+                summary_futures.append(summary_pool.submit(self._summarize_safely, index, chat_content))
+
+            for future in summary_futures:
+                future.result()
+        finally:
+            fetch_pool.shutdown(wait=False, cancel_futures=True)
+            summary_pool.shutdown(wait=True, cancel_futures=True)
+
+        for index, item in enumerate(self.items):
+            if item.status in (STATUS_PENDING, STATUS_FETCHING, STATUS_SUMMARIZING):
+                self._update(index, STATUS_CANCELLED)
+
+        self._write_report()
+        return self.items
+
+    def _write_report(self):
+        report = {
+            "start_date": self.start_date,
+            "end_date": self.end_date,
+            "model": self.model,
+            "prompt": self.prompt,
+            "items": [item.to_dict() for item in self.items],
+        }
+        with open(os.path.join(self.output_dir, REPORT_FILENAME), "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=4)
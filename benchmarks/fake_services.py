@@ -0,0 +1,262 @@
+"""本地模拟的chatlog服务和DeepSeek API，用于基准测试，不需要真实服务和API密钥
+
+两个服务都使用固定的随机种子生成数据，同样的参数每次生成的联系人和聊天记录都相同。
+"""
+import json
+import random
+import threading
+import time
+import urllib.parse
+from datetime import date, timedelta
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+_SURNAMES = "张王李赵刘陈杨黄周吴徐孙胡朱高林何郭马罗梁宋郑谢韩唐冯于董萧程曹袁邓许傅沈曾彭吕苏卢蒋蔡贾丁魏薛叶阎"
+_GIVEN = "伟芳娜敏静丽强磊军洋勇艳杰娟涛明超秀霞平刚桂英华建国文辉力鹏飞宇浩然子轩欣怡梓涵"
+_GROUP_TOPICS = ["技术交流", "产品讨论", "周末爬山", "读书分享", "家长", "同学会", "篮球", "投资理财", "摄影", "前端开发"]
+_PHRASES = [
+    "今天的会议改到下午三点", "这个需求下周一之前要上线", "有人知道这个报错怎么解决吗",
+    "我觉得这个方案可以再优化一下", "收到", "好的，没问题", "哈哈哈哈", "晚上一起吃饭吗",
+    "文档已经更新了，大家看一下", "这个版本的性能比上一个好很多", "明天记得带电脑",
+    "数据库连接池满了，先重启一下服务", "周报记得周五前交", "周末天气不错，适合出去走走",
+    "这个问题我来跟进", "刚刚看了一下日志，是超时导致的", "PR已经提了，帮忙review一下",
+]
+_MEDIA = ["[图片]", "[语音]", "[视频]", "[文件]", "[动画表情]"]
+_SYSTEM = ['"{name}" 撤回了一条消息', '"{name}" 拍了拍 "{other}"', '"{name}"邀请"{other}"加入了群聊']
+
+
+def _name(rng):
+    return rng.choice(_SURNAMES) + "".join(rng.choice(_GIVEN) for _ in range(rng.randint(1, 2)))
+
+
+def generate_contacts(count, seed=0):
+    """生成联系人列表：约十分之一是群聊，其余是好友（部分带备注）"""
+    rng = random.Random(seed)
+    contacts = []
+    for i in range(count):
+        if i % 10 == 0:
+            topic = rng.choice(_GROUP_TOPICS)
+            contacts.append({"userName": f"{1000000 + i}@chatroom", "nickName": f"{topic}群{i}", "remark": ""})
+        else:
+            remark = _name(rng) if rng.random() < 0.3 else ""
+            contacts.append({"userName": f"wxid_{i:08x}", "nickName": _name(rng), "remark": remark})
+    return contacts
+
+
+def generate_day_log(talker, day, messages, seed=0):
+    """生成一个联系人一天的聊天记录（chatlog纯文本格式）"""
+    rng = random.Random(f"{seed}:{talker}:{day}")
+    members = [(_name(rng), f"wxid_m{rng.randrange(16 ** 8):08x}") for _ in range(rng.randint(3, 30))]
+    forward = "转发：" + "，".join(rng.choice(_PHRASES) for _ in range(20))
+    lines = []
+    seconds = 8 * 3600
+    step = max(1, 14 * 3600 // max(1, messages))
+    for _ in range(messages):
+        seconds += rng.randint(1, step * 2 - 1) if step > 1 else 1
+        clock = f"{min(seconds // 3600, 23):02d}:{seconds // 60 % 60:02d}:{seconds % 60:02d}"
+        name, wxid = rng.choice(members)
+        roll = rng.random()
+        if roll < 0.7:
+            content = "，".join(rng.choice(_PHRASES) for _ in range(rng.randint(1, 3)))
+        elif roll < 0.85:
+            content = rng.choice(_MEDIA)
+        elif roll < 0.9:
+            content = forward
+        elif roll < 0.95:
+            content = rng.choice(_SYSTEM).format(name=name, other=rng.choice(members)[0])
+            name, wxid = "系统消息", ""
+        else:
+            content = "\n".join(rng.choice(_PHRASES) for _ in range(rng.randint(2, 5)))
+        header = f"{name}({wxid}) {day} {clock}" if wxid else f"{name} {day} {clock}"
+        lines.append(f"{header}\n{content}\n")
+    return "\n".join(lines)
+
+
+class _ServiceHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status, body, content_type="application/json; charset=utf-8"):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class _ChatlogHandler(_ServiceHandler):
+    def do_GET(self):
+        service = self.server.service
+        url = urllib.parse.urlparse(self.path)
+        query = urllib.parse.parse_qs(url.query)
+        time.sleep(service.latency)
+        service.count_request()
+        if url.path.endswith("/contact"):
+            keyword = query.get("keyword", [""])[0]
+            items = [contact for contact in service.contacts
+                     if not keyword or any(keyword in contact[key] for key in ("userName", "nickName", "remark"))]
+            self._send(200, json.dumps({"items": items}, ensure_ascii=False).encode("utf-8"))
+        elif url.path.endswith("/chatlog"):
+            start, _, end = query.get("time", [""])[0].partition("~")
+            talker = query.get("talker", [""])[0]
+            text = service.chatlog(talker, start, end or start)
+            self._send(200, text.encode("utf-8"), "text/plain; charset=utf-8")
+        else:
+            self._send(404, b"not found", "text/plain")
+
+
+class _DeepSeekHandler(_ServiceHandler):
+    def do_POST(self):
+        service = self.server.service
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        service.count_request()
+        usage = service.usage(body["messages"])
+        time.sleep(service.first_token_latency)
+        tokens = [service.token_text] * service.output_tokens
+
+        if not body.get("stream"):
+            time.sleep(len(tokens) / service.tokens_per_second)
+            result = {"choices": [{"message": {"role": "assistant", "content": "".join(tokens)},
+                                   "finish_reason": "stop"}], "usage": usage}
+            self._send(200, json.dumps(result, ensure_ascii=False).encode("utf-8"))
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def write(data):
+            self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+            self.wfile.flush()
+
+        # 按token速率分批写出，每批约 STREAM_INTERVAL 秒
+        started = time.perf_counter()
+        sent = 0
+        while sent < len(tokens):
+            due = min(len(tokens), int((time.perf_counter() - started) * service.tokens_per_second) + 1)
+            events = []
+            for token in tokens[sent:due]:
+                chunk = {"choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}]}
+                events.append(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n")
+            if events:
+                write("".join(events).encode("utf-8"))
+                sent = due
+            time.sleep(service.STREAM_INTERVAL)
+        finish = {"choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}
+        write(f"data: {json.dumps(finish)}\n\ndata: {json.dumps({'choices': [], 'usage': usage})}\n\n"
+              f"data: [DONE]\n\n".encode("utf-8"))
+        write(b"")
+
+
+class _Service:
+    handler = None
+
+    def __init__(self):
+        self._server = None
+        self._lock = threading.Lock()
+        self.requests = 0
+
+    def count_request(self):
+        with self._lock:
+            self.requests += 1
+
+    def start(self):
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self.handler)
+        self._server.daemon_threads = True
+        self._server.service = self
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    @property
+    def port(self):
+        return self._server.server_address[1]
+
+
+class FakeChatlogService(_Service):
+    """模拟chatlog服务的 /api/v1/contact 和 /api/v1/chatlog 接口
+
+    contacts 为联系人数，messages_per_day 为每个联系人每天的消息数，latency 为每个请求的延迟（秒）。
+    """
+    handler = _ChatlogHandler
+
+    def __init__(self, contacts=2000, messages_per_day=500, latency=0.02, seed=0):
+        super().__init__()
+        self.contacts = generate_contacts(contacts, seed)
+        self.messages_per_day = messages_per_day
+        self.latency = latency
+        self.seed = seed
+        self._days = {}
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.port}/api/v1"
+
+    def day_log(self, talker, day):
+        key = (talker, day)
+        with self._lock:
+            text = self._days.get(key)
+        if text is None:
+            text = generate_day_log(talker, day, self.messages_per_day, self.seed)
+            with self._lock:
+                self._days[key] = text
+        return text
+
+    def chatlog(self, talker, start, end):
+        """日期范围内的聊天记录，多天时按天拼接"""
+        day = date.fromisoformat(start)
+        last = date.fromisoformat(end)
+        parts = []
+        while day <= last:
+            parts.append(self.day_log(talker, day.isoformat()))
+            day += timedelta(days=1)
+        return "\n".join(parts)
+
+
+class FakeDeepSeekService(_Service):
+    """模拟DeepSeek的 /chat/completions 接口，支持流式和非流式请求
+
+    first_token_latency 为收到请求到输出第一个token的延迟（秒），tokens_per_second 为输出速度，
+    output_tokens 为每次回复的token数。与上一次请求相同的前缀按上下文缓存命中计算。
+    """
+    handler = _DeepSeekHandler
+    STREAM_INTERVAL = 0.02
+    token_text = "总结"
+
+    def __init__(self, first_token_latency=0.3, tokens_per_second=50, output_tokens=200):
+        super().__init__()
+        self.first_token_latency = first_token_latency
+        self.tokens_per_second = tokens_per_second
+        self.output_tokens = output_tokens
+        self._last_prompt = ""
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.port}"
+
+    def usage(self, messages):
+        """按输入字数估算usage，输入开头与上一次请求相同的部分算作缓存命中"""
+        prompt = "".join(message.get("content", "") for message in messages)
+        with self._lock:
+            last, self._last_prompt = self._last_prompt, prompt
+        # 二分查找公共前缀长度，几MB的输入也只需要比较几十次
+        low, high = 0, min(len(prompt), len(last))
+        while low < high:
+            middle = (low + high + 1) // 2
+            if prompt[:middle] == last[:middle]:
+                low = middle
+            else:
+                high = middle - 1
+        common = low
+        prompt_tokens = len(prompt) // 2 + 1
+        hit = common // 2
+        return {"prompt_tokens": prompt_tokens, "completion_tokens": self.output_tokens,
+                "total_tokens": prompt_tokens + self.output_tokens,
+                "prompt_cache_hit_tokens": hit, "prompt_cache_miss_tokens": prompt_tokens - hit}
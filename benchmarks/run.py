@@ -0,0 +1,454 @@
+"""基准测试：在本地模拟的chatlog服务和DeepSeek API上测量各操作的耗时和内存峰值
+
+不需要真实的chatlog服务和API密钥，同样的参数每次使用相同的数据，结果可以前后对比。
+在项目根目录运行：
+    python -m benchmarks.run
+    python -m benchmarks.run --contacts 20000 --messages-per-day 5000 --days 7 --repeat 10
+    python -m benchmarks.run --output after.json --baseline before.json
+"""
+import argparse
+import gc
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+import chatlog_client
+import deepseek_client
+from app_config import DEFAULT_CHATLOG_FETCH_CONCURRENCY, DEFAULT_MAX_CONCURRENCY
+from batch_summary import summarize_transcript
+from chat_parser import parse_chatlog
+from chat_search import ChatSearchIndex
+from chatlog_cache import ChatlogCache
+from contact_index import ContactStore, ContactIndex
+from preprocess import compact_chatlog
+from prompts import DEFAULT_PROMPT
+
+from benchmarks.fake_services import FakeChatlogService, FakeDeepSeekService
+
+# 模拟输入联系人搜索关键词时逐字输入的内容
+SEARCH_QUERIES = ["技术交流", "zhang", "zs", "wxid_0000", "周末爬山群", "lxm"]
+# 分段总结场景使用的分段token上限，让几天的聊天记录分成多段
+MAP_REDUCE_CHUNK_TOKENS = 8000
+# 全文搜索场景缓存的联系人数和搜索的关键词（三个字及以上使用索引，两个字按子串扫描）
+SEARCH_INDEX_TALKERS = 5
+FULL_TEXT_QUERIES = ["数据库连接池", "review", "爬山", "不存在的内容"]
+FAKE_API_KEY = "sk-benchmark"
+FAKE_MODEL = "deepseek-chat"
+
+
+def percentile(values, fraction):
+    """按最近秩取分位数"""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+class Scenario:
+    """一个场景的测量结果：每次运行的耗时（秒）、内存分配峰值（字节）和附加信息"""
+
+    def __init__(self, name):
+        self.name = name
+        self.samples = []
+        self.peak_bytes = None
+        self.extra = {}
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "runs": len(self.samples),
+            "p50_ms": round(percentile(self.samples, 0.5) * 1000, 2),
+            "p95_ms": round(percentile(self.samples, 0.95) * 1000, 2),
+            "max_ms": round(max(self.samples) * 1000, 2),
+            "peak_mb": round(self.peak_bytes / 1024 / 1024, 2) if self.peak_bytes is not None else None,
+            "extra": self.extra,
+        }
+
+
+def measure_peak(func):
+    """用tracemalloc测量一次运行中Python对象分配的峰值"""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def run_scenario(name, func, repeat, warmup=1, setup=None):
+    """先预热，再计时运行repeat次，最后单独运行一次测量内存峰值（tracemalloc会拖慢运行，不计入耗时）
+
+    setup 在每次运行前调用且不计时，func 的返回值（字典）作为附加信息。
+    """
+    scenario = Scenario(name)
+    for _ in range(warmup):
+        if setup:
+            setup()
+        func()
+    for _ in range(repeat):
+        if setup:
+            setup()
+        started = time.perf_counter()
+        extra = func()
+        scenario.samples.append(time.perf_counter() - started)
+        if extra:
+            scenario.extra = extra
+    if setup:
+        setup()
+    scenario.peak_bytes = measure_peak(func)
+    return scenario
+
+
+class Benchmark:
+    """启动模拟服务并依次运行各场景"""
+
+    def __init__(self, args):
+        self.args = args
+        self.results = []
+        self.chatlog_service = FakeChatlogService(args.contacts, args.messages_per_day,
+                                                  args.chatlog_latency, args.seed).start()
+        self.deepseek_service = FakeDeepSeekService(args.first_token_latency, args.tokens_per_second,
+                                                    args.output_tokens).start()
+        self.base_url = self.chatlog_service.url
+        self.api_url = self.deepseek_service.url
+        # 固定的历史日期范围，避免“今天”的数据不写入缓存
+        self.end_date = date(2024, 3, 31)
+        self.start_date = self.end_date - timedelta(days=args.days - 1)
+        # 数据量最大的联系人是群聊，取第一个群聊
+        self.talker = self.chatlog_service.contacts[0]["userName"]
+        self.temp_dir = tempfile.TemporaryDirectory(prefix="chatlog_bench_", ignore_cleanup_errors=True)
+        # 预先生成模拟数据，不把服务端生成数据的时间算进请求耗时
+        self.chatlog_service.chatlog(self.talker, self.start_date.isoformat(), self.end_date.isoformat())
+
+    def close(self):
+        self.chatlog_service.stop()
+        self.deepseek_service.stop()
+        self.temp_dir.cleanup()
+
+    def add(self, scenario):
+        self.results.append(scenario)
+        result = scenario.to_dict()
+        print(f"  {result['name']:<32} p50 {result['p50_ms']:>10.2f} ms   p95 {result['p95_ms']:>10.2f} ms",
+              file=sys.stderr, flush=True)
+
+    def fetch_text(self, cache=None, max_workers=DEFAULT_CHATLOG_FETCH_CONCURRENCY):
+        return chatlog_client.fetch_chatlog_cached(self.base_url, self.talker, self.start_date.isoformat(),
+                                                   self.end_date.isoformat(), cache, max_workers)
+
+    def bench_contacts(self):
+        contacts = []
+
+        def load():
+            contacts[:] = chatlog_client.fetch_contacts(self.base_url)
+            return {"contacts": len(contacts)}
+
+        self.add(run_scenario("contacts.load", load, self.args.repeat))
+
+        def build_index():
+            ContactIndex(ContactStore(contacts))
+
+        self.add(run_scenario("contacts.index", build_index, self.args.repeat))
+
+        # 逐字输入：每次按键是一个样本，和界面中的增量搜索一致
+        index = ContactIndex(ContactStore(contacts))
+        scenario = Scenario("contacts.search_keystroke")
+        for _ in range(self.args.repeat):
+            for query in SEARCH_QUERIES:
+                index.search_rows("")
+                for length in range(1, len(query) + 1):
+                    started = time.perf_counter()
+                    rows = index.search_rows(query[:length])
+                    scenario.samples.append(time.perf_counter() - started)
+                    scenario.extra[query] = len(rows)
+
+        def search_all():
+            for query in SEARCH_QUERIES:
+                index.search_rows("")
+                for length in range(1, len(query) + 1):
+                    index.search_rows(query[:length])
+
+        scenario.peak_bytes = measure_peak(search_all)
+        self.add(scenario)
+
+    def bench_fetch(self):
+        def fetch_single_day():
+            text = chatlog_client.fetch_chatlog(self.base_url, self.talker, self.end_date.isoformat(),
+                                                self.end_date.isoformat())
+            return {"chars": len(text)}
+
+        self.add(run_scenario("chatlog.fetch_one_day", fetch_single_day, self.args.repeat))
+
+        def fetch_serial():
+            return {"chars": len(self.fetch_text(max_workers=1))}
+
+        def fetch_parallel():
+            return {"chars": len(self.fetch_text())}
+
+        self.add(run_scenario(f"chatlog.fetch_{self.args.days}_days_serial", fetch_serial, self.args.repeat))
+        self.add(run_scenario(f"chatlog.fetch_{self.args.days}_days_parallel", fetch_parallel, self.args.repeat))
+
+        # 本地缓存：冷缓存每次使用新的缓存文件，热缓存复用同一个
+        cache_paths = iter(range(1_000_000))
+        cold_cache = []
+
+        def new_cache():
+            path = os.path.join(self.temp_dir.name, f"cold_{next(cache_paths)}.db")
+            cold_cache[:] = [ChatlogCache(path)]
+
+        def fetch_cold():
+            self.fetch_text(cold_cache[0])
+
+        self.add(run_scenario("chatlog.fetch_cache_cold", fetch_cold, self.args.repeat, setup=new_cache))
+
+        warm_cache = ChatlogCache(os.path.join(self.temp_dir.name, "warm.db"))
+        self.fetch_text(warm_cache)
+
+        def fetch_warm():
+            requests_before = self.chatlog_service.requests
+            self.fetch_text(warm_cache)
+            return {"requests": self.chatlog_service.requests - requests_before}
+
+        self.add(run_scenario("chatlog.fetch_cache_warm", fetch_warm, self.args.repeat))
+
+    def bench_parse(self):
+        text = self.fetch_text()
+        holder = []
+
+        def parse():
+            holder[:] = [parse_chatlog(text)]
+            return {"messages": len(holder[0]), "chars": len(text)}
+
+        self.add(run_scenario("chatlog.parse", parse, self.args.repeat))
+
+        def compact():
+            compacted, stats = compact_chatlog(holder[0])
+            return {"tokens_before": stats["tokens_before"], "tokens_after": stats["tokens_after"]}
+
+        self.add(run_scenario("summary.compact", compact, self.args.repeat))
+        return holder[0]
+
+    def bench_render(self, chatlog):
+        """聊天记录列表的显示：设置数据后第一次绘制，以及逐页滚动到底部"""
+        os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+        try:
+            from PyQt5.QtWidgets import QApplication, QListView
+            from chat_model import ChatLogModel
+        except ImportError as e:
+            print(f"  跳过显示场景（{e}）", file=sys.stderr)
+            return
+
+        app = QApplication.instance() or QApplication(sys.argv[:1])
+        model = ChatLogModel()
+        view = QListView()
+        view.setModel(model)
+        view.setWordWrap(True)
+        view.setResizeMode(QListView.Adjust)
+        view.setVerticalScrollMode(QListView.ScrollPerItem)
+        view.resize(800, 900)
+        view.show()
+        app.processEvents()
+
+        def first_page():
+            model.set_chatlog(chatlog)
+            view.scrollToTop()
+            app.processEvents()
+            view.repaint()
+            return {"rows": model.rowCount()}
+
+        self.add(run_scenario("render.first_page", first_page, self.args.repeat))
+
+        # 每次滚动到底部触发 fetchMore 加载下一页，每一页是一个样本
+        scenario = Scenario("render.scroll_page")
+        pages = 0
+
+        def scroll_to_end(samples=None):
+            model.set_chatlog(chatlog)
+            app.processEvents()
+            count = 0
+            while model.canFetchMore():
+                started = time.perf_counter()
+                view.scrollToBottom()
+                app.processEvents()
+                view.repaint()
+                if samples is not None:
+                    samples.append(time.perf_counter() - started)
+                count += 1
+            return count
+
+        for _ in range(self.args.repeat):
+            pages = scroll_to_end(scenario.samples)
+        if scenario.samples:
+            scenario.extra = {"pages": pages, "messages": len(chatlog)}
+            scenario.peak_bytes = measure_peak(scroll_to_end)
+            self.add(scenario)
+        view.close()
+
+    def bench_summary(self, chatlog):
+        prompt = DEFAULT_PROMPT
+        compacted, _ = compact_chatlog(chatlog)
+
+        # 端到端：获取、解析、精简、发送请求，直到流式输出结束；首字时间单独记录
+        first_token = Scenario("summary.first_token")
+
+        def end_to_end():
+            started = time.perf_counter()
+            text = self.fetch_text()
+            content, _ = compact_chatlog(parse_chatlog(text))
+            messages = deepseek_client.build_messages(prompt, content)
+            first = None
+            output = 0
+            for chunk in deepseek_client.stream_chat_completion(FAKE_API_KEY, self.api_url, FAKE_MODEL, messages):
+                if first is None:
+                    first = time.perf_counter() - started
+                output += len(chunk)
+            first_token.samples.append(first)
+            return {"output_chars": output}
+
+        scenario = run_scenario("summary.end_to_end", end_to_end, self.args.repeat)
+        # 只保留计时运行的首字样本（去掉预热和测量内存的两次）
+        first_token.samples = first_token.samples[1:1 + self.args.repeat]
+        self.add(scenario)
+        self.add(first_token)
+
+        def map_reduce():
+            summary = summarize_transcript(FAKE_API_KEY, self.api_url, FAKE_MODEL, prompt, compacted,
+                                           MAP_REDUCE_CHUNK_TOKENS, self.args.workers)
+            return {"output_chars": len(summary or "")}
+
+        requests_before = self.deepseek_service.requests
+        scenario = run_scenario("summary.map_reduce", map_reduce, self.args.repeat)
+        scenario.extra["requests_per_run"] = (self.deepseek_service.requests - requests_before) // (self.args.repeat + 2)
+        self.add(scenario)
+
+    def bench_search(self):
+        # 多个联系人的多天聊天记录写入缓存，不经过HTTP
+        cache = ChatlogCache(os.path.join(self.temp_dir.name, "search_cache.db"))
+        talkers = [contact["userName"] for contact in self.chatlog_service.contacts[:SEARCH_INDEX_TALKERS]]
+        for talker in talkers:
+            day = self.start_date
+            while day <= self.end_date:
+                cache.put_day(talker, day.isoformat(), self.chatlog_service.day_log(talker, day.isoformat()))
+                day += timedelta(days=1)
+
+        index_paths = iter(range(1_000_000))
+        cold_index = []
+
+        def new_index():
+            cold_index[:] = [ChatSearchIndex(os.path.join(self.temp_dir.name, f"index_{next(index_paths)}.db"))]
+
+        def build():
+            return cold_index[0].sync(cache)
+
+        self.add(run_scenario("search.index_build", build, self.args.repeat, setup=new_index))
+
+        index = ChatSearchIndex(os.path.join(self.temp_dir.name, "index.db"))
+        index.sync(cache)
+        self.add(run_scenario("search.sync_unchanged", lambda: index.sync(cache), self.args.repeat))
+
+        start_day = self.start_date.isoformat()
+        end_day = self.end_date.isoformat()
+        scenario = Scenario("search.query")
+        for _ in range(self.args.repeat):
+            for query in FULL_TEXT_QUERIES:
+                started = time.perf_counter()
+                hits, _ = index.search(query, start_day=start_day, end_day=end_day)
+                scenario.samples.append(time.perf_counter() - started)
+                scenario.extra[query] = len(hits)
+        scenario.peak_bytes = measure_peak(
+            lambda: [index.search(query, start_day=start_day, end_day=end_day) for query in FULL_TEXT_QUERIES])
+        self.add(scenario)
+
+    def run(self):
+        self.bench_contacts()
+        self.bench_fetch()
+        self.bench_search()
+        chatlog = self.bench_parse()
+        self.bench_render(chatlog)
+        self.bench_summary(chatlog)
+
+
+def max_rss_mb():
+    """进程的常驻内存峰值（MB），不支持的平台返回None"""
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 单位为KB，macOS为字节
+    return round(rss / 1024 / (1024 if sys.platform == "darwin" else 1), 1)
+
+
+def print_report(results, baseline=None):
+    baseline = {result["name"]: result for result in (baseline or {}).get("scenarios", [])}
+    header = f"{'场景':<32}{'次数':>6}{'p50(ms)':>12}{'p95(ms)':>12}{'最大(ms)':>12}{'内存峰值(MB)':>14}"
+    if baseline:
+        header += f"{'p50变化':>10}"
+    print(header)
+    for result in results:
+        peak = f"{result['peak_mb']:.2f}" if result["peak_mb"] is not None else "-"
+        line = (f"{result['name']:<32}{result['runs']:>6}{result['p50_ms']:>12.2f}{result['p95_ms']:>12.2f}"
+                f"{result['max_ms']:>12.2f}{peak:>14}")
+        previous = baseline.get(result["name"])
+        if previous and previous["p50_ms"]:
+            line += f"{(result['p50_ms'] / previous['p50_ms'] - 1) * 100:>+9.1f}%"
+        print(line)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="使用本地模拟服务的基准测试")
+    parser.add_argument("--contacts", type=int, default=5000, help="联系人数")
+    parser.add_argument("--messages-per-day", type=int, default=2000, help="每天的消息数")
+    parser.add_argument("--days", type=int, default=7, help="多天获取和总结的天数")
+    parser.add_argument("--repeat", type=int, default=5, help="每个场景计时运行的次数")
+    parser.add_argument("--workers", type=int, default=DEFAULT_MAX_CONCURRENCY, help="分段总结的并发请求数")
+    parser.add_argument("--chatlog-latency", type=float, default=0.02, help="chatlog服务每个请求的延迟（秒）")
+    parser.add_argument("--first-token-latency", type=float, default=0.3, help="DeepSeek首字延迟（秒）")
+    parser.add_argument("--tokens-per-second", type=float, default=200, help="DeepSeek输出速度")
+    parser.add_argument("--output-tokens", type=int, default=200, help="每次回复的token数")
+    parser.add_argument("--seed", type=int, default=0, help="生成模拟数据的随机种子")
+    parser.add_argument("--output", help="把结果保存为JSON文件")
+    parser.add_argument("--baseline", help="与之前保存的JSON结果对比p50")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    benchmark = Benchmark(args)
+    try:
+        benchmark.run()
+    finally:
+        benchmark.close()
+
+    results = [scenario.to_dict() for scenario in benchmark.results]
+    print()
+    print_report(results, baseline)
+    rss = max_rss_mb()
+    if rss is not None:
+        print(f"\n进程常驻内存峰值: {rss} MB")
+
+    if args.output:
+        report = {
+            "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "parameters": {key: value for key, value in vars(args).items() if key not in ("output", "baseline")},
+            "python": sys.version.split()[0],
+            "max_rss_mb": rss,
+            "scenarios": results,
+        }
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"结果已保存到: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
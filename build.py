@@ -4,7 +4,11 @@ import shutil
 from PyInstaller.__main__ import run
 
 def build_app():
-    """打包应用为单个可执行文件"""
+    """打包应用为目录（onedir）
+
+    单文件（onefile）打包每次启动都要先把全部依赖解压到临时目录，启动明显变慢；
+    打包为目录后直接从目录加载，分发时压缩整个目录即可。
+    """
     print("开始打包应用...")
     
     # 清理之前的构建文件
@@ -16,7 +20,7 @@ def build_app():
     # 定义打包参数
     args = [
         '--name=DeepSeek微信聊天记录总结神器',
-        '--onefile',
+        '--onedir',
         '--windowed',
         '--clean',
         '--add-data=icon.svg;.',  # 添加图标文件
@@ -27,7 +31,7 @@ def build_app():
     # 运行PyInstaller
     run(args)
     
-    print("打包完成！可执行文件位于 dist 目录。")
+    print("打包完成！程序目录位于 dist/DeepSeek微信聊天记录总结神器，分发时请压缩整个目录。")
     print("注意：此应用需要外部chatlog服务运行，请确保chatlog服务已启动并配置正确的服务地址。")
 
 if __name__ == "__main__":
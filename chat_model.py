@@ -0,0 +1,150 @@
+from PyQt5.QtCore import Qt, QAbstractListModel, QModelIndex, pyqtSignal
+from PyQt5.QtGui import QColor
+
+from chat_parser import ChatLog, TYPE_SYSTEM, TYPE_STICKER
+
+
+class ChatLogModel(QAbstractListModel):
+    """聊天记录列表模型
+
+    数据来自解析后的 ChatLog，每条消息一行，显示文本在视图绘制时才生成。
+    模型只暴露聊天记录中的一个窗口：滚动到底部时视图通过 fetchMore() 在末尾追加一页，
+    滚动到顶部时由 fetch_previous() 在开头插入一页，窗口超过 MAX_ROWS 时移除另一端的行，
+    因此视图的布局开销与聊天记录的长度无关。
+    """
+
+    PAGE_SIZE = 200
+    MAX_ROWS = 1000
+
+    # 窗口开头插入(正数)或移除(负数)的行数，视图据此保持滚动位置
+    rows_shifted = pyqtSignal(int)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._chatlog = ChatLog()
+        self._start = 0  # 窗口在聊天记录中的起止位置
+        self._end = 0
+        self._message = None  # 加载中、出错等提示信息，显示为一行不可选择的项
+        self._message_error = False
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        if self._message is not None:
+            return 1
+        return self._end - self._start
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        if self._message is not None:
+            if role == Qt.DisplayRole:
+                return self._message
+            if role == Qt.TextAlignmentRole:
+                return Qt.AlignCenter
+            if role == Qt.ForegroundRole and self._message_error:
+                return QColor("red")
+            return None
+
+        message = self._chatlog.messages[self._start + index.row()]
+        if role == Qt.DisplayRole:
+            return f"{message.sender}  {message.time}\n{message.content}"
+        if role == Qt.ToolTipRole:
+            return message.sender_id or message.sender
+        if role == Qt.ForegroundRole and message.type in (TYPE_SYSTEM, TYPE_STICKER):
+            return QColor("#999999")
+        if role == Qt.UserRole:
+            return message
+        return None
+
+    def flags(self, index):
+        if self._message is not None:
+            return Qt.NoItemFlags
+        return super().flags(index)
+
+    def canFetchMore(self, parent=QModelIndex()):
+        if parent.isValid() or self._message is not None:
+            return False
+        return self._end < len(self._chatlog)
+
+    def fetchMore(self, parent=QModelIndex()):
+        """在窗口末尾追加一页"""
+        if not self.canFetchMore(parent):
+            return
+        count = min(self.PAGE_SIZE, len(self._chatlog) - self._end)
+        rows = self._end - self._start
+        self.beginInsertRows(QModelIndex(), rows, rows + count - 1)
+        self._end += count
+        self.endInsertRows()
+
+        excess = self._end - self._start - self.MAX_ROWS
+        if excess > 0:
+            self.beginRemoveRows(QModelIndex(), 0, excess - 1)
+            self._start += excess
+            self.endRemoveRows()
+            self.rows_shifted.emit(-excess)
+
+    def can_fetch_previous(self):
+        return self._message is None and self._start > 0
+
+    def fetch_previous(self):
+        """在窗口开头插入一页"""
+        if not self.can_fetch_previous():
+            return
+        count = min(self.PAGE_SIZE, self._start)
+        self.beginInsertRows(QModelIndex(), 0, count - 1)
+        self._start -= count
+        self.endInsertRows()
+
+        excess = self._end - self._start - self.MAX_ROWS
+        if excess > 0:
+            rows = self._end - self._start
+            self.beginRemoveRows(QModelIndex(), rows - excess, rows - 1)
+            self._end -= excess
+            self.endRemoveRows()
+        self.rows_shifted.emit(count)
+
+    def messages_appended(self, at_bottom=False):
+        """聊天记录末尾追加了消息（边下载边显示）
+
+        窗口还没有填满一页或视图停在底部时立即显示新消息，否则等滚动到底部时再由视图加载。
+        """
+        if self._end - self._start < self.PAGE_SIZE or at_bottom:
+            self.fetchMore()
+
+    def chatlog(self):
+        return self._chatlog
+
+    def set_chatlog(self, chatlog, position=0):
+        """更换显示的聊天记录，窗口从第position条消息附近开始，返回该消息在窗口中的行号"""
+        self.beginResetModel()
+        self._chatlog = chatlog
+        self._start = max(0, min(position - self.PAGE_SIZE // 2, len(chatlog) - self.PAGE_SIZE))
+        self._end = min(len(chatlog), self._start + self.PAGE_SIZE)
+        self._message = None
+        self.endResetModel()
+        return position - self._start
+
+    def set_message(self, text, error=False):
+        """显示一条提示信息，text为空时清空列表"""
+        self.beginResetModel()
+        self._chatlog = ChatLog()
+        self._start = self._end = 0
+        self._message = text or None
+        self._message_error = error
+        self.endResetModel()
+
+    def row_for_position(self, position):
+        """聊天记录中第position条消息在窗口中的行号，不在窗口中时移动窗口"""
+        if self._start <= position < self._end:
+            return position - self._start
+        return self.set_chatlog(self._chatlog, position)
+
+    def position(self, row):
+        """窗口中的行对应聊天记录中的序号"""
+        return self._start + row
+
+    def message_text(self, row):
+        """chatlog纯文本格式的单条消息，用于复制"""
+        message = self._chatlog.messages[self._start + row]
+        return f"{message.header()}\n{message.content}"
@@ -0,0 +1,209 @@
+import html
+import re
+
+from chatlog_client import DAY_SEPARATOR
+from chunking import MESSAGE_HEADER_RE
+
+# 消息类型
+TYPE_TEXT = "text"
+TYPE_MEDIA = "media"  # 只有 [图片]、[语音] 等占位符
+TYPE_STICKER = "sticker"
+TYPE_SYSTEM = "system"  # 撤回、入群、拍一拍等系统通知
+
+_DAY_SEPARATOR_RE = re.compile(
+    "^" + re.escape(DAY_SEPARATOR).replace(r"\{day\}", r"(?P<day>\S+)") + "$")
+_SENDER_RE = re.compile(r'^(?P<name>.*?)\((?P<id>[^()]*)\)$')
+_DATE_RE = re.compile(r'^(?P<day>(?:\d{4}-)?\d{2}-\d{2}) ')
+
+MEDIA_RE = re.compile(r'^\[(?P<kind>图片|语音|视频|文件|位置|名片|小程序|音乐|语音通话|视频通话|通话)\]$')
+_STICKER_RE = re.compile(r'^\[(?:动画表情|表情|表情包|emoji)\]$', re.IGNORECASE)
+# 系统通知中的人名带引号，避免误判正常聊天内容
+_SYSTEM_SENDERS = {"系统消息", "系统通知", "system"}
+_SYSTEM_NOTICE_RE = re.compile(
+    r'^(?:"[^"]*"|你) ?(?:撤回了一条消息|拍了拍|邀请|修改群名为|移出了群聊|退出了群聊|'
+    r'加入了群聊|已成为新群主|通过扫描)|'
+    r'^你已添加了.+现在可以开始聊天了|^以上是打招呼的内容$|与群里其他人都不是朋友关系'
+)
+_HTML_BREAK_RE = re.compile(r'<br\s*/?>|</p\s*>|</div\s*>', re.IGNORECASE)
+_HTML_TAG_RE = re.compile(r'<[^>]+>')
+
+
+def classify_message(sender, content):
+    """根据发送者和内容判断消息类型"""
+    if sender.strip().lower() in _SYSTEM_SENDERS or _SYSTEM_NOTICE_RE.search(content):
+        return TYPE_SYSTEM
+    if _STICKER_RE.match(content):
+        return TYPE_STICKER
+    if MEDIA_RE.match(content):
+        return TYPE_MEDIA
+    return TYPE_TEXT
+
+
+class Message:
+    """一条聊天消息"""
+    __slots__ = ("sender", "sender_id", "day", "time", "type", "content")
+
+    def __init__(self, sender, sender_id, day, time, type, content):
+        self.sender = sender
+        self.sender_id = sender_id
+        self.day = day  # 消息所在日期，来自消息时间或日期分隔行，可能为空
+        self.time = time  # chatlog返回的原始时间，例如 2025-01-01 10:00:00 或 10:00:00
+        self.type = type
+        self.content = content
+
+    def header(self):
+        """chatlog纯文本格式的消息首行"""
+        if self.sender_id:
+            return f"{self.sender}({self.sender_id}) {self.time}"
+        return f"{self.sender} {self.time}"
+
+    def clock(self):
+        """时:分:秒"""
+        return self.time.rsplit(" ", 1)[-1]
+
+
+class ChatLog:
+    """解析后的聊天记录
+
+    发送者等重复出现的字符串只保存一份。to_text() 重新生成chatlog纯文本格式，
+    用于构建提示词和计算缓存键。
+    """
+
+    def __init__(self, messages=None, preamble=""):
+        self.messages = messages if messages is not None else []
+        self.preamble = preamble  # 第一条消息之前无法解析的内容
+
+    def __len__(self):
+        return len(self.messages)
+
+    def __iter__(self):
+        return iter(self.messages)
+
+    def is_empty(self):
+        return not self.messages and not self.preamble.strip()
+
+    def senders(self):
+        """按首次发言顺序返回全部发送者"""
+        return list(dict.fromkeys(message.sender for message in self.messages))
+
+    def filter(self, keyword="", sender="", types=None):
+        """按关键词（匹配内容或发送者）、发送者和消息类型筛选，返回新的ChatLog"""
+        keyword = keyword.strip().lower()
+        messages = [
+            message for message in self.messages
+            if (not sender or message.sender == sender)
+            and (types is None or message.type in types)
+            and (not keyword or keyword in message.content.lower() or keyword in message.sender.lower())
+        ]
+        return ChatLog(messages, self.preamble if not (keyword or sender or types) else "")
+
+    def find_time(self, day, clock):
+        """返回第一条不早于指定日期和时间（HH:MM:SS）的消息序号，全部更早时返回最后一条"""
+        for index, message in enumerate(self.messages):
+            # 消息日期可能省略年份或为空，只比较消息日期中存在的部分
+            target_day = day[len(day) - len(message.day):] if message.day else ""
+            if (message.day, message.clock()) >= (target_day, clock):
+                return index
+        return len(self.messages) - 1
+
+    def to_text(self):
+        """生成chatlog纯文本格式，消息时间不含日期时在日期变化处插入日期分隔行"""
+        parts = [self.preamble] if self.preamble else []
+        day = None
+        for message in self.messages:
+            if message.day and message.day != day:
+                day = message.day
+                if not message.time.startswith(day):
+                    parts.append(DAY_SEPARATOR.format(day=day))
+            parts.append(f"{message.header()}\n{message.content}\n")
+        return "\n".join(parts)
+
+
+class ChatLogParser:
+    """逐段解析chatlog纯文本格式的聊天记录，可以在下载过程中多次调用 feed()"""
+
+    def __init__(self):
+        self.chatlog = ChatLog()
+        self._pending = ""
+        self._day = ""
+        self._header = None
+        self._content = []
+        self._preamble = []
+        self._strings = {}
+
+    def _intern(self, text):
+        return self._strings.setdefault(text, text)
+
+    def _finish_message(self):
+        if self._header is None:
+            return
+        sender, sender_id, day, time = self._header
+        content = "\n".join(self._content).strip("\n")
+        self.chatlog.messages.append(
+            Message(sender, sender_id, day, time, classify_message(sender, content), content))
+        self._header = None
+        self._content = []
+
+    def _feed_line(self, line):
+        day_match = _DAY_SEPARATOR_RE.match(line)
+        if day_match:
+            self._finish_message()
+            self._day = day_match.group('day')
+            return
+        header = MESSAGE_HEADER_RE.match(line)
+        if header:
+            self._finish_message()
+            sender = header.group('sender')
+            match = _SENDER_RE.match(sender)
+            sender_id = ""
+            if match and match.group('name'):
+                sender, sender_id = match.group('name'), match.group('id')
+            time = header.group('time')
+            date_match = _DATE_RE.match(time)
+            day = date_match.group('day') if date_match else self._day
+            # 消息时间中的日期可能省略年份，此时沿用日期分隔行中的完整日期
+            if self._day and self._day.endswith(day):
+                day = self._day
+            self._header = (self._intern(sender), self._intern(sender_id), self._intern(day), time)
+            return
+        if self._header is None:
+            self._preamble.append(line)
+        else:
+            self._content.append(line)
+
+    def feed(self, text):
+        """解析一段文本，末尾不完整的行留到下一次解析"""
+        lines = (self._pending + text).split("\n")
+        self._pending = lines.pop()
+        for line in lines:
+            self._feed_line(line.rstrip("\r"))
+        return self.chatlog
+
+    def close(self):
+        """解析剩余内容，返回完整的ChatLog"""
+        if self._pending:
+            self._feed_line(self._pending.rstrip("\r"))
+            self._pending = ""
+        self._finish_message()
+        self.chatlog.preamble = "\n".join(self._preamble).strip("\n")
+        return self.chatlog
+
+
+def html_to_text(content):
+    """chatlog返回HTML时去掉标签，得到纯文本"""
+    return html.unescape(_HTML_TAG_RE.sub("", _HTML_BREAK_RE.sub("\n", content)))
+
+
+def is_html(text):
+    """chatlog返回的内容是否为HTML"""
+    stripped = text.lstrip()
+    return stripped.startswith('<') and 'html' in stripped[:1000].lower()
+
+
+def parse_chatlog(text):
+    """将chatlog返回的聊天记录解析为ChatLog"""
+    if is_html(text):
+        text = html_to_text(text)
+    parser = ChatLogParser()
+    parser.feed(text)
+    return parser.close()
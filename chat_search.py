@@ -0,0 +1,290 @@
+import re
+import sqlite3
+import threading
+
+from app_config import get_data_path
+from chat_parser import ChatLog, Message, parse_chatlog, TYPE_TEXT
+from tracing import tracer
+
+INDEX_FILENAME = "search_index.db"
+
+# 一次搜索最多返回的消息数
+MAX_SEARCH_RESULTS = 1000
+
+# trigram分词至少需要3个字符才能使用索引，更短的关键词使用单字/双字索引
+TRIGRAM_MIN_CHARS = 3
+
+# 表结构版本，旧版本的索引文件打开时会重建
+SCHEMA_VERSION = 2
+
+# 连续的文字或数字，单字/双字索引只对其中的字符建立索引
+_WORD_RE = re.compile(r"[^\W_]+")
+
+
+class SearchHit:
+    """一条匹配的消息，seq 为消息在当天聊天记录中的序号"""
+    __slots__ = ("talker", "day", "clock", "seq", "sender", "content")
+
+    def __init__(self, talker, day, clock, seq, sender, content):
+        self.talker = talker
+        self.day = day
+        self.clock = clock
+        self.seq = seq
+        self.sender = sender
+        self.content = content
+
+
+def hits_to_chatlog(hits, names=None):
+    """把搜索结果按时间顺序组成一份聊天记录，发送者后面附上所在的联系人或群聊名称
+
+    names 为 {微信号: 显示名称}，用于总结搜索结果。
+    """
+    names = names or {}
+    messages = []
+    for hit in sorted(hits, key=lambda hit: (hit.day, hit.clock, hit.talker, hit.seq)):
+        sender = f"{hit.sender}（{names.get(hit.talker) or hit.talker}）"
+        messages.append(Message(sender, "", hit.day, f"{hit.day} {hit.clock}", TYPE_TEXT, hit.content))
+    return ChatLog(messages)
+
+
+def _escape_like(text):
+    return text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def _grams(text):
+    """文本中连续文字的全部单字和相邻双字，去重后用空格连接"""
+    grams = set()
+    for word in _WORD_RE.findall(text):
+        grams.update(word)
+        grams.update(word[i:i + 2] for i in range(len(word) - 1))
+    return " ".join(sorted(grams))
+
+
+def _query_grams(keyword):
+    """在单字/双字索引中查找关键词需要的词：单独的字用单字，其余用相邻双字"""
+    grams = set()
+    for word in _WORD_RE.findall(keyword):
+        if len(word) == 1:
+            grams.add(word)
+        else:
+            grams.update(word[i:i + 2] for i in range(len(word) - 1))
+    return sorted(grams)
+
+
+def _day_filter(talkers, start_day, end_day):
+    """联系人和日期范围对应的条件（不带表名）和参数"""
+    conditions = []
+    params = []
+    if talkers:
+        conditions.append(f"talker IN ({','.join('?' * len(talkers))})")
+        params += list(talkers)
+    if start_day:
+        conditions.append("day >= ?")
+        params.append(start_day)
+    if end_day:
+        conditions.append("day <= ?")
+        params.append(end_day)
+    return conditions, params
+
+
+class ChatSearchIndex:
+    """本地聊天记录缓存的全文索引（SQLite FTS5，trigram分词）
+
+    trigram 按连续3个字符建立索引，中文不需要分词也能匹配任意子串。
+    1-2个字符的关键词用不上trigram，另建一个只保存单字和双字的 message_gram 表，
+    按关键词中的单字/双字找出候选消息后再按子串确认。
+    索引按 (联系人, 日期) 增量更新：sync() 只解析缓存中新增或重新下载的日期，
+    并删除已从缓存中淘汰的日期。每一天的消息占用连续的rowid，删除时按rowid范围删除。
+    SQLite 不支持 trigram 分词（3.34 以前）时全部使用单字/双字索引，连 FTS5 也不支持时
+    退化为普通表的子串扫描，有联系人或日期条件时先按 indexed_day 找出对应的rowid范围，只扫描这些消息。
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        if self._conn.execute("PRAGMA user_version").fetchone()[0] < SCHEMA_VERSION:
+            # 索引可以从聊天记录缓存重建，旧版本直接删除
+            for table in ("message", "message_gram", "indexed_day"):
+                self._conn.execute(f"DROP TABLE IF EXISTS {table}")
+            self._conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        try:
+            self._conn.execute("""
+                CREATE VIRTUAL TABLE IF NOT EXISTS message USING fts5(
+                    content, sender, talker UNINDEXED, day UNINDEXED, clock UNINDEXED, seq UNINDEXED,
+                    tokenize='trigram'
+                )
+            """)
+        except sqlite3.OperationalError:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS message (
+                    content TEXT, sender TEXT, talker TEXT, day TEXT, clock TEXT, seq INTEGER
+                )
+            """)
+        try:
+            # 不保存内容、只记录每个单字/双字出现在哪些消息中，rowid 与 message 表相同
+            self._conn.execute("""
+                CREATE VIRTUAL TABLE IF NOT EXISTS message_gram USING fts5(
+                    grams, content='', detail=none, tokenize='unicode61 remove_diacritics 0'
+                )
+            """)
+            self.gram_index = True
+        except sqlite3.OperationalError:
+            self.gram_index = False
+        sql = self._conn.execute("SELECT sql FROM sqlite_master WHERE name = 'message'").fetchone()[0]
+        self.full_text = "fts5" in sql.lower()
+        if not self.full_text:
+            fallback = "单字/双字索引" if self.gram_index else "子串扫描"
+            print(f"SQLite不支持FTS5 trigram分词，全文搜索使用{fallback}")  # 调试信息
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS indexed_day (
+                talker TEXT NOT NULL,
+                day TEXT NOT NULL,
+                fetched_at REAL NOT NULL,
+                first_id INTEGER NOT NULL,
+                last_id INTEGER NOT NULL,
+                PRIMARY KEY (talker, day)
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_indexed_day_day ON indexed_day(day)")
+        self._conn.commit()
+
+    def _remove_day_locked(self, talker, day):
+        row = self._conn.execute(
+            "SELECT first_id, last_id FROM indexed_day WHERE talker = ? AND day = ?", (talker, day)).fetchone()
+        if row is None:
+            return
+        if self.gram_index:
+            # 不保存内容的FTS5表删除时需要提供当初写入的内容
+            self._conn.executemany(
+                "INSERT INTO message_gram (message_gram, rowid, grams) VALUES ('delete', ?, ?)",
+                [(rowid, _grams(f"{content} {sender}")) for rowid, content, sender in self._conn.execute(
+                    "SELECT rowid, content, sender FROM message WHERE rowid BETWEEN ? AND ?", row)]
+            )
+        self._conn.execute("DELETE FROM message WHERE rowid BETWEEN ? AND ?", row)
+        self._conn.execute("DELETE FROM indexed_day WHERE talker = ? AND day = ?", (talker, day))
+
+    def index_day(self, talker, day, content, fetched_at=0.0):
+        """为某个联系人一天的聊天记录建立索引（替换之前的索引），返回索引的消息数
+
+        只索引文字消息，图片等占位符和系统通知不参与搜索。
+        """
+        rows = [(message.content, message.sender, talker, day, message.clock(), seq)
+                for seq, message in enumerate(parse_chatlog(content)) if message.type == TYPE_TEXT]
+        with self._lock:
+            self._remove_day_locked(talker, day)
+            first_id = self._conn.execute("SELECT COALESCE(MAX(rowid), 0) + 1 FROM message").fetchone()[0]
+            self._conn.executemany(
+                "INSERT INTO message (rowid, content, sender, talker, day, clock, seq) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                ((first_id + offset, *row) for offset, row in enumerate(rows))
+            )
+            if self.gram_index:
+                self._conn.executemany(
+                    "INSERT INTO message_gram (rowid, grams) VALUES (?, ?)",
+                    ((first_id + offset, _grams(f"{row[0]} {row[1]}")) for offset, row in enumerate(rows))
+                )
+            self._conn.execute(
+                "INSERT INTO indexed_day (talker, day, fetched_at, first_id, last_id) VALUES (?, ?, ?, ?, ?)",
+                (talker, day, fetched_at, first_id, first_id + len(rows) - 1)
+            )
+            self._conn.commit()
+        return len(rows)
+
+    def sync(self, cache, should_stop=None, on_progress=None):
+        """按聊天记录缓存增量更新索引
+
+        返回字典：indexed（新建索引的天数）、removed（删除的天数）、messages（新索引的消息数）。
+        on_progress(已完成, 总数) 在每索引完一天后调用。
+        """
+        result = {"indexed": 0, "removed": 0, "messages": 0}
+        with tracer.span("search.sync", "search") as span:
+            current = {(talker, day): fetched_at for talker, day, fetched_at in cache.entries()}
+            with self._lock:
+                indexed = {(talker, day): fetched_at for talker, day, fetched_at
+                           in self._conn.execute("SELECT talker, day, fetched_at FROM indexed_day")}
+                # 已从缓存中淘汰的日期
+                for talker, day in indexed.keys() - current.keys():
+                    self._remove_day_locked(talker, day)
+                    result["removed"] += 1
+                self._conn.commit()
+
+            pending = [(key, fetched_at) for key, fetched_at in current.items() if indexed.get(key) != fetched_at]
+            for done, ((talker, day), fetched_at) in enumerate(pending, 1):
+                if should_stop and should_stop():
+                    break
+                content = cache.read_day(talker, day)
+                if content is not None:
+                    result["messages"] += self.index_day(talker, day, content, fetched_at)
+                    result["indexed"] += 1
+                if on_progress:
+                    on_progress(done, len(pending))
+            span.args.update(result)
+        return result
+
+    def search(self, keyword, talkers=None, start_day=None, end_day=None, limit=MAX_SEARCH_RESULTS):
+        """搜索消息内容和发送者，按日期从新到旧排列
+
+        talkers 为限定的联系人列表，start_day/end_day 为日期范围（yyyy-MM-dd，含两端）。
+        返回 (SearchHit列表, 是否因超过limit被截断)。
+        """
+        keyword = keyword.strip()
+        if not keyword:
+            return [], False
+        conditions = []
+        params = []
+        like_condition = "(m.content LIKE ? ESCAPE '\\' OR m.sender LIKE ? ESCAPE '\\')"
+        like = f"%{_escape_like(keyword)}%"
+        grams = _query_grams(keyword)
+        scan = False
+        if self.full_text and len(keyword) >= TRIGRAM_MIN_CHARS:
+            conditions.append("m.message MATCH ?")
+            params.append('"' + keyword.replace('"', '""') + '"')
+        elif self.gram_index and grams:
+            # 先按单字/双字索引找出候选消息，再按子串确认
+            conditions += ["m.rowid IN (SELECT rowid FROM message_gram WHERE message_gram MATCH ?)", like_condition]
+            params += [" ".join(f'"{gram}"' for gram in grams), like, like]
+        else:
+            conditions.append(like_condition)
+            params += [like, like]
+            scan = True
+        day_conditions, day_params = _day_filter(talkers, start_day, end_day)
+        if scan and day_conditions:
+            # 子串扫描先按 indexed_day 找出符合条件的日期，只扫描这些日期的rowid范围
+            # （CROSS JOIN 固定以 indexed_day 为外层，否则 SQLite 可能先全表扫描 message）
+            source = "indexed_day AS d CROSS JOIN message AS m ON m.rowid BETWEEN d.first_id AND d.last_id"
+            conditions += [f"d.{condition}" for condition in day_conditions]
+        else:
+            source = "message AS m"
+            conditions += [f"m.{condition}" for condition in day_conditions]
+        params += day_params
+
+        with tracer.span("search.query", "search", keyword=keyword) as span:
+            with self._lock:
+                rows = self._conn.execute(
+                    f"SELECT m.talker, m.day, m.clock, m.seq, m.sender, m.content FROM {source} "
+                    f"WHERE {' AND '.join(conditions)} ORDER BY m.day DESC, m.talker, m.seq LIMIT ?",
+                    [*params, limit + 1]
+                ).fetchall()
+            span.args["results"] = min(len(rows), limit)
+        return [SearchHit(*row) for row in rows[:limit]], len(rows) > limit
+
+    def stats(self):
+        """返回 (已索引的天数, 消息数)"""
+        with self._lock:
+            days, messages = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(last_id - first_id + 1), 0) FROM indexed_day").fetchone()
+        return days, messages
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_search_index():
+    """获取全局共享的全文索引"""
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = ChatSearchIndex(get_data_path(INDEX_FILENAME))
+        return _index
@@ -0,0 +1,133 @@
+import sqlite3
+import threading
+import time
+
+from app_config import get_data_path, DEFAULT_CHATLOG_CACHE_MAX_MB
+
+CACHE_FILENAME = "chatlog_cache.db"
+
+
+class ChatlogCache:
+    """按联系人和日期缓存聊天记录的本地SQLite存储
+
+    每条记录对应一个联系人某一天的聊天记录文本。总大小超过上限时，
+    按最近访问时间淘汰最久未使用的记录（LRU）。
+    """
+
+    def __init__(self, path, max_bytes=DEFAULT_CHATLOG_CACHE_MAX_MB * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS chatlog (
+                talker TEXT NOT NULL,
+                day TEXT NOT NULL,
+                content TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                fetched_at REAL NOT NULL,
+                accessed_at REAL NOT NULL,
+                PRIMARY KEY (talker, day)
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_chatlog_accessed ON chatlog (accessed_at)")
+        self._conn.commit()
+        self._total_bytes = self._conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM chatlog").fetchone()[0]
+
+    def get_days(self, talker, days):
+        """读取多天的缓存，返回 {日期: 聊天记录}，未缓存的日期不在结果中"""
+        if not days:
+            return {}
+        placeholders = ",".join("?" * len(days))
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT day, content FROM chatlog WHERE talker = ? AND day IN ({placeholders})",
+                [talker, *days]
+            ).fetchall()
+            if rows:
+                hit_placeholders = ",".join("?" * len(rows))
+                self._conn.execute(
+                    f"UPDATE chatlog SET accessed_at = ? WHERE talker = ? AND day IN ({hit_placeholders})",
+                    [time.time(), talker, *[day for day, _ in rows]]
+                )
+                self._conn.commit()
+        return dict(rows)
+
+    def entries(self):
+        """全部缓存记录的 (联系人, 日期, 下载时间)，用于增量建立全文索引"""
+        with self._lock:
+            return self._conn.execute("SELECT talker, day, fetched_at FROM chatlog").fetchall()
+
+    def read_day(self, talker, day):
+        """读取某一天的缓存但不更新访问时间，不存在时返回None"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT content FROM chatlog WHERE talker = ? AND day = ?", (talker, day)).fetchone()
+        return row[0] if row else None
+
+    def put_day(self, talker, day, content):
+        """写入某一天的聊天记录，超出容量时淘汰旧记录"""
+        size = len(content.encode("utf-8"))
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT size FROM chatlog WHERE talker = ? AND day = ?", (talker, day)).fetchone()
+            if row:
+                self._total_bytes -= row[0]
+            self._conn.execute(
+                "INSERT OR REPLACE INTO chatlog (talker, day, content, size, fetched_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (talker, day, content, size, now, now)
+            )
+            self._total_bytes += size
+            self._evict_locked()
+            self._conn.commit()
+
+    def _evict_locked(self):
+        """按最近访问时间淘汰记录，直到总大小不超过上限"""
+        while self._total_bytes > self.max_bytes:
+            rows = self._conn.execute(
+                "SELECT talker, day, size FROM chatlog ORDER BY accessed_at LIMIT 64").fetchall()
+            if not rows:
+                self._total_bytes = 0
+                break
+            for talker, day, size in rows:
+                self._conn.execute("DELETE FROM chatlog WHERE talker = ? AND day = ?", (talker, day))
+                self._total_bytes -= size
+                if self._total_bytes <= self.max_bytes:
+                    break
+
+    def evict(self):
+        """立即按容量上限执行淘汰"""
+        with self._lock:
+            self._evict_locked()
+            self._conn.commit()
+
+    def purge(self):
+        """清空全部缓存"""
+        with self._lock:
+            self._conn.execute("DELETE FROM chatlog")
+            self._conn.commit()
+            self._conn.execute("VACUUM")
+            self._total_bytes = 0
+
+    def stats(self):
+        """返回 (缓存条数, 总字节数)"""
+        with self._lock:
+            count = self._conn.execute("SELECT COUNT(*) FROM chatlog").fetchone()[0]
+        return count, self._total_bytes
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_chatlog_cache():
+    """获取全局共享的聊天记录缓存"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ChatlogCache(get_data_path(CACHE_FILENAME))
+        return _cache
@@ -0,0 +1,232 @@
+import codecs
+import time
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+import requests
+
+from app_config import DEFAULT_CHATLOG_FETCH_CONCURRENCY, DEFAULT_CHATLOG_SHARD_RETRIES
+from http_session import get_session
+from tracing import tracer
+
+# 连接超时5秒，读取超时30秒
+CHATLOG_TIMEOUT = (5, 30)
+
+# 流式下载时每次读取的字节数，读满后才会产出，太大会推迟第一屏消息的显示
+STREAM_CHUNK_SIZE = 32 * 1024
+
+# 按天分片下载时，失败分片的重试间隔：1s, 2s, 4s ...
+SHARD_RETRY_BACKOFF = 1.0
+
+# 由多天缓存拼接聊天记录时，每天之前插入的日期分隔行
+DAY_SEPARATOR = "========== {day} =========="
+
+
+class ChatlogServiceError(Exception):
+    """chatlog服务返回了非200状态码"""
+    def __init__(self, status_code, text=""):
+        super().__init__(f"{status_code} - {text}")
+        self.status_code = status_code
+        self.text = text
+
+
+def build_date_param(start_date, end_date):
+    """构建time参数，开始日期和结束日期相同时只传单个日期，否则传日期范围"""
+    if start_date == end_date:
+        return start_date
+    return f"{start_date}~{end_date}"
+
+
+def iter_days(start_date, end_date):
+    """逐日产出开始日期到结束日期（含）之间的日期字符串"""
+    day = date.fromisoformat(start_date)
+    last = date.fromisoformat(end_date)
+    while day <= last:
+        yield day.isoformat()
+        day += timedelta(days=1)
+
+
+def _day_block(day, content):
+    return DAY_SEPARATOR.format(day=day) + "\n" + content.strip("\n") + "\n"
+
+
+def iter_joined_days(day_contents):
+    """将 [(日期, 聊天记录)] 按顺序逐段产出拼接后的文本，拼接结果与 join_days 相同
+
+    没有聊天记录的日期跳过；只有一天有聊天记录时原样产出，不插入日期分隔行，
+    因此第一天有聊天记录时要等到第二个有聊天记录的日期（或全部结束）后才产出。
+    """
+    first = None
+    count = 0
+    for day, content in day_contents:
+        if not content.strip():
+            continue
+        count += 1
+        if count == 1:
+            first = (day, content)
+            continue
+        if count == 2:
+            yield _day_block(*first)
+        yield "\n" + _day_block(day, content)
+    if count == 1:
+        yield first[1]
+
+
+def join_days(day_contents):
+    """将 [(日期, 聊天记录)] 按顺序拼接，多天时插入日期分隔行"""
+    return "".join(iter_joined_days(day_contents))
+
+
+def fetch_contacts(base_url, keyword=""):
+    """获取联系人列表，关键词为空时查询全部联系人"""
+    if keyword:
+        encoded_keyword = urllib.parse.quote(keyword)
+        url = f"{base_url}/contact?keyword={encoded_keyword}&format=json"
+    else:
+        url = f"{base_url}/contact?format=json"
+
+    response = get_session().get(url, timeout=CHATLOG_TIMEOUT)
+    if response.status_code != 200:
+        raise ChatlogServiceError(response.status_code, response.text)
+    return response.json().get('items', [])
+
+
+def fetch_chatlog(base_url, talker, start_date, end_date):
+    """获取指定联系人在日期范围内的聊天记录文本"""
+    date_param = build_date_param(start_date, end_date)
+    encoded_talker = urllib.parse.quote(talker)
+    url = f"{base_url}/chatlog?time={date_param}&talker={encoded_talker}"
+
+    response = get_session().get(url, timeout=CHATLOG_TIMEOUT)
+    if response.status_code != 200:
+        raise ChatlogServiceError(response.status_code, response.text)
+    return response.text
+
+
+def stream_chatlog(base_url, talker, start_date, end_date, should_stop=None):
+    """流式获取聊天记录，边下载边产出解码后的文本片段
+
+    should_stop() 返回True时关闭连接并结束，不抛出异常。
+    """
+    date_param = build_date_param(start_date, end_date)
+    encoded_talker = urllib.parse.quote(talker)
+    url = f"{base_url}/chatlog?time={date_param}&talker={encoded_talker}"
+
+    response = get_session().get(url, timeout=CHATLOG_TIMEOUT, stream=True)
+    try:
+        if response.status_code != 200:
+            raise ChatlogServiceError(response.status_code, response.text)
+        # 增量解码，多字节字符被切分在两次读取之间时留到下一次
+        decoder = codecs.getincrementaldecoder(response.encoding or "utf-8")(errors="replace")
+        for data in response.iter_content(STREAM_CHUNK_SIZE):
+            if should_stop and should_stop():
+                return
+            text = decoder.decode(data)
+            if text:
+                yield text
+        text = decoder.decode(b"", final=True)
+        if text:
+            yield text
+    finally:
+        response.close()
+
+
+def _is_retryable(error):
+    """超时、连接中断和服务端错误可以重试，其余错误（如参数错误）直接失败"""
+    if isinstance(error, (requests.exceptions.Timeout, requests.exceptions.ConnectionError,
+                          requests.exceptions.ChunkedEncodingError)):
+        return True
+    return isinstance(error, ChatlogServiceError) and error.status_code >= 500
+
+
+def fetch_day(base_url, talker, day, retries=DEFAULT_CHATLOG_SHARD_RETRIES, should_stop=None):
+    """获取一天的聊天记录，失败时只重试这一天"""
+    attempt = 0
+    while True:
+        try:
+            with tracer.span("chatlog.fetch_day", "chatlog", day=day, attempt=attempt) as span:
+                content = fetch_chatlog(base_url, talker, day, day)
+                span.args["chars"] = len(content)
+            return content
+        except Exception as e:
+            if attempt >= retries or not _is_retryable(e) or (should_stop and should_stop()):
+                raise
+            attempt += 1
+            print(f"获取 {talker} {day} 的聊天记录失败，第{attempt}次重试: {e}")  # 调试信息
+            time.sleep(SHARD_RETRY_BACKOFF * 2 ** (attempt - 1))
+
+
+def iter_day_contents(base_url, talker, start_date, end_date, cache=None,
+                      max_workers=DEFAULT_CHATLOG_FETCH_CONCURRENCY,
+                      retries=DEFAULT_CHATLOG_SHARD_RETRIES, should_stop=None):
+    """按天分片获取聊天记录，按日期顺序产出 (日期, 聊天记录)
+
+    已缓存的历史日期直接读取本地缓存，只有未缓存的日期和今天（及以后）的日期会请求
+    chatlog服务，最多max_workers个分片并行下载，每个分片单独重试。
+    下载到的历史日期写入缓存。
+    """
+    today = date.today().isoformat()
+    days = list(iter_days(start_date, end_date))
+    cached = cache.get_days(talker, [day for day in days if day < today]) if cache is not None else {}
+    missing = [day for day in days if day not in cached]
+
+    executor = None
+    futures = {}
+    if missing:
+        executor = ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(missing))))
+        futures = {day: executor.submit(fetch_day, base_url, talker, day, retries, should_stop)
+                   for day in missing}
+    try:
+        for day in days:
+            if should_stop and should_stop():
+                return
+            if day in cached:
+                yield day, cached[day]
+                continue
+            content = futures[day].result()
+            if cache is not None and day < today:
+                cache.put_day(talker, day, content)
+            yield day, content
+    finally:
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+def iter_chatlog(base_url, talker, start_date, end_date, cache=None, should_stop=None,
+                 max_workers=DEFAULT_CHATLOG_FETCH_CONCURRENCY):
+    """逐段产出聊天记录文本，用于边下载边解析
+
+    单天的聊天记录流式下载；多天时按天分片并行下载（见 iter_day_contents），
+    拼接规则与 join_days 相同。完整下载的历史日期写入缓存，中途停止时不写入。
+    """
+    today = date.today().isoformat()
+    days = list(iter_days(start_date, end_date))
+    if not days:
+        return
+    if len(days) > 1:
+        # 与 fetch_chatlog_cached 使用同样的拼接规则，界面和命令行/批量总结得到相同的聊天记录
+        yield from iter_joined_days(iter_day_contents(base_url, talker, start_date, end_date, cache,
+                                                      max_workers, should_stop=should_stop))
+        return
+
+    day = days[0]
+    if cache is not None and day < today:
+        cached = cache.get_days(talker, [day])
+        if day in cached:
+            yield cached[day]
+            return
+    parts = []
+    for text in stream_chatlog(base_url, talker, day, day, should_stop):
+        if cache is not None:
+            parts.append(text)
+        yield text
+    if cache is not None and day < today and not (should_stop and should_stop()):
+        cache.put_day(talker, day, "".join(parts))
+
+
+def fetch_chatlog_cached(base_url, talker, start_date, end_date, cache,
+                         max_workers=DEFAULT_CHATLOG_FETCH_CONCURRENCY, should_stop=None):
+    """按天分片读取聊天记录并拼接，cache为None时不使用本地缓存"""
+    return join_days(iter_day_contents(base_url, talker, start_date, end_date, cache,
+                                       max_workers, should_stop=should_stop))
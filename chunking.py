@@ -0,0 +1,148 @@
+import re
+
+# chatlog纯文本格式中每条消息的首行：发送者 时间，例如
+# 张三(wxid_xxx) 2025-01-01 10:00:00 / 张三(wxid_xxx) 01-01 10:00:00 / 张三 10:00:00
+MESSAGE_HEADER_RE = re.compile(
+    r'^(?P<sender>.+?) (?P<time>(?:\d{4}-)?(?:\d{2}-\d{2} )?\d{2}:\d{2}:\d{2})$'
+)
+
+# 精简后的聊天记录（见 preprocess.py）：日期行 "# 2025-01-01" 和消息行 "10:00 A: 内容"
+COMPACT_DAY_RE = re.compile(r'^# (?P<day>(?:\d{4}-)?\d{2}-\d{2})$')
+COMPACT_MESSAGE_RE = re.compile(r'^(?P<time>\d{2}:\d{2}) (?P<sender>[A-Z]+): ')
+
+
+
+def estimate_tokens(text):
+    """粗略估算文本的token数：中文字符约0.6个token，其他字符约0.3个token
+
+    中文字符（含全角标点）的UTF-8编码为3字节，ASCII为1字节，因此由编码后多出的字节数
+    即可得到中文字符数，不需要逐字符匹配，几MB的聊天记录也只需要几毫秒。
+    """
+    cjk = (len(text.encode("utf-8", "surrogatepass")) - len(text)) // 2
+    other = len(text) - cjk
+    return int(cjk * 0.6 + other * 0.3) + 1
+
+
+class Chunk:
+    """一个分段：若干条连续消息及其时间范围"""
+    __slots__ = ("text", "tokens", "start_time", "end_time")
+
+    def __init__(self, text, tokens, start_time="", end_time=""):
+        self.text = text
+        self.tokens = tokens
+        self.start_time = start_time
+        self.end_time = end_time
+
+    def time_range(self):
+        if self.start_time and self.end_time and self.start_time != self.end_time:
+            return f"{self.start_time} ~ {self.end_time}"
+        return self.start_time or self.end_time
+
+
+def _is_message_start(line, previous):
+    if MESSAGE_HEADER_RE.match(line) or COMPACT_DAY_RE.match(line):
+        return True
+    # 日期行和其后的第一条消息保持在一起
+    return bool(COMPACT_MESSAGE_RE.match(line)) and not COMPACT_DAY_RE.match(previous)
+
+
+def split_messages(text):
+    """按消息边界切分聊天记录，返回每条消息的文本"""
+    blocks = []
+    current = []
+    for line in text.splitlines():
+        if current and _is_message_start(line, current[-1]):
+            blocks.append("\n".join(current).strip("\n"))
+            current = []
+        current.append(line)
+    if current:
+        block = "\n".join(current).strip("\n")
+        if block:
+            blocks.append(block)
+    return blocks
+
+
+def _message_time(block):
+    lines = block.split("\n", 2)
+    match = MESSAGE_HEADER_RE.match(lines[0])
+    if match:
+        return match.group('time')
+    day = COMPACT_DAY_RE.match(lines[0])
+    if day and len(lines) > 1:
+        match = COMPACT_MESSAGE_RE.match(lines[1])
+        return f"{day.group('day')} {match.group('time')}" if match else day.group('day')
+    match = COMPACT_MESSAGE_RE.match(lines[0])
+    return match.group('time') if match else ""
+
+
+def _split_oversized(block, max_tokens):
+    """单条消息超过预算时，按行再按字符硬切分"""
+    pieces = []
+    current = []
+    current_tokens = 0
+    for line in block.split("\n"):
+        line_tokens = estimate_tokens(line)
+        if line_tokens > max_tokens:
+            # 按字符切分超长行，每个中文字符最多约0.6个token
+            step = max(1, int(max_tokens / 0.6))
+            for start in range(0, len(line), step):
+                pieces.append(line[start:start + step])
+            continue
+        if current and current_tokens + line_tokens > max_tokens:
+            pieces.append("\n".join(current))
+            current = []
+            current_tokens = 0
+        current.append(line)
+        current_tokens += line_tokens
+    if current:
+        pieces.append("\n".join(current))
+    return pieces
+
+
+def chunk_transcript(text, max_tokens):
+    """将聊天记录按消息边界切分为不超过max_tokens的分段"""
+    chunks = []
+    current = []
+    current_tokens = 0
+    start_time = end_time = ""
+    # 精简格式每条消息只占一行，消息之间不需要空行；消息行只有时间，日期来自之前的日期行
+    separator = "\n\n"
+    day = ""
+
+    def flush():
+        nonlocal current, current_tokens, start_time, end_time
+        if current:
+            chunks.append(Chunk(separator.join(current), current_tokens, start_time, end_time))
+        current = []
+        current_tokens = 0
+        start_time = end_time = ""
+
+    for block in split_messages(text):
+        tokens = estimate_tokens(block)
+        time = _message_time(block)
+        day_match = COMPACT_DAY_RE.match(block.split("\n", 1)[0])
+        if day_match:
+            day = day_match.group('day')
+            separator = "\n"
+        elif COMPACT_MESSAGE_RE.match(block):
+            separator = "\n"
+            if day:
+                time = f"{day} {time}"
+
+        if tokens > max_tokens:
+            flush()
+            for piece in _split_oversized(block, max_tokens):
+                chunks.append(Chunk(piece, estimate_tokens(piece), time, time))
+            continue
+
+        if current and current_tokens + tokens > max_tokens:
+            flush()
+
+        current.append(block)
+        current_tokens += tokens
+        if time:
+            start_time = start_time or time
+            end_time = time
+
+    flush()
+    return chunks
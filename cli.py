@@ -0,0 +1,303 @@
+"""命令行入口：不依赖PyQt5，可在服务器或定时任务中运行
+
+示例：
+    python cli.py run --contact 技术交流群 --start 2024-01-01 --end 2024-01-02
+    python cli.py daemon --all-groups --at 08:00
+"""
+import argparse
+import json
+import os
+import signal
+import sys
+import threading
+from datetime import date, datetime, timedelta
+
+import chatlog_client
+import deepseek_client
+from app_config import (load_config_file, get_data_path, DEFAULT_CHATLOG_URL,
+                        DEFAULT_CHATLOG_CACHE_MAX_MB, DEFAULT_SUMMARY_CACHE_MAX_MB,
+                        DEFAULT_SUMMARY_CACHE_MAX_DAYS, DEFAULT_HTTP_POOL_SIZE,
+                        DEFAULT_HTTP_MAX_RETRIES)
+from batch_summary import BatchItem, BatchSummaryJob, REPORT_FILENAME, STATUS_FAILED
+from chatlog_cache import get_chatlog_cache
+from http_session import configure_session
+from prompts import PRESET_PROMPTS, DEFAULT_PROMPT
+from summary_cache import get_summary_cache
+from tracing import tracer
+
+# --trace 导出的耗时记录文件名
+TRACE_FILENAME = "trace.json"
+
+
+class CLIError(Exception):
+    """命令行参数或联系人解析错误"""
+
+
+def log(message):
+    print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] {message}", file=sys.stderr, flush=True)
+
+
+def load_config(args):
+    """读取配置文件，并用命令行参数和环境变量覆盖"""
+    if args.config:
+        with open(args.config, "r", encoding="utf-8") as f:
+            config = json.load(f)
+    else:
+        config = load_config_file()
+
+    overrides = {
+        'api_key': args.api_key or os.environ.get("DEEPSEEK_API_KEY"),
+        'api_url': args.api_url,
+        'model': args.model,
+        'chatlog_service_url': args.chatlog_url,
+        'max_concurrency': args.concurrency,
+        'chatlog_fetch_concurrency': args.fetch_concurrency,
+        'batch_requests_per_minute': args.rpm,
+        'cost_budget': args.cost_budget,
+        'compact_transcript': False if args.no_compact else None,
+    }
+    for key, value in overrides.items():
+        if value is not None:
+            config[key] = value
+    if not config.get('api_key'):
+        raise CLIError("未设置DeepSeek API密钥，请使用 --api-key、环境变量 DEEPSEEK_API_KEY 或配置文件")
+    return config
+
+
+def load_prompt(args):
+    if args.prompt_file:
+        with open(args.prompt_file, "r", encoding="utf-8") as f:
+            return f.read()
+    if args.prompt:
+        return args.prompt
+    if args.preset:
+        if not 1 <= args.preset <= len(PRESET_PROMPTS):
+            raise CLIError(f"预设模板编号应在 1 到 {len(PRESET_PROMPTS)} 之间")
+        return PRESET_PROMPTS[args.preset - 1]
+    return DEFAULT_PROMPT
+
+
+def setup_resources(config, use_cache):
+    """按配置设置HTTP连接池和本地缓存，返回 (聊天记录缓存, 总结缓存)"""
+    configure_session(config.get('http_pool_size', DEFAULT_HTTP_POOL_SIZE),
+                      config.get('http_max_retries', DEFAULT_HTTP_MAX_RETRIES))
+    if not use_cache:
+        return None, None
+    chatlog_cache = get_chatlog_cache()
+    chatlog_cache.max_bytes = config.get('chatlog_cache_max_mb', DEFAULT_CHATLOG_CACHE_MAX_MB) * 1024 * 1024
+    summary_cache = get_summary_cache()
+    summary_cache.max_bytes = config.get('summary_cache_max_mb', DEFAULT_SUMMARY_CACHE_MAX_MB) * 1024 * 1024
+    summary_cache.max_age_days = config.get('summary_cache_max_days', DEFAULT_SUMMARY_CACHE_MAX_DAYS)
+    return chatlog_cache, summary_cache
+
+
+def resolve_contacts(base_url, names, all_groups=False):
+    """将微信号、昵称或备注解析为批量总结项"""
+    contacts = chatlog_client.fetch_contacts(base_url)
+    items = []
+    seen = set()
+
+    def add(contact):
+        user_name = contact.get('userName') or ''
+        if user_name and user_name not in seen:
+            seen.add(user_name)
+            items.append(BatchItem(user_name, contact.get('nickName') or contact.get('remark')))
+
+    if all_groups:
+        for contact in contacts:
+            if (contact.get('userName') or '').endswith("@chatroom"):
+                add(contact)
+
+    for name in names:
+        matched = [contact for contact in contacts
+                   if name in (contact.get('userName'), contact.get('nickName'), contact.get('remark'))]
+        if not matched:
+            raise CLIError(f"未找到联系人: {name}")
+        if len(matched) > 1 and not any(contact.get('userName') == name for contact in matched):
+            candidates = ", ".join(contact.get('userName') or '' for contact in matched)
+            raise CLIError(f"联系人 {name} 匹配到多个结果，请使用微信号: {candidates}")
+        add(next((contact for contact in matched if contact.get('userName') == name), matched[0]))
+
+    if not items:
+        raise CLIError("没有要总结的联系人，请使用 --contact 或 --all-groups")
+    return items
+
+
+def run_batch(items, start_date, end_date, prompt, config, output_dir, chatlog_cache,
+              summary_cache, should_stop=None, trace=False):
+    """执行一次批量总结并输出进度，返回失败的项数
+
+    trace 为True时把本次运行的耗时记录导出为Chrome trace（输出目录下的 trace.json）。
+    """
+    logged_status = {}
+
+    def on_update(index, item):
+        # 收到token用量时也会调用，只在状态变化时输出
+        if logged_status.get(index) == item.status:
+            return
+        logged_status[index] = item.status
+        message = f"[{index + 1}/{len(items)}] {item.name}: {item.status}"
+        if item.input_tokens:
+            approx = "约" if item.tokens_estimated else ""
+            message += f"（聊天记录约 {item.raw_tokens} tokens，输入{approx} {item.input_tokens} tokens"
+            if item.output_tokens:
+                message += f"，输出{approx} {item.output_tokens} tokens"
+            message += "）"
+        if item.error:
+            message += f" - {item.error}"
+        log(message)
+
+    log(f"开始总结 {len(items)} 个联系人，日期 {chatlog_client.build_date_param(start_date, end_date)}")
+    tracer.clear()
+    job = BatchSummaryJob(items, start_date, end_date, prompt, config, output_dir,
+                          on_update=on_update, should_stop=should_stop,
+                          chatlog_cache=chatlog_cache, summary_cache=summary_cache)
+    job.run()
+    failed = sum(1 for item in items if item.status == STATUS_FAILED)
+    log(f"完成，失败 {failed} 项，结果已保存到: {output_dir}")
+    usage = deepseek_client.usage_stats.snapshot()
+    if usage['requests']:
+        log(f"DeepSeek请求 {usage['requests']} 次，输入 {usage['prompt_tokens']} tokens，"
+            f"上下文缓存命中 {usage['cache_hit_tokens']} tokens（{usage['cache_hit_rate']:.0%}），"
+            f"输出 {usage['completion_tokens']} tokens")
+    if trace:
+        trace_path = os.path.join(output_dir, TRACE_FILENAME)
+        count = tracer.export_chrome_trace(trace_path)
+        log(f"耗时记录 {count} 条已导出到: {trace_path}")
+    return failed
+
+
+def iso_date(value):
+    """argparse 的日期参数类型：检查 YYYY-MM-DD 格式，返回标准格式的日期字符串"""
+    try:
+        return date.fromisoformat(value).isoformat()
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"日期格式不正确: {value}，应为 YYYY-MM-DD")
+
+
+def command_run(args, stop_event):
+    # 在获取联系人和聊天记录之前检查日期范围
+    yesterday = (date.today() - timedelta(days=1)).isoformat()
+    start_date = args.start or yesterday
+    end_date = args.end or start_date
+    if end_date < start_date:
+        raise CLIError("结束日期不能早于开始日期")
+    config = load_config(args)
+    prompt = load_prompt(args)
+
+    base_url = config.get('chatlog_service_url') or DEFAULT_CHATLOG_URL
+    items = resolve_contacts(base_url, args.contact, args.all_groups)
+    output_dir = args.output_dir or os.path.join(
+        get_data_path("batch_output"), datetime.now().strftime("%Y%m%d_%H%M%S"))
+    chatlog_cache, summary_cache = setup_resources(config, not args.no_cache)
+    failed = run_batch(items, start_date, end_date, prompt, config, output_dir,
+                       chatlog_cache, summary_cache, stop_event.is_set, args.trace)
+    return 1 if failed or stop_event.is_set() else 0
+
+
+def next_run_time(at_time, now=None):
+    """下一次在每天 HH:MM 运行的时间"""
+    now = now or datetime.now()
+    hour, minute = (int(part) for part in at_time.split(":"))
+    run_at = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+    if run_at <= now:
+        run_at += timedelta(days=1)
+    return run_at
+
+
+def command_daemon(args, stop_event):
+    """每天定时总结前一天（或前N天）的聊天记录，每天的结果保存在以日期命名的子目录中"""
+    config = load_config(args)
+    prompt = load_prompt(args)
+    next_run_time(args.at)  # 提前检查时间格式
+    output_root = args.output_dir or get_data_path("daily_reports")
+    chatlog_cache, summary_cache = setup_resources(config, not args.no_cache)
+    base_url = config.get('chatlog_service_url') or DEFAULT_CHATLOG_URL
+
+    run_now = args.run_now
+    while not stop_event.is_set():
+        if not run_now:
+            run_at = next_run_time(args.at)
+            log(f"下一次运行时间: {run_at.strftime('%Y-%m-%d %H:%M')}")
+            if stop_event.wait((run_at - datetime.now()).total_seconds()):
+                break
+        run_now = False
+
+        day = (date.today() - timedelta(days=args.days_back)).isoformat()
+        output_dir = os.path.join(output_root, day)
+        if os.path.exists(os.path.join(output_dir, REPORT_FILENAME)):
+            log(f"{day} 的报告已存在，跳过")
+            continue
+        try:
+            # 每次运行重新获取联系人，包含新加入的群聊
+            items = resolve_contacts(base_url, args.contact, args.all_groups)
+            run_batch(items, day, day, prompt, config, output_dir,
+                      chatlog_cache, summary_cache, stop_event.is_set, args.trace)
+        except Exception as e:
+            log(f"{day} 的总结失败: {e}")
+    log("已停止")
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="DeepSeek微信聊天记录总结（命令行版）")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--contact", action="append", default=[],
+                        help="联系人或群聊的微信号、昵称或备注，可重复指定")
+    common.add_argument("--all-groups", action="store_true", help="总结全部群聊")
+    prompt_group = common.add_mutually_exclusive_group()
+    prompt_group.add_argument("--prompt", help="总结提示词")
+    prompt_group.add_argument("--prompt-file", help="从文件读取总结提示词")
+    prompt_group.add_argument("--preset", type=int,
+                              help=f"使用预设模板（1-{len(PRESET_PROMPTS)}），默认为第1个")
+    common.add_argument("--model", help="模型，默认使用配置文件中的模型")
+    common.add_argument("--api-key", help="DeepSeek API密钥，也可使用环境变量 DEEPSEEK_API_KEY")
+    common.add_argument("--api-url", help="DeepSeek API地址")
+    common.add_argument("--chatlog-url", help="chatlog服务地址")
+    common.add_argument("--config", help="配置文件路径，默认为程序目录下的 config.json")
+    common.add_argument("--output-dir", help="结果输出目录")
+    common.add_argument("--concurrency", type=int, help="最大并发请求数")
+    common.add_argument("--fetch-concurrency", type=int, help="多天聊天记录按天分片并行下载的分片数")
+    common.add_argument("--rpm", type=int, help="每分钟最多发送给DeepSeek的请求数")
+    common.add_argument("--cost-budget", type=float,
+                        help="单个联系人总结的费用预算（元），预计费用超出时跳过该联系人，0为不限制")
+    common.add_argument("--no-cache", action="store_true", help="不使用本地聊天记录缓存和总结缓存")
+    common.add_argument("--trace", action="store_true",
+                        help="把各步骤的耗时导出为Chrome trace（输出目录下的 trace.json）")
+    common.add_argument("--no-compact", action="store_true", help="发送前不精简聊天记录")
+
+    run_parser = subparsers.add_parser("run", parents=[common], help="总结一次指定日期范围的聊天记录")
+    run_parser.add_argument("--start", type=iso_date, help="开始日期 YYYY-MM-DD，默认为昨天")
+    run_parser.add_argument("--end", type=iso_date, help="结束日期 YYYY-MM-DD，默认与开始日期相同")
+
+    daemon_parser = subparsers.add_parser("daemon", parents=[common], help="每天定时生成聊天报告")
+    daemon_parser.add_argument("--at", default="08:00", help="每天运行的时间 HH:MM，默认为 08:00")
+    daemon_parser.add_argument("--days-back", type=int, default=1, help="总结几天前的聊天记录，默认为1（昨天）")
+    daemon_parser.add_argument("--run-now", action="store_true", help="启动后立即运行一次")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    stop_event = threading.Event()
+
+    def handle_signal(signum, frame):
+        log("收到停止信号，等待进行中的请求结束...")
+        stop_event.set()
+
+    signal.signal(signal.SIGINT, handle_signal)
+    signal.signal(signal.SIGTERM, handle_signal)
+
+    commands = {"run": command_run, "daemon": command_daemon}
+    try:
+        return commands[args.command](args, stop_event)
+    except (CLIError, chatlog_client.ChatlogServiceError, ValueError, OSError) as e:
+        log(f"错误: {e}")
+        return 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
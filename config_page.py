@@ -1,29 +1,44 @@
 import os
 import json
-import sys
 from PyQt5.QtWidgets import (QWidget, QLabel, QLineEdit, QVBoxLayout, QHBoxLayout, 
                              QPushButton, QComboBox, QMessageBox, QGroupBox, QFormLayout,
-                             QSpacerItem, QSizePolicy)
+                             QSpacerItem, QSizePolicy, QSpinBox, QDoubleSpinBox, QCheckBox)
 from PyQt5.QtCore import Qt
 from PyQt5.QtGui import QFont
 
-def get_config_path():
-    """获取配置文件路径，兼容开发环境和打包后的环境"""
-    if getattr(sys, 'frozen', False):
-        # 打包后的环境
-        application_path = os.path.dirname(sys.executable)
-    else:
-        # 开发环境
-        application_path = os.path.dirname(os.path.abspath(__file__))
-    
-    return os.path.join(application_path, "config.json")
+from app_config import (get_config_path, load_config_file, DEFAULT_API_URL, DEFAULT_MODEL,
+                        DEFAULT_CHATLOG_URL, DEFAULT_CHUNK_TOKEN_BUDGET, DEFAULT_MAX_CONCURRENCY,
+                        DEFAULT_CHATLOG_CACHE_MAX_MB, DEFAULT_SUMMARY_CACHE_MAX_MB,
+                        DEFAULT_SUMMARY_CACHE_MAX_DAYS, DEFAULT_HTTP_POOL_SIZE,
+                        DEFAULT_HTTP_MAX_RETRIES, DEFAULT_COMPACT_TRANSCRIPT,
+                        DEFAULT_CHATLOG_FETCH_CONCURRENCY, DEFAULT_INPUT_PRICE_PER_M,
+                        DEFAULT_OUTPUT_PRICE_PER_M, DEFAULT_COST_BUDGET)
+from chatlog_cache import get_chatlog_cache
+import http_session
+import deepseek_client
+from summary_cache import get_summary_cache
+from diagnostics_dialog import DiagnosticsDialog
+from tracing import tracer
 
 class ConfigPage(QWidget):
     def __init__(self):
         super().__init__()
-        self.init_ui()
-        self.setup_style()
-        self.load_config()
+        # 界面在第一次切换到配置页时才创建，启动时只读取配置文件
+        self._ui_ready = False
+        self._file_config = load_config_file()
+        http_session.configure_session(
+            int(self._file_config.get("http_pool_size", DEFAULT_HTTP_POOL_SIZE)),
+            int(self._file_config.get("http_max_retries", DEFAULT_HTTP_MAX_RETRIES)))
+    
+    def ensure_ui(self):
+        """创建配置页界面并填入配置"""
+        if self._ui_ready:
+            return
+        self._ui_ready = True
+        with tracer.span("app.config_page", "app"):
+            self.init_ui()
+            self.setup_style()
+            self.load_config()
     
     def setup_style(self):
         """设置UI样式"""
@@ -82,6 +97,19 @@ class ConfigPage(QWidget):
             }
         """
         
+        # 设置数字输入框样式
+        spinbox_style = """
+            QSpinBox, QDoubleSpinBox {
+                border: 1px solid #cccccc;
+                border-radius: 4px;
+                padding: 6px;
+                background-color: #ffffff;
+            }
+            QSpinBox:focus, QDoubleSpinBox:focus {
+                border: 1px solid #4a86e8;
+            }
+        """
+        
         # 设置组框样式
         group_style = """
             QGroupBox {
@@ -104,8 +132,23 @@ class ConfigPage(QWidget):
         self.api_url_input.setStyleSheet(input_style)
         self.chatlog_service_url_input.setStyleSheet(input_style)
         self.model_combo.setStyleSheet(combobox_style)
+        self.chunk_token_budget_input.setStyleSheet(spinbox_style)
+        self.max_concurrency_input.setStyleSheet(spinbox_style)
+        self.chatlog_fetch_concurrency_input.setStyleSheet(spinbox_style)
+        self.input_price_input.setStyleSheet(spinbox_style)
+        self.output_price_input.setStyleSheet(spinbox_style)
+        self.cost_budget_input.setStyleSheet(spinbox_style)
+        self.chatlog_cache_max_mb_input.setStyleSheet(spinbox_style)
+        self.purge_cache_button.setStyleSheet(button_style)
+        self.summary_cache_max_mb_input.setStyleSheet(spinbox_style)
+        self.summary_cache_max_days_input.setStyleSheet(spinbox_style)
+        self.purge_summary_cache_button.setStyleSheet(button_style)
+        self.diagnostics_button.setStyleSheet(button_style)
+        self.http_pool_size_input.setStyleSheet(spinbox_style)
+        self.http_max_retries_input.setStyleSheet(spinbox_style)
         self.deepseek_group.setStyleSheet(group_style)
         self.chatlog_service_group.setStyleSheet(group_style)
+        self.advanced_group.setStyleSheet(group_style)
     
     def init_ui(self):
         # 创建主布局
@@ -152,6 +195,132 @@ class ConfigPage(QWidget):
         
         self.chatlog_service_group.setLayout(chatlog_service_layout)
         
+        # 高级设置组
+        self.advanced_group = QGroupBox("高级设置")
+        advanced_layout = QFormLayout()
+        advanced_layout.setContentsMargins(15, 20, 15, 15)
+        advanced_layout.setSpacing(15)
+        
+        # 单次请求的token上限，超出后自动分段总结
+        self.chunk_token_budget_input = QSpinBox()
+        self.chunk_token_budget_input.setRange(4000, 1000000)
+        self.chunk_token_budget_input.setSingleStep(1000)
+        self.chunk_token_budget_input.setValue(DEFAULT_CHUNK_TOKEN_BUDGET)
+        self.chunk_token_budget_input.setToolTip("聊天记录超过该token数时，自动分段并行总结后再合并")
+        advanced_layout.addRow("分段token上限:", self.chunk_token_budget_input)
+        
+        # 分段总结的并发请求数
+        self.max_concurrency_input = QSpinBox()
+        self.max_concurrency_input.setRange(1, 16)
+        self.max_concurrency_input.setValue(DEFAULT_MAX_CONCURRENCY)
+        advanced_layout.addRow("最大并发请求数:", self.max_concurrency_input)
+        
+        # 多天的聊天记录按天分片并行下载
+        self.chatlog_fetch_concurrency_input = QSpinBox()
+        self.chatlog_fetch_concurrency_input.setRange(1, 16)
+        self.chatlog_fetch_concurrency_input.setValue(DEFAULT_CHATLOG_FETCH_CONCURRENCY)
+        self.chatlog_fetch_concurrency_input.setToolTip(
+            "日期范围超过一天时按天分片下载，只下载未缓存的日期，失败的日期单独重试")
+        advanced_layout.addRow("聊天记录并行下载数:", self.chatlog_fetch_concurrency_input)
+        
+        # 每百万token价格，用于发送前估算费用
+        price_layout = QHBoxLayout()
+        self.input_price_input = QDoubleSpinBox()
+        self.input_price_input.setRange(0, 1000)
+        self.input_price_input.setDecimals(2)
+        self.input_price_input.setPrefix("输入 ¥")
+        self.input_price_input.setValue(DEFAULT_INPUT_PRICE_PER_M)
+        self.output_price_input = QDoubleSpinBox()
+        self.output_price_input.setRange(0, 1000)
+        self.output_price_input.setDecimals(2)
+        self.output_price_input.setPrefix("输出 ¥")
+        self.output_price_input.setValue(DEFAULT_OUTPUT_PRICE_PER_M)
+        price_layout.addWidget(self.input_price_input)
+        price_layout.addWidget(self.output_price_input)
+        advanced_layout.addRow("每百万token价格:", price_layout)
+        
+        # 单次总结的费用预算，超出时发送前需要确认
+        self.cost_budget_input = QDoubleSpinBox()
+        self.cost_budget_input.setRange(0, 10000)
+        self.cost_budget_input.setDecimals(2)
+        self.cost_budget_input.setPrefix("¥")
+        self.cost_budget_input.setSpecialValueText("不限制")
+        self.cost_budget_input.setValue(DEFAULT_COST_BUDGET)
+        self.cost_budget_input.setToolTip("发送前估算输入token数和费用，预计费用超出预算时需要确认，批量总结中直接跳过")
+        advanced_layout.addRow("单次总结费用预算:", self.cost_budget_input)
+        
+        # 发送前精简聊天记录
+        self.compact_transcript_checkbox = QCheckBox("发送前精简聊天记录")
+        self.compact_transcript_checkbox.setChecked(DEFAULT_COMPACT_TRANSCRIPT)
+        self.compact_transcript_checkbox.setToolTip(
+            "时间只保留到分钟，发送者替换为简短代号，去掉表情、系统通知和重复转发的内容，减少token消耗")
+        advanced_layout.addRow("聊天记录预处理:", self.compact_transcript_checkbox)
+        
+        # 聊天记录缓存容量，超出后淘汰最久未使用的记录
+        cache_layout = QHBoxLayout()
+        self.chatlog_cache_max_mb_input = QSpinBox()
+        self.chatlog_cache_max_mb_input.setRange(16, 102400)
+        self.chatlog_cache_max_mb_input.setSuffix(" MB")
+        self.chatlog_cache_max_mb_input.setValue(DEFAULT_CHATLOG_CACHE_MAX_MB)
+        self.chatlog_cache_max_mb_input.setToolTip("历史日期的聊天记录会缓存到本地，超出容量时淘汰最久未使用的记录")
+        self.purge_cache_button = QPushButton("清空缓存")
+        self.purge_cache_button.clicked.connect(self.purge_chatlog_cache)
+        cache_layout.addWidget(self.chatlog_cache_max_mb_input)
+        cache_layout.addWidget(self.purge_cache_button)
+        advanced_layout.addRow("聊天记录缓存:", cache_layout)
+        
+        # 总结结果缓存：容量和保存天数
+        summary_cache_layout = QHBoxLayout()
+        self.summary_cache_max_mb_input = QSpinBox()
+        self.summary_cache_max_mb_input.setRange(1, 10240)
+        self.summary_cache_max_mb_input.setSuffix(" MB")
+        self.summary_cache_max_mb_input.setValue(DEFAULT_SUMMARY_CACHE_MAX_MB)
+        self.summary_cache_max_days_input = QSpinBox()
+        self.summary_cache_max_days_input.setRange(1, 3650)
+        self.summary_cache_max_days_input.setSuffix(" 天")
+        self.summary_cache_max_days_input.setValue(DEFAULT_SUMMARY_CACHE_MAX_DAYS)
+        self.summary_cache_max_days_input.setToolTip("超过保存天数的总结结果会被淘汰")
+        self.purge_summary_cache_button = QPushButton("清空缓存")
+        self.purge_summary_cache_button.clicked.connect(self.purge_summary_cache)
+        summary_cache_layout.addWidget(self.summary_cache_max_mb_input)
+        summary_cache_layout.addWidget(self.summary_cache_max_days_input)
+        summary_cache_layout.addWidget(self.purge_summary_cache_button)
+        advanced_layout.addRow("总结结果缓存:", summary_cache_layout)
+        
+        # HTTP连接池：chatlog服务和DeepSeek API共用长连接
+        http_layout = QHBoxLayout()
+        self.http_pool_size_input = QSpinBox()
+        self.http_pool_size_input.setRange(1, 64)
+        self.http_pool_size_input.setPrefix("连接池 ")
+        self.http_pool_size_input.setValue(DEFAULT_HTTP_POOL_SIZE)
+        self.http_max_retries_input = QSpinBox()
+        self.http_max_retries_input.setRange(0, 10)
+        self.http_max_retries_input.setPrefix("重试 ")
+        self.http_max_retries_input.setSuffix(" 次")
+        self.http_max_retries_input.setValue(DEFAULT_HTTP_MAX_RETRIES)
+        self.http_max_retries_input.setToolTip("连接失败或服务返回429/5xx时按退避间隔自动重试")
+        http_layout.addWidget(self.http_pool_size_input)
+        http_layout.addWidget(self.http_max_retries_input)
+        advanced_layout.addRow("HTTP连接:", http_layout)
+        
+        # 连接复用统计
+        self.connection_stats_label = QLabel("")
+        self.connection_stats_label.setStyleSheet("color: #666666;")
+        advanced_layout.addRow("连接统计:", self.connection_stats_label)
+        
+        # DeepSeek上下文缓存命中统计
+        self.usage_stats_label = QLabel("")
+        self.usage_stats_label.setStyleSheet("color: #666666;")
+        advanced_layout.addRow("上下文缓存:", self.usage_stats_label)
+        
+        # 各操作的耗时记录
+        self.diagnostics_button = QPushButton("查看耗时记录")
+        self.diagnostics_button.setToolTip("联系人加载、聊天记录下载和解析、首字延迟、生成速度等各步骤的耗时")
+        self.diagnostics_button.clicked.connect(self.open_diagnostics)
+        advanced_layout.addRow("性能诊断:", self.diagnostics_button)
+        
+        self.advanced_group.setLayout(advanced_layout)
+        
         # 保存按钮
         button_layout = QHBoxLayout()
         self.save_button = QPushButton("保存配置")
@@ -164,6 +333,7 @@ class ConfigPage(QWidget):
         # 添加到主布局
         main_layout.addWidget(self.deepseek_group)
         main_layout.addWidget(self.chatlog_service_group)
+        main_layout.addWidget(self.advanced_group)
         main_layout.addLayout(button_layout)
         main_layout.addStretch(1)  # 添加弹性空间
         
@@ -197,6 +367,32 @@ class ConfigPage(QWidget):
                     chatlog_service_url = config.get("chatlog_service_url", "http://127.0.0.1:5030/api/v1")
                     self.chatlog_service_url_input.setText(chatlog_service_url)
                     
+                    # 高级设置
+                    self.chunk_token_budget_input.setValue(
+                        int(config.get("chunk_token_budget", DEFAULT_CHUNK_TOKEN_BUDGET)))
+                    self.max_concurrency_input.setValue(
+                        int(config.get("max_concurrency", DEFAULT_MAX_CONCURRENCY)))
+                    self.chatlog_fetch_concurrency_input.setValue(
+                        int(config.get("chatlog_fetch_concurrency", DEFAULT_CHATLOG_FETCH_CONCURRENCY)))
+                    self.compact_transcript_checkbox.setChecked(
+                        bool(config.get("compact_transcript", DEFAULT_COMPACT_TRANSCRIPT)))
+                    self.input_price_input.setValue(
+                        float(config.get("input_price_per_m", DEFAULT_INPUT_PRICE_PER_M)))
+                    self.output_price_input.setValue(
+                        float(config.get("output_price_per_m", DEFAULT_OUTPUT_PRICE_PER_M)))
+                    self.cost_budget_input.setValue(
+                        float(config.get("cost_budget", DEFAULT_COST_BUDGET)))
+                    self.chatlog_cache_max_mb_input.setValue(
+                        int(config.get("chatlog_cache_max_mb", DEFAULT_CHATLOG_CACHE_MAX_MB)))
+                    self.summary_cache_max_mb_input.setValue(
+                        int(config.get("summary_cache_max_mb", DEFAULT_SUMMARY_CACHE_MAX_MB)))
+                    self.summary_cache_max_days_input.setValue(
+                        int(config.get("summary_cache_max_days", DEFAULT_SUMMARY_CACHE_MAX_DAYS)))
+                    self.http_pool_size_input.setValue(
+                        int(config.get("http_pool_size", DEFAULT_HTTP_POOL_SIZE)))
+                    self.http_max_retries_input.setValue(
+                        int(config.get("http_max_retries", DEFAULT_HTTP_MAX_RETRIES)))
+                    
                     print("配置加载成功")  # 调试信息
             except Exception as e:
                 print(f"加载配置失败: {str(e)}")
@@ -208,6 +404,39 @@ class ConfigPage(QWidget):
             # 默认设置
             self.api_url_input.setText("https://api.deepseek.com/v1")
             self.chatlog_service_url_input.setText("http://127.0.0.1:5030/api/v1")
+        
+        self.apply_http_config()
+    
+    def apply_http_config(self):
+        """按当前设置调整共享HTTP连接池"""
+        http_session.configure_session(self.http_pool_size_input.value(),
+                                       self.http_max_retries_input.value())
+    
+    def refresh_connection_stats(self):
+        """刷新连接复用统计"""
+        stats = http_session.stats.snapshot()
+        self.connection_stats_label.setText(
+            f"请求 {stats['requests']} 次，新建连接 {stats['new_connections']} 次，"
+            f"复用率 {stats['reuse_rate']:.0%}"
+        )
+        usage = deepseek_client.usage_stats.snapshot()
+        text = (f"请求 {usage['requests']} 次，输入缓存命中 {usage['cache_hit_tokens']}/"
+                f"{usage['cache_hit_tokens'] + usage['cache_miss_tokens']} tokens，"
+                f"命中率 {usage['cache_hit_rate']:.0%}")
+        if usage['hit_first_token_latency'] is not None and usage['miss_first_token_latency'] is not None:
+            text += (f"，首字延迟 命中 {usage['hit_first_token_latency']:.1f}s / "
+                     f"未命中 {usage['miss_first_token_latency']:.1f}s")
+        self.usage_stats_label.setText(text)
+    
+    def open_diagnostics(self):
+        """打开性能诊断对话框"""
+        DiagnosticsDialog(self).exec_()
+    
+    def showEvent(self, event):
+        """切换到配置页时创建界面，并刷新连接统计和上下文缓存统计"""
+        self.ensure_ui()
+        super().showEvent(event)
+        self.refresh_connection_stats()
     
     def save_config(self):
         """保存配置"""
@@ -217,14 +446,36 @@ class ConfigPage(QWidget):
         model = self.model_combo.currentText() or "deepseek-chat"
         chatlog_service_url = self.chatlog_service_url_input.text().strip() or "http://127.0.0.1:5030/api/v1"
         
-        config = {
+        config_path = get_config_path()
+        
+        # 保留配置文件中界面未展示的其他配置项
+        config = {}
+        if os.path.exists(config_path):
+            try:
+                with open(config_path, "r", encoding="utf-8") as f:
+                    config = json.load(f)
+            except Exception:
+                config = {}
+        
+        config.update({
             "api_key": api_key,
             "api_url": api_url,
             "model": model,
-            "chatlog_service_url": chatlog_service_url
-        }
+            "chatlog_service_url": chatlog_service_url,
+            "chunk_token_budget": self.chunk_token_budget_input.value(),
+            "max_concurrency": self.max_concurrency_input.value(),
+            "chatlog_fetch_concurrency": self.chatlog_fetch_concurrency_input.value(),
+            "compact_transcript": self.compact_transcript_checkbox.isChecked(),
+            "input_price_per_m": self.input_price_input.value(),
+            "output_price_per_m": self.output_price_input.value(),
+            "cost_budget": self.cost_budget_input.value(),
+            "chatlog_cache_max_mb": self.chatlog_cache_max_mb_input.value(),
+            "summary_cache_max_mb": self.summary_cache_max_mb_input.value(),
+            "summary_cache_max_days": self.summary_cache_max_days_input.value(),
+            "http_pool_size": self.http_pool_size_input.value(),
+            "http_max_retries": self.http_max_retries_input.value()
+        })
         
-        config_path = get_config_path()
         print(f"正在保存配置到: {config_path}")  # 调试信息
         print(f"保存的配置: API密钥={'***已设置***' if api_key else '未设置'}, API地址={api_url}, 模型={model}")  # 调试信息
         
@@ -236,17 +487,77 @@ class ConfigPage(QWidget):
                 json.dump(config, f, ensure_ascii=False, indent=4)
             
             print("配置保存成功")  # 调试信息
+            self.apply_http_config()
             QMessageBox.information(self, "成功", "配置已保存")
         except Exception as e:
             error_msg = f"无法保存配置: {str(e)}"
             print(f"保存配置失败: {error_msg}")  # 调试信息
             QMessageBox.critical(self, "保存失败", error_msg)
     
+    def purge_chatlog_cache(self):
+        """清空本地聊天记录缓存"""
+        try:
+            cache = get_chatlog_cache()
+            count, total_bytes = cache.stats()
+            cache.purge()
+            print(f"已清空聊天记录缓存: {count} 条, {total_bytes / 1024 / 1024:.1f} MB")  # 调试信息
+            QMessageBox.information(self, "成功", f"已清空 {count} 条聊天记录缓存")
+        except Exception as e:
+            QMessageBox.critical(self, "清空失败", f"无法清空缓存: {str(e)}")
+    
+    def purge_summary_cache(self):
+        """清空本地总结结果缓存"""
+        try:
+            cache = get_summary_cache()
+            stats = cache.stats()
+            cache.purge()
+            print(f"已清空总结缓存: {stats['entries']} 条, 命中率 {stats['hit_rate']:.0%}")  # 调试信息
+            QMessageBox.information(self, "成功", f"已清空 {stats['entries']} 条总结缓存")
+        except Exception as e:
+            QMessageBox.critical(self, "清空失败", f"无法清空缓存: {str(e)}")
+    
+    def _file_config_values(self):
+        """配置页界面尚未创建时，按配置文件返回与 get_config() 相同的配置项"""
+        config = self._file_config
+        return {
+            "api_key": config.get("api_key", ""),
+            "api_url": config.get("api_url", DEFAULT_API_URL),
+            "model": config.get("model", DEFAULT_MODEL),
+            "chatlog_service_url": config.get("chatlog_service_url", DEFAULT_CHATLOG_URL),
+            "chunk_token_budget": int(config.get("chunk_token_budget", DEFAULT_CHUNK_TOKEN_BUDGET)),
+            "max_concurrency": int(config.get("max_concurrency", DEFAULT_MAX_CONCURRENCY)),
+            "chatlog_fetch_concurrency": int(config.get("chatlog_fetch_concurrency",
+                                                        DEFAULT_CHATLOG_FETCH_CONCURRENCY)),
+            "compact_transcript": bool(config.get("compact_transcript", DEFAULT_COMPACT_TRANSCRIPT)),
+            "input_price_per_m": float(config.get("input_price_per_m", DEFAULT_INPUT_PRICE_PER_M)),
+            "output_price_per_m": float(config.get("output_price_per_m", DEFAULT_OUTPUT_PRICE_PER_M)),
+            "cost_budget": float(config.get("cost_budget", DEFAULT_COST_BUDGET)),
+            "chatlog_cache_max_mb": int(config.get("chatlog_cache_max_mb", DEFAULT_CHATLOG_CACHE_MAX_MB)),
+            "summary_cache_max_mb": int(config.get("summary_cache_max_mb", DEFAULT_SUMMARY_CACHE_MAX_MB)),
+            "summary_cache_max_days": int(config.get("summary_cache_max_days", DEFAULT_SUMMARY_CACHE_MAX_DAYS)),
+            "http_pool_size": int(config.get("http_pool_size", DEFAULT_HTTP_POOL_SIZE)),
+            "http_max_retries": int(config.get("http_max_retries", DEFAULT_HTTP_MAX_RETRIES))
+        }
+    
     def get_config(self):
         """获取当前配置"""
+        if not self._ui_ready:
+            return self._file_config_values()
         return {
             "api_key": self.api_key_input.text(),
             "api_url": self.api_url_input.text(),
             "model": self.model_combo.currentText(),
-            "chatlog_service_url": self.chatlog_service_url_input.text()
+            "chatlog_service_url": self.chatlog_service_url_input.text(),
+            "chunk_token_budget": self.chunk_token_budget_input.value(),
+            "max_concurrency": self.max_concurrency_input.value(),
+            "chatlog_fetch_concurrency": self.chatlog_fetch_concurrency_input.value(),
+            "compact_transcript": self.compact_transcript_checkbox.isChecked(),
+            "input_price_per_m": self.input_price_input.value(),
+            "output_price_per_m": self.output_price_input.value(),
+            "cost_budget": self.cost_budget_input.value(),
+            "chatlog_cache_max_mb": self.chatlog_cache_max_mb_input.value(),
+            "summary_cache_max_mb": self.summary_cache_max_mb_input.value(),
+            "summary_cache_max_days": self.summary_cache_max_days_input.value(),
+            "http_pool_size": self.http_pool_size_input.value(),
+            "http_max_retries": self.http_max_retries_input.value()
         }
\ No newline at end of file
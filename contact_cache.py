@@ -0,0 +1,128 @@
+import sqlite3
+import threading
+import time
+
+from app_config import get_data_path
+from contact_index import ContactStore
+
+CACHE_FILENAME = "contact_cache.db"
+
+
+class ContactCache:
+    """按chatlog服务地址保存联系人列表快照的本地SQLite存储
+
+    启动时先显示上次保存的联系人列表，不需要等待chatlog服务返回；
+    后台获取到最新的联系人列表后只写入新增、删除和变化的联系人。
+    行的顺序与内存中的列表一致：删除的行留下空位，新增的行追加在末尾。
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS contact (
+                service TEXT NOT NULL,
+                position INTEGER NOT NULL,
+                user_name TEXT NOT NULL,
+                nick_name TEXT NOT NULL,
+                remark TEXT NOT NULL,
+                PRIMARY KEY (service, position)
+            )
+        """)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS snapshot (
+                service TEXT PRIMARY KEY,
+                count INTEGER NOT NULL,
+                saved_at REAL NOT NULL
+            )
+        """)
+        self._conn.execute(
+            "CREATE UNIQUE INDEX IF NOT EXISTS idx_contact_user ON contact (service, user_name)")
+        self._conn.commit()
+
+    def load(self, service):
+        """读取联系人快照，返回 (ContactStore, 保存时间)；没有快照时返回 (None, None)"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT saved_at FROM snapshot WHERE service = ?", (service,)).fetchone()
+            if row is None:
+                return None, None
+            rows = self._conn.execute(
+                "SELECT user_name, nick_name, remark FROM contact WHERE service = ? ORDER BY position",
+                (service,)
+            ).fetchall()
+        # 直接按列填充，不为每个联系人构造字典
+        store = ContactStore()
+        if rows:
+            store.user_names, store.nick_names, store.remarks = (list(column) for column in zip(*rows))
+        return store, row[0]
+
+    def save(self, service, store):
+        """用最新的联系人列表覆盖快照，store 中的微信号不能重复（见 ContactStore.unique）"""
+        with self._lock:
+            self._conn.execute("DELETE FROM contact WHERE service = ?", (service,))
+            self._conn.executemany(
+                "INSERT INTO contact (service, position, user_name, nick_name, remark) VALUES (?, ?, ?, ?, ?)",
+                ((service, position, user_name, nick_name, remark)
+                 for position, (user_name, nick_name, remark)
+                 in enumerate(zip(store.user_names, store.nick_names, store.remarks)))
+            )
+            self._conn.execute(
+                "INSERT OR REPLACE INTO snapshot (service, count, saved_at) VALUES (?, ?, ?)",
+                (service, len(store), time.time())
+            )
+            self._conn.commit()
+
+    def apply_delta(self, service, delta, count):
+        """把联系人差异（ContactDelta）写入快照，count 为更新后的联系人数
+
+        该服务地址还没有快照时不写入并返回False，由调用方保存完整列表。
+        """
+        with self._lock:
+            if self._conn.execute("SELECT 1 FROM snapshot WHERE service = ?", (service,)).fetchone() is None:
+                return False
+            self._conn.executemany(
+                "DELETE FROM contact WHERE service = ? AND user_name = ?",
+                ((service, user_name) for user_name in delta.removed_names)
+            )
+            self._conn.executemany(
+                "UPDATE contact SET nick_name = ?, remark = ? WHERE service = ? AND user_name = ?",
+                ((nick_name, remark, service, user_name) for _, user_name, nick_name, remark in delta.changed)
+            )
+            if delta.added:
+                start = self._conn.execute(
+                    "SELECT COALESCE(MAX(position), -1) + 1 FROM contact WHERE service = ?", (service,)
+                ).fetchone()[0]
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO contact (service, position, user_name, nick_name, remark) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    ((service, start + offset, user_name, nick_name, remark)
+                     for offset, (user_name, nick_name, remark) in enumerate(delta.added))
+                )
+            self._conn.execute(
+                "UPDATE snapshot SET count = ?, saved_at = ? WHERE service = ?", (count, time.time(), service))
+            self._conn.commit()
+        return True
+
+    def purge(self):
+        """清空全部快照"""
+        with self._lock:
+            self._conn.execute("DELETE FROM contact")
+            self._conn.execute("DELETE FROM snapshot")
+            self._conn.commit()
+            self._conn.execute("VACUUM")
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_contact_cache():
+    """获取全局共享的联系人快照缓存"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ContactCache(get_data_path(CACHE_FILENAME))
+        return _cache
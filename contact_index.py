@@ -0,0 +1,323 @@
+import re
+from bisect import bisect_right
+from functools import lru_cache
+
+# GB2312一级汉字按拼音排序，每个声母对应区间的起始编码
+_GB2312_INITIALS = [
+    (0xB0A1, 'a'), (0xB0C5, 'b'), (0xB2C1, 'c'), (0xB4EE, 'd'), (0xB6EA, 'e'),
+    (0xB7A2, 'f'), (0xB8C1, 'g'), (0xB9FE, 'h'), (0xBBF7, 'j'), (0xBFA6, 'k'),
+    (0xC0AC, 'l'), (0xC2E8, 'm'), (0xC4C3, 'n'), (0xC5B6, 'o'), (0xC5BE, 'p'),
+    (0xC6DA, 'q'), (0xC8BB, 'r'), (0xC8F6, 's'), (0xCBFA, 't'), (0xCDDA, 'w'),
+    (0xCEF4, 'x'), (0xD1B9, 'y'), (0xD4D1, 'z'),
+]
+_GB2312_CODES = [code for code, _ in _GB2312_INITIALS]
+_GB2312_LEVEL1_END = 0xD7F9
+
+
+@lru_cache(maxsize=8192)
+def _char_initial(char):
+    if char.isascii():
+        return char.lower() if char.isalnum() else ""
+    try:
+        data = char.encode("gb2312")
+    except UnicodeEncodeError:
+        return ""
+    if len(data) != 2:
+        return ""
+    code = data[0] * 256 + data[1]
+    # 二级汉字按部首排序，无法由编码区间得到声母
+    if code < _GB2312_CODES[0] or code > _GB2312_LEVEL1_END:
+        return ""
+    return _GB2312_INITIALS[bisect_right(_GB2312_CODES, code) - 1][1]
+
+
+def pinyin_initials(text):
+    """获取文本的拼音首字母，例如"张三"得到"zs"，字母和数字保持不变"""
+    return "".join(_char_initial(char) for char in text)
+
+
+def contact_display_name(contact):
+    """联系人的显示名称"""
+    return contact.get('nickName') or contact.get('remark') or contact.get('userName')
+
+
+class ContactStore:
+    """按列存储的联系人列表
+
+    只保留微信号、昵称和备注三列字符串，不为每个联系人保存完整的字典，
+    需要时再由 contact() 按行构造。
+    """
+    __slots__ = ("user_names", "nick_names", "remarks")
+
+    def __init__(self, contacts=()):
+        self.user_names = []
+        self.nick_names = []
+        self.remarks = []
+        for contact in contacts:
+            self.user_names.append(contact.get('userName') or '')
+            self.nick_names.append(contact.get('nickName') or '')
+            self.remarks.append(contact.get('remark') or '')
+
+    def __len__(self):
+        return len(self.user_names)
+
+    def display_name(self, row):
+        return self.nick_names[row] or self.remarks[row] or self.user_names[row]
+
+    def contact(self, row):
+        return {
+            'userName': self.user_names[row],
+            'nickName': self.nick_names[row],
+            'remark': self.remarks[row],
+        }
+
+    def copy(self):
+        store = ContactStore()
+        store.user_names = list(self.user_names)
+        store.nick_names = list(self.nick_names)
+        store.remarks = list(self.remarks)
+        return store
+
+    def unique(self):
+        """同一个微信号出现多次时只保留第一次，没有重复时返回自身"""
+        if len(set(self.user_names)) == len(self.user_names):
+            return self
+        store = ContactStore()
+        seen = set()
+        for user_name, nick_name, remark in zip(self.user_names, self.nick_names, self.remarks):
+            if user_name not in seen:
+                seen.add(user_name)
+                store.append(user_name, nick_name, remark)
+        return store
+
+    def set_row(self, row, user_name, nick_name, remark):
+        self.user_names[row] = user_name
+        self.nick_names[row] = nick_name
+        self.remarks[row] = remark
+
+    def remove_rows(self, first, last):
+        """删除 first 到 last（含）的行"""
+        del self.user_names[first:last + 1]
+        del self.nick_names[first:last + 1]
+        del self.remarks[first:last + 1]
+
+    def append(self, user_name, nick_name, remark):
+        self.user_names.append(user_name)
+        self.nick_names.append(nick_name)
+        self.remarks.append(remark)
+
+    def apply_delta(self, delta):
+        """就地应用联系人差异：更新变化的行，删除移除的行，在末尾追加新增的联系人"""
+        for row, user_name, nick_name, remark in delta.changed:
+            self.set_row(row, user_name, nick_name, remark)
+        for first, last in reversed(delta.removed_runs()):
+            self.remove_rows(first, last)
+        for user_name, nick_name, remark in delta.added:
+            self.append(user_name, nick_name, remark)
+
+
+class ContactDelta:
+    """两次获取的联系人列表之间的差异
+
+    removed 为删除的行号（升序，对应旧列表），changed 为昵称或备注变化的行
+    (行号, 微信号, 昵称, 备注)，added 为新增的联系人 (微信号, 昵称, 备注)，
+    removed_names 为新列表中已不存在的微信号，用于更新本地快照。
+    """
+    __slots__ = ("removed", "removed_names", "changed", "added")
+
+    def __init__(self):
+        self.removed = []
+        self.removed_names = []
+        self.changed = []
+        self.added = []
+
+    def __bool__(self):
+        return bool(self.removed or self.changed or self.added)
+
+    def removed_runs(self):
+        """把删除的行号合并为连续区间 [(起始行, 结束行)]"""
+        runs = []
+        for row in self.removed:
+            if runs and runs[-1][1] == row - 1:
+                runs[-1][1] = row
+            else:
+                runs.append([row, row])
+        return [(first, last) for first, last in runs]
+
+    def describe(self):
+        return f"新增 {len(self.added)}，删除 {len(self.removed)}，修改 {len(self.changed)}"
+
+
+def diff_contacts(old, new):
+    """按微信号比较两个 ContactStore，返回把 old 变为 new 所需的 ContactDelta
+
+    旧列表中的顺序保持不变，新增的联系人按新列表中的顺序追加在末尾；
+    同一个微信号出现多次时只保留第一次。
+    """
+    new_rows = {}
+    for row, user_name in enumerate(new.user_names):
+        new_rows.setdefault(user_name, row)
+
+    delta = ContactDelta()
+    kept = set()
+    for row, user_name in enumerate(old.user_names):
+        new_row = new_rows.get(user_name)
+        if new_row is None or user_name in kept:
+            delta.removed.append(row)
+            if new_row is None:
+                delta.removed_names.append(user_name)
+            continue
+        kept.add(user_name)
+        nick_name = new.nick_names[new_row]
+        remark = new.remarks[new_row]
+        if nick_name != old.nick_names[row] or remark != old.remarks[row]:
+            delta.changed.append((row, user_name, nick_name, remark))
+
+    for row, user_name in enumerate(new.user_names):
+        if user_name not in kept and new_rows[user_name] == row:
+            delta.added.append((user_name, new.nick_names[row], new.remarks[row]))
+    return delta
+
+
+def _build_char_rows(rows):
+    """建立 字符 -> 包含该字符的行号列表 的倒排表"""
+    char_rows = {}
+    for row, text in enumerate(rows):
+        for char in set(text):
+            char_rows.setdefault(char, []).append(row)
+    return char_rows
+
+
+def _candidate_rows(keyword, char_rows):
+    """取关键词中最少见字符的行号列表作为候选，关键词中有字符从未出现时返回空列表"""
+    best = None
+    for char in set(keyword):
+        rows = char_rows.get(char)
+        if not rows:
+            return []
+        if best is None or len(rows) < len(best):
+            best = rows
+    return best
+
+
+class ContactIndex:
+    """联系人的内存索引，支持前缀、子串、拼音首字母和模糊匹配
+
+    每个联系人的昵称、备注和微信号拼接为一行文本，查询时先通过字符倒排表
+    缩小候选范围；输入的关键词在上一次关键词基础上追加字符时，只在上一次
+    的结果中继续筛选。
+    """
+
+    # 直接匹配的结果少于该数量时才进行模糊匹配
+    FUZZY_THRESHOLD = 50
+    # 模糊匹配最多返回的联系人数
+    FUZZY_LIMIT = 200
+
+    def __init__(self, store):
+        self.store = store
+        texts = []
+        initials = []
+        for names in zip(store.nick_names, store.remarks, store.user_names):
+            # 每个字段前加制表符，"\t关键词" 即表示字段前缀匹配
+            texts.append("".join("\t" + name.lower().replace("\n", " ") for name in names))
+            initials.append("".join("\t" + pinyin_initials(name) for name in names[:2]))
+        self._texts = texts
+        self._initials = initials
+        self._text_char_rows = _build_char_rows(texts)
+        self._initials_char_rows = _build_char_rows(initials)
+
+        # 模糊匹配使用拼接后的整体文本，由正则在C层面扫描
+        self._text_blob = "\n".join(texts)
+        self._text_offsets = []
+        position = 0
+        for text in texts:
+            self._text_offsets.append(position)
+            position += len(text) + 1
+
+        self._last_keyword = None
+        self._last_direct_rows = None
+        self._last_fuzzy_rows = []
+        self._last_fuzzy_complete = False
+
+    def __len__(self):
+        return len(self.store)
+
+    def _fuzzy_rows(self, keyword, exclude, candidates=None):
+        """关键词的字符按顺序出现在同一个字段中
+
+        返回 (行号列表, 是否完整)，结果达到上限被截断时不完整。
+        """
+        # 每个字符之后只跳过"不是下一个字符"的内容，正则不需要回溯
+        parts = [re.escape(keyword[0])]
+        for char in keyword[1:]:
+            escaped = re.escape(char)
+            parts.append(f"[^\\n\\t{escaped}]*{escaped}")
+        pattern = re.compile("".join(parts))
+
+        seen = set(exclude)
+        if candidates is not None:
+            texts = self._texts
+            rows = [row for row in candidates if row not in seen and pattern.search(texts[row])]
+            return rows[:self.FUZZY_LIMIT], len(rows) <= self.FUZZY_LIMIT
+
+        rows = []
+        for match in pattern.finditer(self._text_blob):
+            row = bisect_right(self._text_offsets, match.start()) - 1
+            if row not in seen:
+                seen.add(row)
+                rows.append(row)
+                if len(rows) >= self.FUZZY_LIMIT:
+                    rows.sort()
+                    return rows, False
+        rows.sort()
+        return rows, True
+
+    def search_rows(self, keyword):
+        """返回匹配的联系人行号：字段前缀、子串、拼音首字母、模糊匹配依次排列"""
+        keyword = keyword.strip().lower()
+        if not keyword:
+            return range(len(self.store))
+
+        # 关键词是上一次关键词的延伸时，结果一定在上一次的匹配结果中
+        extends_last = bool(self._last_keyword) and keyword.startswith(self._last_keyword)
+        if extends_last:
+            text_candidates = initials_candidates = self._last_direct_rows
+        else:
+            text_candidates = _candidate_rows(keyword, self._text_char_rows)
+            initials_candidates = _candidate_rows(keyword, self._initials_char_rows)
+
+        texts = self._texts
+        field_keyword = "\t" + keyword
+        matched = [row for row in text_candidates if keyword in texts[row]]
+        prefix_rows = [row for row in matched if field_keyword in texts[row]]
+        if len(prefix_rows) == len(matched):
+            substring_rows = []
+        else:
+            prefix_set = set(prefix_rows)
+            substring_rows = [row for row in matched if row not in prefix_set]
+
+        initials_rows = []
+        if keyword.isascii() and keyword.isalnum():
+            matched_set = set(matched)
+            initials = self._initials
+            initials_rows = [row for row in initials_candidates
+                             if keyword in initials[row] and row not in matched_set]
+
+        direct_rows = prefix_rows + substring_rows + initials_rows
+        fuzzy_rows = []
+        fuzzy_complete = False
+        if len(keyword) > 1 and len(direct_rows) < self.FUZZY_THRESHOLD:
+            fuzzy_candidates = None
+            if extends_last and self._last_fuzzy_complete:
+                fuzzy_candidates = sorted(self._last_direct_rows + self._last_fuzzy_rows)
+            fuzzy_rows, fuzzy_complete = self._fuzzy_rows(keyword, direct_rows, fuzzy_candidates)
+
+        self._last_keyword = keyword
+        self._last_direct_rows = sorted(direct_rows)
+        self._last_fuzzy_rows = fuzzy_rows
+        self._last_fuzzy_complete = fuzzy_complete
+        return direct_rows + fuzzy_rows
+
+    def search(self, keyword):
+        """返回匹配的联系人列表"""
+        return [self.store.contact(row) for row in self.search_rows(keyword)]
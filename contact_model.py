@@ -0,0 +1,112 @@
+from bisect import bisect_left
+
+from PyQt5.QtCore import Qt, QAbstractListModel, QModelIndex
+
+from contact_index import ContactStore
+
+
+class ContactListModel(QAbstractListModel):
+    """联系人列表模型
+
+    数据来自按列存储的 ContactStore，显示内容在视图需要时才读取。
+    筛选时只替换行号数组，不重建任何界面元素。
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._store = ContactStore()
+        self._rows = range(0)
+        self._message = None  # 加载中、出错等提示信息，显示为一行不可选择的项
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        if self._message is not None:
+            return 1
+        return len(self._rows)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        if self._message is not None:
+            return self._message if role == Qt.DisplayRole else None
+
+        row = self._rows[index.row()]
+        if role == Qt.DisplayRole:
+            return self._store.display_name(row)
+        if role == Qt.ToolTipRole:
+            return self._store.user_names[row]
+        if role == Qt.UserRole:
+            return self._store.contact(row)  # 完整联系人数据
+        return None
+
+    def flags(self, index):
+        if self._message is not None:
+            return Qt.NoItemFlags  # 禁用提示项
+        return super().flags(index)
+
+    def store(self):
+        return self._store
+
+    def contact_count(self):
+        """当前显示的联系人数量（不含提示信息）"""
+        return 0 if self._message is not None else len(self._rows)
+
+    def set_store(self, store, rows=None):
+        """更换联系人数据，rows 为要显示的行号，默认显示全部"""
+        self.beginResetModel()
+        self._store = store
+        self._rows = range(len(store)) if rows is None else rows
+        self._message = None
+        self.endResetModel()
+
+    def set_rows(self, rows):
+        """只更换显示的行号数组"""
+        self.beginResetModel()
+        self._rows = rows
+        self._message = None
+        self.endResetModel()
+
+    def apply_delta(self, delta):
+        """把联系人差异（ContactDelta）应用到数据的副本上，旧的 ContactStore 保持不变
+
+        显示全部联系人时只通知变化、删除和新增的行，视图保留滚动位置和选中项；
+        显示筛选结果时按删除后的新行号重新映射，新增的联系人要等重新筛选后才显示。
+        返回更新后的 ContactStore。
+        """
+        store = self._store.copy()
+        if self._message is None and self._rows == range(len(self._store)):
+            self._store = store
+            if delta.changed:
+                for row, user_name, nick_name, remark in delta.changed:
+                    store.set_row(row, user_name, nick_name, remark)
+                rows = [row for row, *_ in delta.changed]
+                self.dataChanged.emit(self.index(min(rows)), self.index(max(rows)))
+            for first, last in reversed(delta.removed_runs()):
+                self.beginRemoveRows(QModelIndex(), first, last)
+                store.remove_rows(first, last)
+                self._rows = range(len(store))
+                self.endRemoveRows()
+            if delta.added:
+                start = len(store)
+                self.beginInsertRows(QModelIndex(), start, start + len(delta.added) - 1)
+                for user_name, nick_name, remark in delta.added:
+                    store.append(user_name, nick_name, remark)
+                self._rows = range(len(store))
+                self.endInsertRows()
+            return store
+
+        store.apply_delta(delta)
+        removed = delta.removed
+        removed_set = set(removed)
+        self.beginResetModel()
+        self._store = store
+        self._rows = [row - bisect_left(removed, row) for row in self._rows if row not in removed_set]
+        self.endResetModel()
+        return store
+
+    def set_message(self, text):
+        """显示一条提示信息"""
+        self.beginResetModel()
+        self._message = text
+        self.endResetModel()
@@ -0,0 +1,366 @@
+import json
+import threading
+import time
+
+import requests
+
+from http_session import get_session
+from sse_parser import SSEParser
+from tracing import tracer
+
+# 流式请求：连接超时10秒，读取超时按数据间隔自适应调整
+CONNECT_TIMEOUT = 10
+# 等待第一段数据的超时，推理模型思考阶段可能长时间没有输出
+FIRST_EVENT_TIMEOUT = 120
+REASONER_FIRST_EVENT_TIMEOUT = 600
+# 收到数据后，空闲超时为最大数据间隔的若干倍，并限制在上下限之间
+IDLE_TIMEOUT_FACTOR = 4
+MIN_IDLE_TIMEOUT = 60
+MAX_IDLE_TIMEOUT = 300
+SSE_CHUNK_SIZE = 1024
+# 非流式请求需要等待完整结果，读取超时更长
+COMPLETION_TIMEOUT = (10, 300)
+
+SYSTEM_PROMPT = "你是一个专业的聊天记录总结助手，擅长提取关键信息并进行简洁总结。使用纯文本格式，不要使用markdown格式。"
+
+
+# 流式响应中断后，带上已输出的内容请求续写的次数和间隔
+STREAM_RESUME_RETRIES = 2
+STREAM_RESUME_BACKOFF = 1.0
+RESUME_PROMPT = "上一条回复因网络中断没有输出完整，请从中断的位置直接继续输出剩余内容，不要重复已经输出的内容，也不要添加任何说明。"
+# 续写开头与已输出内容结尾重复时去掉重复部分：检查的最大长度和最小长度
+RESUME_OVERLAP_CHARS = 80
+MIN_RESUME_OVERLAP_CHARS = 4
+
+
+class DeepSeekAPIError(Exception):
+    """DeepSeek API返回了非200状态码"""
+    def __init__(self, status_code, text=""):
+        super().__init__(f"API请求失败: {status_code} - {text}")
+        self.status_code = status_code
+        self.text = text
+
+
+class StreamInterruptedError(Exception):
+    """流式响应在输出完成前结束（没有收到[DONE]或finish_reason）"""
+
+
+class RateLimiter:
+    """限制每分钟发送给DeepSeek的请求数，多个线程共用时请求按固定间隔依次放行"""
+
+    def __init__(self, requests_per_minute):
+        self.interval = 60.0 / requests_per_minute if requests_per_minute > 0 else 0.0
+        self._lock = threading.Lock()
+        self._next_time = 0.0
+
+    def acquire(self, should_stop=None):
+        """等待到可以发送下一个请求；等待期间被停止时返回False"""
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next_time)
+            self._next_time = start + self.interval
+        while True:
+            if should_stop and should_stop():
+                return False
+            wait = start - time.monotonic()
+            if wait <= 0:
+                return True
+            time.sleep(min(wait, 0.2))
+
+
+# 总结请求中聊天记录在前、提示词在后：DeepSeek按请求开头的相同前缀命中上下文缓存，
+# 同一份聊天记录换用不同提示词或重新生成时，系统消息和整段聊天记录都可以命中缓存
+CHAT_CONTENT_HEADER = "以下是聊天记录："
+INSTRUCTION_HEADER = "请按照以下要求处理上面的聊天记录："
+
+
+def build_messages(prompt, chat_content):
+    """构建总结请求的消息列表，不变的聊天记录在前，提示词在最后"""
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": f"{CHAT_CONTENT_HEADER}\n{chat_content}\n\n{INSTRUCTION_HEADER}\n{prompt}"}
+    ]
+
+
+class UsageStats:
+    """统计API返回的token用量和上下文缓存命中情况，用于评估缓存带来的延迟和费用节省"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.requests = 0
+            self.prompt_tokens = 0
+            self.completion_tokens = 0
+            self.cache_hit_tokens = 0
+            self.cache_miss_tokens = 0
+            # 按是否主要命中缓存（命中超过一半输入）分别统计首字延迟
+            self._first_token = {True: [0, 0.0], False: [0, 0.0]}
+
+    def record(self, usage, first_token_latency=None):
+        """记录一次请求的usage字段，first_token_latency 为发出请求到收到第一段内容的秒数"""
+        hit = usage.get('prompt_cache_hit_tokens', 0) or 0
+        miss = usage.get('prompt_cache_miss_tokens', 0) or 0
+        with self._lock:
+            self.requests += 1
+            self.prompt_tokens += usage.get('prompt_tokens', 0) or 0
+            self.completion_tokens += usage.get('completion_tokens', 0) or 0
+            self.cache_hit_tokens += hit
+            self.cache_miss_tokens += miss
+            if first_token_latency is not None:
+                entry = self._first_token[hit > miss]
+                entry[0] += 1
+                entry[1] += first_token_latency
+
+    def snapshot(self):
+        """返回累计用量、缓存命中率和命中/未命中时的平均首字延迟"""
+        with self._lock:
+            cached = self.cache_hit_tokens + self.cache_miss_tokens
+            hit_count, hit_latency = self._first_token[True]
+            miss_count, miss_latency = self._first_token[False]
+            return {
+                "requests": self.requests,
+                "prompt_tokens": self.prompt_tokens,
+                "completion_tokens": self.completion_tokens,
+                "cache_hit_tokens": self.cache_hit_tokens,
+                "cache_miss_tokens": self.cache_miss_tokens,
+                "cache_hit_rate": self.cache_hit_tokens / cached if cached else 0.0,
+                "hit_first_token_latency": hit_latency / hit_count if hit_count else None,
+                "miss_first_token_latency": miss_latency / miss_count if miss_count else None,
+            }
+
+
+usage_stats = UsageStats()
+
+
+def merge_usage(total, usage):
+    """把一次请求的usage累加到total中（分段总结有多次请求）"""
+    for key, value in usage.items():
+        if isinstance(value, int):
+            total[key] = total.get(key, 0) + value
+    return total
+
+
+def format_usage(usage):
+    """单次请求usage的简短说明"""
+    text = f"输入 {usage.get('prompt_tokens', 0)} tokens"
+    if 'prompt_cache_hit_tokens' in usage:
+        hit = usage.get('prompt_cache_hit_tokens', 0) or 0
+        total = hit + (usage.get('prompt_cache_miss_tokens', 0) or 0)
+        text += f"（缓存命中 {hit}，{hit / total if total else 0:.0%}）"
+    return text + f"，输出 {usage.get('completion_tokens', 0)} tokens"
+
+
+def _headers(api_key):
+    return {
+        "Content-Type": "application/json",
+        "Authorization": f"Bearer {api_key}"
+    }
+
+
+def _set_read_timeout(response, seconds):
+    """调整流式响应后续读取的超时"""
+    connection = getattr(response.raw, "connection", None)
+    sock = getattr(connection, "sock", None)
+    if sock is not None:
+        sock.settimeout(seconds)
+
+
+def _iter_events(response, should_stop=None):
+    """逐个产出响应中的SSE事件
+
+    收到第一段数据后，读取超时改为已观察到的最大数据间隔的 IDLE_TIMEOUT_FACTOR 倍，
+    keep-alive注释也算作数据，因此推理模型思考时不会误判为超时。
+    """
+    parser = SSEParser()
+    last_received = None
+    max_gap = 0.0
+    for data in response.iter_content(SSE_CHUNK_SIZE):
+        if should_stop and should_stop():
+            return
+        now = time.monotonic()
+        if last_received is not None:
+            max_gap = max(max_gap, now - last_received)
+        last_received = now
+        _set_read_timeout(response, min(MAX_IDLE_TIMEOUT, max(MIN_IDLE_TIMEOUT, max_gap * IDLE_TIMEOUT_FACTOR)))
+        yield from parser.feed(data)
+    yield from parser.close()
+
+
+def _trim_overlap(previous, text):
+    """续写的开头重复了已输出内容的结尾时，去掉重复的部分"""
+    for size in range(min(len(previous), len(text)), MIN_RESUME_OVERLAP_CHARS - 1, -1):
+        if previous.endswith(text[:size]):
+            return text[size:]
+    return text
+
+
+def _stream_once(api_key, api_url, model, messages, should_stop, on_usage, previous=""):
+    """发送一次流式请求并逐段产出回复内容
+
+    previous 不为空时本次请求是续写，开头与 previous 结尾重复的内容会被去掉。
+    响应在完成前中断时抛出 StreamInterruptedError 或 requests 的连接异常。
+    每次请求记录一个 deepseek.stream span，包含首字延迟、输出token数和生成速度。
+    """
+    with tracer.span("deepseek.stream", "deepseek", model=model, resume=bool(previous)) as span:
+        yield from _stream_request(api_key, api_url, model, messages, should_stop, on_usage, previous, span)
+
+
+def _stream_request(api_key, api_url, model, messages, should_stop, on_usage, previous, span):
+    data = {
+        "model": model,
+        "messages": messages,
+        "stream": True,
+        "stream_options": {"include_usage": True}
+    }
+    first_event_timeout = REASONER_FIRST_EVENT_TIMEOUT if "reasoner" in (model or "") else FIRST_EVENT_TIMEOUT
+    started = time.perf_counter()
+    first_token_latency = None
+
+    response = get_session().post(
+        f"{api_url}/chat/completions",
+        headers=_headers(api_key),
+        json=data,
+        stream=True,
+        timeout=(CONNECT_TIMEOUT, first_event_timeout)
+    )
+
+    if response.status_code != 200:
+        raise DeepSeekAPIError(response.status_code, response.text)
+
+    output_chars = 0
+    try:
+        finished = False
+        overlap = [] if previous else None  # 续写开头先缓冲，确认没有重复后再输出
+        for event in _iter_events(response, should_stop):
+            # 收到[DONE]后继续读完响应体，使连接可以放回连接池复用
+            if finished:
+                continue
+            if event.data == "[DONE]":
+                finished = True
+                continue
+            try:
+                chunk = json.loads(event.data)
+            except json.JSONDecodeError:
+                print(f"无法解析DeepSeek流式数据: {event.data[:200]}")  # 调试信息
+                continue
+            if chunk.get('error'):
+                raise DeepSeekAPIError(response.status_code, json.dumps(chunk['error'], ensure_ascii=False))
+            if chunk.get('choices'):
+                choice = chunk['choices'][0]
+                content = (choice.get('delta') or {}).get('content') or ''
+                if content:
+                    if first_token_latency is None:
+                        first_token_latency = time.perf_counter() - started
+                        span.args["first_token_ms"] = round(first_token_latency * 1000, 1)
+                        tracer.add("deepseek.first_token", "deepseek", span.start, first_token_latency)
+                    output_chars += len(content)
+                    if overlap is not None:
+                        # 缓冲未满时不输出，但仍要检查下面的 finish_reason
+                        overlap.append(content)
+                        content = ""
+                        if sum(len(text) for text in overlap) >= RESUME_OVERLAP_CHARS:
+                            content = _trim_overlap(previous, "".join(overlap))
+                            overlap = None
+                    if content:
+                        yield content
+                if choice.get('finish_reason'):
+                    finished = True
+            if chunk.get('usage'):
+                usage = chunk['usage']
+                usage_stats.record(usage, first_token_latency)
+                span.args["prompt_tokens"] = usage.get('prompt_tokens', 0)
+                span.args["completion_tokens"] = usage.get('completion_tokens', 0)
+                span.args["cache_hit_tokens"] = usage.get('prompt_cache_hit_tokens', 0)
+                if on_usage:
+                    on_usage(usage)
+        if should_stop and should_stop():
+            return
+        if overlap:
+            content = _trim_overlap(previous, "".join(overlap))
+            if content:
+                yield content
+        if not finished:
+            raise StreamInterruptedError("DeepSeek流式响应在输出完成前中断")
+    finally:
+        response.close()
+        # 生成速度按首字之后的时间计算，没有usage时（被停止或中断）只记录字数
+        span.args["output_chars"] = output_chars
+        generation_time = time.perf_counter() - started - (first_token_latency or 0)
+        if first_token_latency is not None and span.args.get("completion_tokens") and generation_time > 0:
+            span.args["tokens_per_sec"] = round(span.args["completion_tokens"] / generation_time, 1)
+
+
+def _is_resumable(error):
+    return isinstance(error, (StreamInterruptedError, requests.exceptions.ConnectionError,
+                              requests.exceptions.Timeout, requests.exceptions.ChunkedEncodingError))
+
+
+def stream_chat_completion(api_key, api_url, model, messages, should_stop=None, on_usage=None):
+    """以流式方式请求 /chat/completions，逐段产出回复内容
+
+    should_stop 为可选的回调，返回True时关闭连接并结束迭代。
+    服务端在最后返回usage（含上下文缓存命中的token数），记录到 usage_stats 并传给 on_usage(usage)。
+    响应中途中断（连接断开、空闲超时）时，把已输出的内容作为assistant消息请求续写，
+    最多 STREAM_RESUME_RETRIES 次，调用方收到的是连续的完整输出。
+    """
+    output = []
+    attempt = 0
+    while True:
+        previous = "".join(output)
+        request_messages = messages
+        if previous:
+            # 原请求在前，续写可以命中上下文缓存
+            request_messages = messages + [
+                {"role": "assistant", "content": previous},
+                {"role": "user", "content": RESUME_PROMPT},
+            ]
+        try:
+            for content in _stream_once(api_key, api_url, model, request_messages,
+                                        should_stop, on_usage, previous):
+                output.append(content)
+                yield content
+            return
+        except Exception as e:
+            if attempt >= STREAM_RESUME_RETRIES or not _is_resumable(e) or (should_stop and should_stop()):
+                raise
+            attempt += 1
+            print(f"DeepSeek流式响应中断: {str(e)}，已输出 {sum(len(text) for text in output)} 字，"
+                  f"第 {attempt} 次续写")  # 调试信息
+            time.sleep(STREAM_RESUME_BACKOFF * attempt)
+
+
+def chat_completion(api_key, api_url, model, messages, on_usage=None):
+    """以非流式方式请求 /chat/completions，返回完整回复内容"""
+    data = {
+        "model": model,
+        "messages": messages,
+        "stream": False
+    }
+
+    with tracer.span("deepseek.completion", "deepseek", model=model) as span:
+        response = get_session().post(
+            f"{api_url}/chat/completions",
+            headers=_headers(api_key),
+            json=data,
+            timeout=COMPLETION_TIMEOUT
+        )
+
+        if response.status_code != 200:
+            raise DeepSeekAPIError(response.status_code, response.text)
+
+        result = response.json()
+        if result.get('usage'):
+            usage = result['usage']
+            span.args["prompt_tokens"] = usage.get('prompt_tokens', 0)
+            span.args["completion_tokens"] = usage.get('completion_tokens', 0)
+    if result.get('usage'):
+        usage_stats.record(result['usage'])
+        if on_usage:
+            on_usage(result['usage'])
+    choices = result.get('choices', [])
+    if not choices:
+        return ""
+    return choices[0].get('message', {}).get('content', '') or ""
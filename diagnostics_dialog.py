@@ -0,0 +1,152 @@
+import json
+from datetime import datetime
+
+from PyQt5.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QLabel, QPushButton, QTableWidget,
+                             QTableWidgetItem, QHeaderView, QAbstractItemView, QSplitter,
+                             QFileDialog, QMessageBox, QCheckBox)
+from PyQt5.QtCore import Qt, QTimer
+
+from app_config import get_data_path
+from tracing import tracer
+
+SUMMARY_HEADERS = ["操作", "次数", "平均(ms)", "P95(ms)", "最大(ms)", "总计(ms)"]
+SPAN_HEADERS = ["开始(s)", "操作", "耗时(ms)", "线程", "详情"]
+# 明细表只显示最近的span，避免刷新时创建过多表格项
+MAX_SPAN_ROWS = 500
+
+
+def _ms_item(seconds):
+    item = QTableWidgetItem(f"{seconds * 1000:.1f}")
+    item.setTextAlignment(Qt.AlignRight | Qt.AlignVCenter)
+    return item
+
+
+class DiagnosticsDialog(QDialog):
+    """性能诊断对话框：按操作汇总耗时，列出最近的span，并可导出为Chrome trace"""
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("性能诊断")
+        self.setMinimumWidth(1100)
+        self.setMinimumHeight(750)
+
+        layout = QVBoxLayout(self)
+        splitter = QSplitter(Qt.Vertical)
+
+        self.summary_table = QTableWidget(0, len(SUMMARY_HEADERS))
+        self.summary_table.setHorizontalHeaderLabels(SUMMARY_HEADERS)
+        self.summary_table.horizontalHeader().setSectionResizeMode(0, QHeaderView.Stretch)
+        self.summary_table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.summary_table.verticalHeader().setVisible(False)
+
+        self.span_table = QTableWidget(0, len(SPAN_HEADERS))
+        self.span_table.setHorizontalHeaderLabels(SPAN_HEADERS)
+        self.span_table.horizontalHeader().setSectionResizeMode(4, QHeaderView.Stretch)
+        self.span_table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.span_table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.span_table.verticalHeader().setVisible(False)
+
+        splitter.addWidget(self.summary_table)
+        splitter.addWidget(self.span_table)
+        splitter.setSizes([250, 450])
+
+        button_layout = QHBoxLayout()
+        self.status_label = QLabel("")
+        self.auto_refresh_checkbox = QCheckBox("自动刷新")
+        self.auto_refresh_checkbox.setChecked(True)
+        self.auto_refresh_checkbox.toggled.connect(self.on_auto_refresh_toggled)
+        self.refresh_button = QPushButton("刷新")
+        self.refresh_button.clicked.connect(self.refresh)
+        self.clear_button = QPushButton("清空")
+        self.clear_button.clicked.connect(self.clear_spans)
+        self.export_button = QPushButton("导出Chrome trace")
+        self.export_button.setToolTip("导出的JSON文件可以在 chrome://tracing 或 ui.perfetto.dev 中打开")
+        self.export_button.clicked.connect(self.export_trace)
+        self.close_button = QPushButton("关闭")
+        self.close_button.clicked.connect(self.accept)
+        button_layout.addWidget(self.status_label, 1)
+        button_layout.addWidget(self.auto_refresh_checkbox)
+        button_layout.addWidget(self.refresh_button)
+        button_layout.addWidget(self.clear_button)
+        button_layout.addWidget(self.export_button)
+        button_layout.addWidget(self.close_button)
+
+        layout.addWidget(QLabel("各操作耗时（最近的记录，可导出后查看时间线）:"))
+        layout.addWidget(splitter, 1)
+        layout.addLayout(button_layout)
+
+        # 对话框打开期间每秒刷新一次
+        self.refresh_timer = QTimer(self)
+        self.refresh_timer.setInterval(1000)
+        self.refresh_timer.timeout.connect(self.refresh)
+        self.refresh_timer.start()
+
+        self.setStyleSheet("""
+            QTableWidget {
+                border: 1px solid #cccccc;
+                border-radius: 4px;
+                background-color: #ffffff;
+                font-size: 18px;
+            }
+            QPushButton {
+                background-color: #4a86e8;
+                color: white;
+                border: none;
+                padding: 8px 16px;
+                border-radius: 4px;
+                font-weight: bold;
+            }
+            QPushButton:hover {
+                background-color: #3a76d8;
+            }
+        """)
+        self.refresh()
+
+    def on_auto_refresh_toggled(self, checked):
+        if checked:
+            self.refresh_timer.start()
+        else:
+            self.refresh_timer.stop()
+
+    def refresh(self):
+        """重新读取追踪记录"""
+        rows = tracer.summary()
+        self.summary_table.setRowCount(len(rows))
+        for row, stats in enumerate(rows):
+            count_item = QTableWidgetItem(str(stats["count"]))
+            count_item.setTextAlignment(Qt.AlignRight | Qt.AlignVCenter)
+            self.summary_table.setItem(row, 0, QTableWidgetItem(stats["name"]))
+            self.summary_table.setItem(row, 1, count_item)
+            self.summary_table.setItem(row, 2, _ms_item(stats["avg"]))
+            self.summary_table.setItem(row, 3, _ms_item(stats["p95"]))
+            self.summary_table.setItem(row, 4, _ms_item(stats["max"]))
+            self.summary_table.setItem(row, 5, _ms_item(stats["total"]))
+
+        # 最新的span在最上面
+        spans = tracer.spans()
+        recent = spans[-MAX_SPAN_ROWS:][::-1]
+        self.span_table.setRowCount(len(recent))
+        for row, span in enumerate(recent):
+            details = json.dumps(span.args, ensure_ascii=False, default=str) if span.args else ""
+            self.span_table.setItem(row, 0, QTableWidgetItem(f"{span.start:.3f}"))
+            self.span_table.setItem(row, 1, QTableWidgetItem(span.name))
+            self.span_table.setItem(row, 2, _ms_item(span.duration))
+            self.span_table.setItem(row, 3, QTableWidgetItem(span.thread_name))
+            self.span_table.setItem(row, 4, QTableWidgetItem(details))
+        self.status_label.setText(f"共 {len(spans)} 条记录")
+
+    def clear_spans(self):
+        tracer.clear()
+        self.refresh()
+
+    def export_trace(self):
+        """导出Chrome trace JSON文件"""
+        default_path = get_data_path(f"trace_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+        path, _ = QFileDialog.getSaveFileName(self, "导出Chrome trace", default_path, "JSON文件 (*.json)")
+        if not path:
+            return
+        try:
+            count = tracer.export_chrome_trace(path)
+        except Exception as e:
+            QMessageBox.critical(self, "导出失败", f"无法导出耗时记录: {str(e)}")
+            return
+        QMessageBox.information(self, "成功", f"已导出 {count} 条耗时记录到:\n{path}")
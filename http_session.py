@@ -0,0 +1,130 @@
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.util.retry import Retry
+
+from app_config import DEFAULT_HTTP_POOL_SIZE, DEFAULT_HTTP_MAX_RETRIES
+
+# 重试间隔：0.5s, 1s, 2s ...
+RETRY_BACKOFF_FACTOR = 0.5
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+
+class ConnectionStats:
+    """统计请求次数和新建连接次数，用于确认连接是否被复用"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.new_connections = 0
+
+    def record_request(self):
+        with self._lock:
+            self.requests += 1
+
+    def record_new_connection(self):
+        with self._lock:
+            self.new_connections += 1
+
+    def snapshot(self):
+        """返回请求数、新建连接数、复用次数和复用率"""
+        with self._lock:
+            requests_count = self.requests
+            new_connections = self.new_connections
+        reused = max(0, requests_count - new_connections)
+        return {
+            "requests": requests_count,
+            "new_connections": new_connections,
+            "reused": reused,
+            "reuse_rate": reused / requests_count if requests_count else 0.0,
+        }
+
+
+stats = ConnectionStats()
+
+
+# 在建立TCP（及TLS）连接时计数，连接被服务端关闭后的重连也会被统计
+class _CountingHTTPConnection(HTTPConnection):
+    def connect(self):
+        stats.record_new_connection()
+        super().connect()
+
+
+class _CountingHTTPSConnection(HTTPSConnection):
+    def connect(self):
+        stats.record_new_connection()
+        super().connect()
+
+
+class _CountingHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _CountingHTTPConnection
+
+
+class _CountingHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _CountingHTTPSConnection
+
+
+class PooledHTTPAdapter(HTTPAdapter):
+    """带连接统计的连接池适配器"""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _CountingHTTPConnectionPool,
+            "https": _CountingHTTPSConnectionPool,
+        }
+
+    def send(self, request, **kwargs):
+        stats.record_request()
+        return super().send(request, **kwargs)
+
+
+def create_session(pool_size=DEFAULT_HTTP_POOL_SIZE, max_retries=DEFAULT_HTTP_MAX_RETRIES):
+    """创建保持长连接的会话，连接失败和临时性错误状态码会按退避间隔重试"""
+    retry = Retry(
+        total=max_retries,
+        connect=max_retries,
+        read=0,  # 已发送的请求读取失败时不重试，避免重复提交
+        status=max_retries,
+        backoff_factor=RETRY_BACKOFF_FACTOR,
+        status_forcelist=RETRY_STATUS_CODES,
+        allowed_methods=frozenset({"GET", "POST"}),
+        raise_on_status=False,
+    )
+    adapter = PooledHTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size,
+                                max_retries=retry)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+_session = None
+_session_options = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    """获取全局共享的HTTP会话（chatlog服务和DeepSeek API共用）"""
+    global _session, _session_options
+    with _session_lock:
+        if _session is None:
+            _session_options = (DEFAULT_HTTP_POOL_SIZE, DEFAULT_HTTP_MAX_RETRIES)
+            _session = create_session(*_session_options)
+        return _session
+
+
+def configure_session(pool_size, max_retries):
+    """按配置调整连接池大小和重试次数，配置未变化时保留现有连接"""
+    global _session, _session_options
+    with _session_lock:
+        options = (pool_size, max_retries)
+        if _session is not None and _session_options == options:
+            return _session
+        # 旧会话可能仍有请求在使用，不主动关闭，由垃圾回收释放连接
+        _session = create_session(pool_size, max_retries)
+        _session_options = options
+        return _session
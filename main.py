@@ -1,19 +1,25 @@
 import sys
 import os
-from PyQt5.QtWidgets import QApplication, QMainWindow, QTabWidget, QVBoxLayout, QWidget
-from PyQt5.QtGui import QIcon, QFont
-from PyQt5.QtCore import Qt
 
-from config_page import ConfigPage
-from summary_page import SummaryPage
+# 最先导入：tracer 的时间原点即为启动耗时的起点
+from tracing import tracer
+
+from PyQt5.QtWidgets import QApplication, QMainWindow, QTabWidget, QVBoxLayout, QWidget, QLabel
+from PyQt5.QtGui import QIcon, QFont
+from PyQt5.QtCore import Qt, QTimer
 import ctypes
 
 class MainWindow(QMainWindow):
     def __init__(self):
         super().__init__()
+        self.config_page = None
+        self.summary_page = None
         self.init_ui()
         self.setup_style()
         self.showMaximized()
+        tracer.add("app.window_shown", "app", 0.0, tracer.now())
+        # 窗口先显示出来，事件循环开始后再创建页面
+        QTimer.singleShot(0, self.init_pages)
     
     def setup_style(self):
         """设置应用样式"""
@@ -73,21 +79,40 @@ class MainWindow(QMainWindow):
         main_layout = QVBoxLayout(central_widget)
         main_layout.setContentsMargins(10, 10, 10, 10)
         
-        # 创建标签页部件
+        # 创建标签页部件，页面创建完成前显示加载提示
         self.tab_widget = QTabWidget()
-        
-        # 创建配置页面
-        self.config_page = ConfigPage()
-        
-        # 创建聊天记录总结页面
-        self.summary_page = SummaryPage(self.config_page)
-        
-        # 添加标签页
-        self.tab_widget.addTab(self.summary_page, "聊天记录总结")
-        self.tab_widget.addTab(self.config_page, "配置")
+        self.loading_label = QLabel("正在加载...")
+        self.loading_label.setAlignment(Qt.AlignCenter)
+        self.tab_widget.addTab(self.loading_label, "聊天记录总结")
         
         # 添加标签页部件到主布局
         main_layout.addWidget(self.tab_widget)
+    
+    def init_pages(self):
+        """创建各页面（窗口显示后调用）"""
+        with tracer.span("app.pages", "app"):
+            # 页面模块依赖requests等较大的库，推迟到窗口显示后再导入
+            from config_page import ConfigPage
+            from summary_page import SummaryPage
+            
+            # 配置页面的界面在第一次切换到配置页时才创建
+            self.config_page = ConfigPage()
+            
+            # 创建聊天记录总结页面（联系人在后台加载）
+            self.summary_page = SummaryPage(self.config_page)
+            
+            # 替换加载提示并添加标签页
+            self.tab_widget.removeTab(0)
+            self.loading_label.deleteLater()
+            self.tab_widget.addTab(self.summary_page, "聊天记录总结")
+            self.tab_widget.addTab(self.config_page, "配置")
+        # 排在页面首次绘制之后，此时窗口已可以操作
+        QTimer.singleShot(0, self.on_startup_finished)
+    
+    def on_startup_finished(self):
+        """记录从启动到窗口可以操作的耗时"""
+        span = tracer.add("app.startup", "app", 0.0, tracer.now())
+        print(f"启动耗时: {span.duration * 1000:.0f} ms")  # 调试信息
 
 def is_admin():
     try:
@@ -96,7 +121,8 @@ def is_admin():
         return False
 
 if __name__ == "__main__":
-    if not is_admin():
+    # 仅在Windows上以管理员身份运行图形界面，命令行版本请使用 cli.py
+    if sys.platform == "win32" and not is_admin():
         ctypes.windll.shell32.ShellExecuteW(None, "runas", sys.executable, " ".join(sys.argv), None, 1)
         sys.exit()
     
@@ -0,0 +1,214 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import deepseek_client
+from chunking import chunk_transcript, estimate_tokens
+from preprocess import split_legend
+from tracing import tracer
+
+MAP_PROMPT = """上面是一段较长聊天记录中的第{index}/{total}部分（时间范围：{time_range}）。
+请按照下面的总结要求，提取这一部分中的话题、参与者、时间段和关键信息，作为后续合并总结的素材。保留时间和人名，不要遗漏重要细节。
+
+总结要求：
+{prompt}"""
+
+REDUCE_PROMPT = """上面是同一段聊天记录按时间顺序分段总结的结果。
+请将这些分段总结合并为一份完整的总结，合并重复的话题，不要提及“分段”或“部分”，并严格按照下面的要求输出。
+
+总结要求：
+{prompt}"""
+
+# 提示词、系统消息和请求格式预留的token数
+PROMPT_OVERHEAD_TOKENS = 500
+
+# 分段总结超出合并预算时截断，末尾加上的说明
+TRUNCATED_MARK = "\n……（内容过长，已截断）"
+
+
+def needs_chunking(prompt, chat_content, max_tokens):
+    """判断聊天记录加上提示词是否超出单次请求的token预算"""
+    return estimate_tokens(prompt) + estimate_tokens(chat_content) + PROMPT_OVERHEAD_TOKENS > max_tokens
+
+
+def chunk_budget(prompt, max_tokens):
+    """分段总结时每段聊天记录可用的token数（扣除提示词和请求格式的开销）"""
+    return max(1000, max_tokens - estimate_tokens(prompt) - PROMPT_OVERHEAD_TOKENS)
+
+
+def _format_partials(partials):
+    return "\n\n".join(
+        f"【第{i + 1}部分 {time_range}】\n{summary}"
+        for i, (time_range, summary) in enumerate(partials)
+    )
+
+
+def _truncate_to_tokens(text, max_tokens):
+    """按估算的token数截断文本，截断时在末尾加上说明"""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    limit = max(0, max_tokens - estimate_tokens(TRUNCATED_MARK))
+    # 二分查找不超过预算的最长前缀
+    low, high = 0, len(text)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if estimate_tokens(text[:middle]) <= limit:
+            low = middle
+        else:
+            high = middle - 1
+    return text[:low] + TRUNCATED_MARK
+
+
+def _cap_partials(partials, max_tokens):
+    """把每个分段总结（含标题行）截断到不超过max_tokens"""
+    capped = []
+    for time_range, summary in partials:
+        header_tokens = estimate_tokens(_format_partials([(time_range, "")]))
+        if header_tokens + estimate_tokens(summary) > max_tokens:
+            print(f"分段总结超出合并预算 {max_tokens} tokens，已截断")  # 调试信息
+            summary = _truncate_to_tokens(summary, max_tokens - header_tokens)
+        capped.append((time_range, summary))
+    return capped
+
+
+def _group_partials(partials, budget):
+    """按时间顺序把完整的分段总结分组，每组的估算token数不超过budget（单个超出时自成一组）"""
+    groups = []
+    current = []
+    current_tokens = 0
+    for partial in partials:
+        # 分段之间的空行按1个token计算
+        tokens = estimate_tokens(_format_partials([partial])) + 1
+        if current and current_tokens + tokens > budget:
+            groups.append(current)
+            current = []
+            current_tokens = 0
+        current.append(partial)
+        current_tokens += tokens
+    if current:
+        groups.append(current)
+    return groups
+
+
+def _merge_time_range(partials):
+    """一组分段总结合并后的时间范围"""
+    start = (partials[0][0] or "").split(" ~ ")[0]
+    end = (partials[-1][0] or "").split(" ~ ")[-1]
+    if start and end and start != end:
+        return f"{start} ~ {end}"
+    return start or end
+
+
+class MapReduceSummarizer:
+    """分段并行总结，再将分段结果合并为最终总结
+
+    回调均在调用线程或工作线程中执行：
+    on_progress(stage, done, total) 报告进度，on_token(text) 接收最终总结的流式输出，
+    on_usage(usage) 接收每次请求返回的token用量。
+    rate_limiter 为可选的 RateLimiter，所有请求发送前都会经过它。
+    """
+
+    def __init__(self, api_key, api_url, model, max_tokens, max_workers=4,
+                 on_progress=None, on_token=None, should_stop=None, rate_limiter=None, on_usage=None):
+        self.api_key = api_key
+        self.api_url = api_url
+        self.model = model
+        self.max_tokens = max_tokens
+        self.max_workers = max(1, max_workers)
+        self.on_progress = on_progress
+        self.on_token = on_token
+        self.should_stop = should_stop or (lambda: False)
+        self.rate_limiter = rate_limiter
+        self.on_usage = on_usage
+
+    def _report(self, stage, done, total):
+        if self.on_progress:
+            self.on_progress(stage, done, total)
+
+    def _wait_for_rate_limit(self):
+        """等待速率限制放行；被停止时返回False"""
+        if self.rate_limiter is None:
+            return not self.should_stop()
+        return self.rate_limiter.acquire(self.should_stop)
+
+    def _complete(self, messages):
+        if not self._wait_for_rate_limit():
+            return ""
+        return deepseek_client.chat_completion(self.api_key, self.api_url, self.model, messages,
+                                               on_usage=self.on_usage)
+
+    def _run_parallel(self, stage, message_lists):
+        """并行执行一组非流式请求，按原顺序返回结果；被停止时返回None"""
+        results = [None] * len(message_lists)
+        self._report(stage, 0, len(message_lists))
+
+        span = tracer.begin(f"map_reduce.{stage}", "summary", requests=len(message_lists))
+        executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        try:
+            futures = {
+                executor.submit(self._complete, messages): index
+                for index, messages in enumerate(message_lists)
+            }
+            done = 0
+            for future in as_completed(futures):
+                if self.should_stop():
+                    return None
+                results[futures[future]] = future.result()
+                done += 1
+                self._report(stage, done, len(message_lists))
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+            tracer.finish(span)
+        return results
+
+    def summarize(self, prompt, chat_content):
+        """执行分段总结，返回最终总结文本；被停止时返回None"""
+        budget = chunk_budget(prompt, self.max_tokens)
+        # 精简后的聊天记录开头是成员对照表，每个分段都需要带上
+        legend, chat_content = split_legend(chat_content)
+        body_budget = max(1000, budget - estimate_tokens(legend)) if legend else budget
+        chunks = chunk_transcript(chat_content, body_budget)
+
+        # map：各分段独立总结
+        map_requests = [
+            deepseek_client.build_messages(
+                MAP_PROMPT.format(index=i + 1, total=len(chunks),
+                                  time_range=chunk.time_range() or "未知", prompt=prompt),
+                f"{legend}\n\n{chunk.text}" if legend else chunk.text
+            )
+            for i, chunk in enumerate(chunks)
+        ]
+        summaries = self._run_parallel("map", map_requests)
+        if summaries is None:
+            return None
+        partials = [(chunk.time_range(), summary) for chunk, summary in zip(chunks, summaries)]
+
+        # 分段总结合并后仍然超出预算时，按完整的分段总结分组逐级合并。
+        # 单个分段总结最多占预算的一半，相邻的两个总能分在同一组，每一级至少减少一半
+        while len(partials) > 1 and estimate_tokens(_format_partials(partials)) > budget:
+            groups = _group_partials(_cap_partials(partials, budget // 2 - 2), budget)
+            reduce_requests = [
+                deepseek_client.build_messages(REDUCE_PROMPT.format(prompt=prompt), _format_partials(group))
+                for group in groups
+            ]
+            summaries = self._run_parallel("reduce", reduce_requests)
+            if summaries is None:
+                return None
+            partials = [(_merge_time_range(group), summary) for group, summary in zip(groups, summaries)]
+        # 只剩一个分段总结时它本身也可能超出预算
+        partials = _cap_partials(partials, budget)
+
+        # reduce：流式输出最终总结
+        self._report("final", 0, 1)
+        messages = deepseek_client.build_messages(REDUCE_PROMPT.format(prompt=prompt),
+                                                  _format_partials(partials))
+        if not self._wait_for_rate_limit():
+            return None
+        result = []
+        for content in deepseek_client.stream_chat_completion(
+                self.api_key, self.api_url, self.model, messages, should_stop=self.should_stop,
+                on_usage=self.on_usage):
+            result.append(content)
+            if self.on_token:
+                self.on_token(content)
+        if self.should_stop():
+            return None
+        return "".join(result)
@@ -0,0 +1,321 @@
+from PyQt5.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QLabel, QPushButton, QListWidget,
+                             QListWidgetItem, QTabWidget, QTextBrowser, QSpinBox, QCheckBox,
+                             QSplitter, QMessageBox)
+from PyQt5.QtCore import Qt, QTimer
+from PyQt5.QtGui import QTextCursor
+
+from app_config import (DEFAULT_CHUNK_TOKEN_BUDGET, DEFAULT_MAX_CONCURRENCY,
+                        DEFAULT_SUMMARY_CACHE_MAX_MB, DEFAULT_SUMMARY_CACHE_MAX_DAYS)
+from deepseek_client import build_messages, format_usage, merge_usage, SYSTEM_PROMPT
+from map_reduce import needs_chunking
+from preflight import estimate_summary, format_estimate, merge_estimates, over_budget
+from prompts import PRESET_PROMPTS
+from summary_cache import get_summary_cache, make_summary_key
+from workers import DeepSeekThread, MapReduceSummaryThread
+
+# 每个提示词的运行状态
+RUN_QUEUED = "等待中"
+RUN_RUNNING = "总结中"
+RUN_DONE = "完成"
+RUN_CACHED = "缓存"
+RUN_FAILED = "失败"
+RUN_STOPPED = "已停止"
+
+
+class PromptRun:
+    """一个提示词的总结任务及其结果标签页"""
+
+    def __init__(self, title, prompt, browser):
+        self.title = title
+        self.prompt = prompt
+        self.browser = browser
+        self.status = RUN_QUEUED
+        self.thread = None
+        self.summary_key = None
+        self.buffer = []  # 尚未刷新到标签页的token
+        self.parts = []  # 完整输出，用于写入缓存
+        self.usage = {}  # API返回的token用量
+
+
+class MultiPromptDialog(QDialog):
+    """多提示词总结对话框：同一份聊天记录使用多个提示词并行总结，每个提示词的结果显示在单独的标签页中
+
+    聊天记录在打开对话框前已经精简好，所有提示词共用，每个提示词只需要一次API请求。
+    """
+    def __init__(self, parent, chat_content, config, current_prompt="", token_savings=""):
+        super().__init__(parent)
+        self.setWindowTitle("多提示词总结")
+        self.setMinimumWidth(1200)
+        self.setMinimumHeight(800)
+
+        self.chat_content = chat_content
+        self.config = config
+        self.runs = []
+        self.queue = []
+
+        layout = QVBoxLayout(self)
+        splitter = QSplitter(Qt.Vertical)
+
+        # 提示词选择：预设模板，当前提示词不是预设模板时也列出
+        self.prompt_list = QListWidget()
+        prompts = [(f"模板{i + 1}", prompt) for i, prompt in enumerate(PRESET_PROMPTS)]
+        if current_prompt.strip() and current_prompt not in PRESET_PROMPTS:
+            prompts.insert(0, ("当前提示词", current_prompt))
+        for title, prompt in prompts:
+            first_line = prompt.strip().split("\n", 1)[0]
+            item = QListWidgetItem(f"{title}: {first_line[:60]}")
+            item.setData(Qt.UserRole, (title, prompt))
+            item.setToolTip(prompt)
+            item.setFlags(item.flags() | Qt.ItemIsUserCheckable)
+            item.setCheckState(Qt.Checked if prompt == current_prompt else Qt.Unchecked)
+            self.prompt_list.addItem(item)
+
+        self.tabs = QTabWidget()
+        splitter.addWidget(self.prompt_list)
+        splitter.addWidget(self.tabs)
+        splitter.setSizes([200, 600])
+
+        # 设置和按钮
+        button_layout = QHBoxLayout()
+        self.concurrency_input = QSpinBox()
+        self.concurrency_input.setRange(1, 16)
+        self.concurrency_input.setValue(int(config.get('max_concurrency', DEFAULT_MAX_CONCURRENCY)))
+        self.concurrency_input.setPrefix("并发 ")
+        self.concurrency_input.setToolTip("同时发送给DeepSeek的请求数，其余提示词排队等待")
+        self.ignore_cache_checkbox = QCheckBox("忽略缓存")
+        self.status_label = QLabel(token_savings)
+        self.start_button = QPushButton("开始总结")
+        self.start_button.clicked.connect(self.start_runs)
+        self.stop_button = QPushButton("停止")
+        self.stop_button.clicked.connect(self.stop_runs)
+        self.stop_button.setEnabled(False)
+        self.close_button = QPushButton("关闭")
+        self.close_button.clicked.connect(self.reject)
+        button_layout.addWidget(self.status_label, 1)
+        button_layout.addWidget(self.concurrency_input)
+        button_layout.addWidget(self.ignore_cache_checkbox)
+        button_layout.addWidget(self.start_button)
+        button_layout.addWidget(self.stop_button)
+        button_layout.addWidget(self.close_button)
+
+        layout.addWidget(QLabel("勾选要使用的提示词:"))
+        layout.addWidget(splitter, 1)
+        layout.addLayout(button_layout)
+
+        # 流式输出缓冲：约30ms把各标签页的新token追加到文档末尾
+        self.flush_timer = QTimer(self)
+        self.flush_timer.setInterval(30)
+        self.flush_timer.timeout.connect(self.flush_buffers)
+
+        # 设置样式
+        self.setStyleSheet("""
+            QListWidget {
+                border: 1px solid #cccccc;
+                border-radius: 4px;
+                background-color: #ffffff;
+                font-size: 20px;
+            }
+            QTextBrowser {
+                border: 1px solid #cccccc;
+                border-radius: 4px;
+                padding: 8px;
+                background-color: #ffffff;
+                font-size: 22px;
+            }
+            QPushButton {
+                background-color: #4a86e8;
+                color: white;
+                border: none;
+                padding: 8px 16px;
+                border-radius: 4px;
+                font-weight: bold;
+            }
+            QPushButton:hover {
+                background-color: #3a76d8;
+            }
+            QPushButton:disabled {
+                background-color: #cccccc;
+                color: #666666;
+            }
+        """)
+
+    def checked_prompts(self):
+        """勾选的 (标题, 提示词)"""
+        return [self.prompt_list.item(row).data(Qt.UserRole)
+                for row in range(self.prompt_list.count())
+                if self.prompt_list.item(row).checkState() == Qt.Checked]
+
+    def start_runs(self):
+        """为每个勾选的提示词创建标签页，命中缓存的直接显示，其余按并发上限排队总结"""
+        prompts = self.checked_prompts()
+        if not prompts:
+            QMessageBox.warning(self, "提示", "请至少勾选一个提示词")
+            return
+
+        summary_cache = get_summary_cache()
+        summary_cache.max_bytes = self.config.get('summary_cache_max_mb', DEFAULT_SUMMARY_CACHE_MAX_MB) * 1024 * 1024
+        summary_cache.max_age_days = self.config.get('summary_cache_max_days', DEFAULT_SUMMARY_CACHE_MAX_DAYS)
+        model = self.config.get('model')
+
+        self.tabs.clear()
+        self.runs = []
+        self.queue = []
+        for title, prompt in prompts:
+            browser = QTextBrowser()
+            browser.setOpenExternalLinks(True)
+            run = PromptRun(title, prompt, browser)
+            run.summary_key = make_summary_key(self.chat_content, prompt, SYSTEM_PROMPT, model)
+            self.tabs.addTab(browser, title)
+            self.tabs.setTabToolTip(self.tabs.count() - 1, prompt)
+            self.runs.append(run)
+
+            cached_summary = None
+            if not self.ignore_cache_checkbox.isChecked():
+                cached_summary = summary_cache.get(run.summary_key)
+            if cached_summary is not None:
+                browser.setPlainText(cached_summary)
+                self.set_run_status(run, RUN_CACHED)
+            else:
+                self.set_run_status(run, RUN_QUEUED)
+                self.queue.append(run)
+
+        if self.queue and not self.confirm_budget():
+            for run in self.queue:
+                self.set_run_status(run, RUN_STOPPED)
+            self.queue = []
+            return
+
+        self.start_next()
+        self.update_buttons()
+
+    def confirm_budget(self):
+        """估算排队的提示词合计的token数和费用，超出费用预算时需要确认"""
+        estimate = merge_estimates(estimate_summary(run.prompt, self.chat_content, self.config)
+                                   for run in self.queue)
+        estimate_text = format_estimate(estimate)
+        print(f"多提示词总结 {len(self.queue)} 个: {estimate_text}")  # 调试信息
+        budget = over_budget(estimate, self.config)
+        if budget is None:
+            return True
+        reply = QMessageBox.question(
+            self, "超出费用预算",
+            f"{estimate_text}\n\n预计费用超出预算 ¥{budget:.2f}，是否继续总结？",
+            QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
+        return reply == QMessageBox.Yes
+
+    def running_count(self):
+        return sum(1 for run in self.runs if run.thread is not None)
+
+    def start_next(self):
+        """在并发上限内启动排队的提示词"""
+        api_key = self.config.get('api_key')
+        api_url = self.config.get('api_url')
+        model = self.config.get('model')
+        max_tokens = self.config.get('chunk_token_budget', DEFAULT_CHUNK_TOKEN_BUDGET)
+        while self.queue and self.running_count() < self.concurrency_input.value():
+            run = self.queue.pop(0)
+            if needs_chunking(run.prompt, self.chat_content, max_tokens):
+                # 分段总结内部也会并发请求，这里使用1个并发，避免请求数成倍增加
+                thread = MapReduceSummaryThread(api_key, api_url, model, run.prompt,
+                                                self.chat_content, max_tokens, 1)
+                thread.progress_signal.connect(
+                    lambda stage, done, total, run=run: self.on_run_progress(run, stage, done, total))
+            else:
+                thread = DeepSeekThread(api_key, api_url, model,
+                                        build_messages(run.prompt, self.chat_content))
+            thread.update_signal.connect(lambda text, run=run: self.on_run_token(run, text))
+            thread.usage_signal.connect(lambda usage, run=run: merge_usage(run.usage, usage))
+            thread.finished_signal.connect(lambda run=run: self.on_run_finished(run))
+            thread.error_signal.connect(lambda error_msg, run=run: self.on_run_error(run, error_msg))
+            thread.finished.connect(lambda run=run: self.on_thread_finished(run))
+            run.thread = thread
+            self.set_run_status(run, RUN_RUNNING)
+            thread.start()
+
+    def set_run_status(self, run, status):
+        run.status = status
+        index = self.tabs.indexOf(run.browser)
+        if index >= 0:
+            self.tabs.setTabText(index, f"{run.title}（{status}）")
+        done = sum(1 for item in self.runs if item.status in (RUN_DONE, RUN_CACHED, RUN_FAILED, RUN_STOPPED))
+        self.status_label.setText(f"已完成 {done}/{len(self.runs)}")
+
+    def on_run_progress(self, run, stage, done, total):
+        if stage == "final":
+            run.browser.clear()
+            return
+        run.browser.setPlainText(f"聊天记录较长，正在分段总结：已完成 {done}/{total}")
+
+    def on_run_token(self, run, text):
+        run.buffer.append(text)
+        run.parts.append(text)
+        if not self.flush_timer.isActive():
+            self.flush_timer.start()
+
+    def flush_buffers(self):
+        """把各标签页缓冲区中的文本追加到文档末尾"""
+        flushed = False
+        for run in self.runs:
+            if not run.buffer:
+                continue
+            text = "".join(run.buffer)
+            run.buffer.clear()
+            cursor = QTextCursor(run.browser.document())
+            cursor.movePosition(QTextCursor.End)
+            cursor.insertText(text)
+            flushed = True
+        if not flushed:
+            self.flush_timer.stop()
+
+    def on_run_finished(self, run):
+        self.flush_buffers()
+        self.set_run_status(run, RUN_DONE)
+        if run.usage:
+            self.tabs.setTabToolTip(self.tabs.indexOf(run.browser),
+                                    f"{format_usage(run.usage)}\n\n{run.prompt}")
+        if run.parts:
+            try:
+                get_summary_cache().put(run.summary_key, self.config.get('model'), "".join(run.parts))
+            except Exception as e:
+                print(f"写入总结缓存失败: {str(e)}")
+
+    def on_run_error(self, run, error_msg):
+        self.flush_buffers()
+        self.set_run_status(run, RUN_FAILED)
+        cursor = QTextCursor(run.browser.document())
+        cursor.movePosition(QTextCursor.End)
+        cursor.insertText(f"\n\n总结失败: {error_msg}")
+
+    def on_thread_finished(self, run):
+        """线程结束后释放引用，并启动下一个排队的提示词"""
+        if run.thread is not None:
+            run.thread.deleteLater()
+            run.thread = None
+        if run.status == RUN_RUNNING:
+            self.set_run_status(run, RUN_STOPPED)
+        self.start_next()
+        self.update_buttons()
+
+    def update_buttons(self):
+        running = self.running_count() > 0 or bool(self.queue)
+        self.start_button.setEnabled(not running)
+        self.stop_button.setEnabled(running)
+        self.close_button.setEnabled(not running)
+
+    def stop_runs(self):
+        """停止全部进行中和排队的总结"""
+        for run in self.queue:
+            self.set_run_status(run, RUN_STOPPED)
+        self.queue = []
+        for run in self.runs:
+            if run.thread is not None:
+                run.thread.stop_request()
+        self.flush_buffers()
+        self.stop_button.setEnabled(False)
+
+    def reject(self):
+        """总结进行中时不允许关闭对话框"""
+        if self.running_count() > 0 or self.queue:
+            QMessageBox.information(self, "提示", "请先停止正在进行的总结")
+            return
+        super().reject()
@@ -0,0 +1,131 @@
+import math
+
+import deepseek_client
+from app_config import (DEFAULT_CHUNK_TOKEN_BUDGET, DEFAULT_MAX_CONCURRENCY,
+                        DEFAULT_INPUT_PRICE_PER_M, DEFAULT_OUTPUT_PRICE_PER_M, DEFAULT_COST_BUDGET)
+from chunking import estimate_tokens
+from map_reduce import PROMPT_OVERHEAD_TOKENS, chunk_budget
+from preprocess import split_legend
+
+# 每条消息的角色、分隔符等格式开销
+MESSAGE_OVERHEAD_TOKENS = 4
+
+# 预计的输出长度：最终总结和分段总结
+SUMMARY_OUTPUT_TOKENS = 1000
+MAP_OUTPUT_TOKENS = 600
+
+# 没有实测首字延迟时使用的默认值，以及处理输入、生成输出的速度
+FIRST_TOKEN_BASE_SECONDS = 1.0
+PREFILL_TOKENS_PER_SECOND = 10000
+OUTPUT_TOKENS_PER_SECOND = 25
+
+# 成员对照表只有一行，查找时不需要复制整段聊天记录
+_LEGEND_SCAN_CHARS = 100000
+
+
+class BudgetExceededError(Exception):
+    """预计费用超出设置的预算"""
+
+
+def estimate_messages_tokens(messages):
+    """估算请求消息列表的输入token数"""
+    return sum(estimate_tokens(message.get("content", "")) + MESSAGE_OVERHEAD_TOKENS
+               for message in messages)
+
+
+def _request_seconds(input_tokens, output_tokens):
+    """单次流式请求的预计耗时：首字延迟 + 处理输入 + 生成输出
+
+    首字延迟优先使用本次运行中实测的未命中缓存时的平均值。
+    """
+    first_token = deepseek_client.usage_stats.snapshot()["miss_first_token_latency"]
+    if first_token is None:
+        first_token = FIRST_TOKEN_BASE_SECONDS + input_tokens / PREFILL_TOKENS_PER_SECOND
+    return first_token + output_tokens / OUTPUT_TOKENS_PER_SECOND
+
+
+def estimate_summary(prompt, chat_content, config):
+    """发送前估算一次总结的输入/输出token数、费用和耗时
+
+    聊天记录只估算一次，几MB的聊天记录也只需要几十毫秒。超出分段token上限时按分段总结估算：
+    各分段按并发上限分批请求，再合并为最终总结。
+    返回字典：input_tokens、output_tokens、requests、chunked、cost、seconds。
+    """
+    max_tokens = config.get('chunk_token_budget', DEFAULT_CHUNK_TOKEN_BUDGET)
+    max_workers = max(1, config.get('max_concurrency', DEFAULT_MAX_CONCURRENCY))
+    chat_tokens = estimate_tokens(chat_content)
+    prompt_tokens = estimate_tokens(prompt)
+
+    # 与 map_reduce.needs_chunking 的判断相同
+    if prompt_tokens + chat_tokens + PROMPT_OVERHEAD_TOKENS <= max_tokens:
+        input_tokens = estimate_messages_tokens(deepseek_client.build_messages(prompt, chat_content))
+        output_tokens = SUMMARY_OUTPUT_TOKENS
+        requests = 1
+        chunked = False
+        seconds = _request_seconds(input_tokens, output_tokens)
+    else:
+        # 与 MapReduceSummarizer.summarize 相同的分段预算，每个分段都带上成员对照表
+        legend, _ = split_legend(chat_content[:_LEGEND_SCAN_CHARS])
+        legend_tokens = estimate_tokens(legend) if legend else 0
+        body_tokens = max(0, chat_tokens - legend_tokens)
+        budget = chunk_budget(prompt, max_tokens)
+        body_budget = max(1000, budget - legend_tokens) if legend else budget
+        chunks = max(1, math.ceil(body_tokens / body_budget))
+        request_overhead = prompt_tokens + PROMPT_OVERHEAD_TOKENS + legend_tokens
+        map_input = body_tokens + chunks * request_overhead
+        reduce_input = chunks * MAP_OUTPUT_TOKENS + prompt_tokens + PROMPT_OVERHEAD_TOKENS
+
+        input_tokens = map_input + reduce_input
+        output_tokens = chunks * MAP_OUTPUT_TOKENS + SUMMARY_OUTPUT_TOKENS
+        requests = chunks + 1
+        chunked = True
+        waves = math.ceil(chunks / max_workers)
+        seconds = (waves * _request_seconds(body_budget + request_overhead, MAP_OUTPUT_TOKENS)
+                   + _request_seconds(reduce_input, SUMMARY_OUTPUT_TOKENS))
+
+    input_price = config.get('input_price_per_m', DEFAULT_INPUT_PRICE_PER_M)
+    output_price = config.get('output_price_per_m', DEFAULT_OUTPUT_PRICE_PER_M)
+    return {
+        "input_tokens": input_tokens,
+        "output_tokens": output_tokens,
+        "requests": requests,
+        "chunked": chunked,
+        "cost": (input_tokens * input_price + output_tokens * output_price) / 1_000_000,
+        "seconds": seconds,
+    }
+
+
+def merge_estimates(estimates):
+    """合并多次总结的估算（多提示词总结），耗时按串行相加作为上限"""
+    total = {"input_tokens": 0, "output_tokens": 0, "requests": 0, "chunked": False,
+             "cost": 0.0, "seconds": 0.0}
+    for estimate in estimates:
+        for key in ("input_tokens", "output_tokens", "requests", "cost", "seconds"):
+            total[key] += estimate[key]
+        total["chunked"] = total["chunked"] or estimate["chunked"]
+    return total
+
+
+def format_estimate(estimate):
+    """估算结果的简短说明"""
+    text = (f"预计输入 {estimate['input_tokens']} tokens，输出约 {estimate['output_tokens']} tokens，"
+            f"费用约 ¥{estimate['cost']:.4f}，耗时约 {estimate['seconds']:.0f} 秒")
+    if estimate["chunked"]:
+        text += f"（分段总结，共 {estimate['requests']} 次请求）"
+    return text
+
+
+def over_budget(estimate, config):
+    """预计费用超出预算时返回预算金额，未超出或未设置预算（0）时返回None"""
+    budget = config.get('cost_budget', DEFAULT_COST_BUDGET)
+    if budget and estimate["cost"] > budget:
+        return budget
+    return None
+
+
+def check_budget(estimate, config):
+    """预计费用超出预算时抛出 BudgetExceededError"""
+    budget = over_budget(estimate, config)
+    if budget is not None:
+        raise BudgetExceededError(
+            f"预计费用 ¥{estimate['cost']:.4f} 超出预算 ¥{budget:.4f}（{format_estimate(estimate)}）")
@@ -0,0 +1,154 @@
+from chat_parser import MEDIA_RE, TYPE_MEDIA, TYPE_STICKER, TYPE_SYSTEM, parse_chatlog
+from chunking import estimate_tokens
+
+# 精简后的格式：
+#   成员代号（总结中请写成员名称）: A=张三 B=李四
+#   # 2025-01-01
+#   10:00 A: 消息内容
+LEGEND_PREFIX = "成员代号（总结中请写成员名称）: "
+DAY_LINE = "# {day}"
+MESSAGE_LINE = "{time} {alias}: {content}"
+
+# 达到该长度的相同内容才视为重复转发，避免把"好的"、"收到"之类的短回复去掉
+DEDUP_MIN_CHARS = 30
+DUPLICATE_PLACEHOLDER = "[重复内容]"
+
+
+def _alias(index):
+    """第0、1、2...个发送者的简短代号：A..Z, AA..AZ, BA..."""
+    letters = ""
+    index += 1
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(ord('A') + remainder) + letters
+    return letters
+
+
+class TranscriptCompactor:
+    """逐条精简聊天消息，减少发送给DeepSeek的token数
+
+    - 时间只保留到分钟，日期变化时输出一行日期
+    - 发送者替换为 A、B、C 等代号，并在开头给出对照表
+    - 丢弃表情和系统通知，同一发送者连续的同类媒体占位符合并为一条
+    - 重复转发的长文本替换为占位符
+    """
+
+    def __init__(self):
+        self.aliases = {}
+        self.names = []
+        self.lines = []
+        self.messages = 0
+        self.dropped = 0
+        self.collapsed = 0
+        self.deduplicated = 0
+        self._day = None
+        self._seen = set()
+        self._last_media = None  # (代号, 媒体类型, 行号, 数量)
+
+    def _alias_for(self, message):
+        key = (message.sender, message.sender_id)
+        alias = self.aliases.get(key)
+        if alias is None:
+            alias = _alias(len(self.names))
+            self.aliases[key] = alias
+            self.names.append((alias, message.sender or message.sender_id))
+        return alias
+
+    def _set_day(self, day):
+        if day and day != self._day:
+            self._day = day
+            self.lines.append(DAY_LINE.format(day=day))
+            self._last_media = None
+
+    def add(self, message):
+        """处理一条消息（chat_parser.Message）"""
+        self.messages += 1
+        text = message.content.strip()
+        if message.type in (TYPE_SYSTEM, TYPE_STICKER) or not text:
+            self.dropped += 1
+            return
+
+        self._set_day(message.day)
+        time = message.clock()[:5]
+        alias = self._alias_for(message)
+
+        if message.type == TYPE_MEDIA:
+            kind = MEDIA_RE.match(text).group('kind')
+            last = self._last_media
+            if last and last[0] == alias and last[1] == kind and last[2] == len(self.lines) - 1:
+                count = last[3] + 1
+                self.lines[-1] = MESSAGE_LINE.format(time=time, alias=alias, content=f"[{kind}×{count}]")
+                self._last_media = (alias, kind, last[2], count)
+                self.collapsed += 1
+                return
+            self._last_media = (alias, kind, len(self.lines), 1)
+        else:
+            self._last_media = None
+            normalized = " ".join(text.split())
+            if len(normalized) >= DEDUP_MIN_CHARS:
+                if normalized in self._seen:
+                    text = DUPLICATE_PLACEHOLDER
+                    self.deduplicated += 1
+                else:
+                    self._seen.add(normalized)
+
+        self.lines.append(MESSAGE_LINE.format(time=time, alias=alias, content=text))
+
+    def legend(self):
+        if not self.names:
+            return ""
+        return LEGEND_PREFIX + " ".join(f"{alias}={name}" for alias, name in self.names)
+
+    def result(self):
+        """返回精简后的聊天记录：成员对照表 + 消息"""
+        body = "\n".join(self.lines)
+        legend = self.legend()
+        return f"{legend}\n\n{body}" if legend else body
+
+
+def compact_chatlog(chatlog, tokens_before=None):
+    """精简解析后的聊天记录，返回 (精简后的文本, 统计信息)
+
+    统计信息包含精简前后的估算token数、消息数、丢弃数、合并数和去重数。
+    没有解析出消息时返回原始格式的文本。
+    """
+    compactor = TranscriptCompactor()
+    if chatlog.preamble:
+        compactor.lines.append(chatlog.preamble)
+    for message in chatlog:
+        compactor.add(message)
+    compacted = compactor.result() if compactor.messages else chatlog.to_text()
+    if tokens_before is None:
+        tokens_before = estimate_tokens(chatlog.to_text())
+    return compacted, {
+        "tokens_before": tokens_before,
+        "tokens_after": estimate_tokens(compacted),
+        "messages": compactor.messages,
+        "dropped": compactor.dropped,
+        "collapsed": compactor.collapsed,
+        "deduplicated": compactor.deduplicated,
+    }
+
+
+def compact_transcript(text):
+    """精简chatlog纯文本格式的聊天记录，返回 (精简后的文本, 统计信息)"""
+    chatlog = parse_chatlog(text)
+    if not len(chatlog):
+        return text, compact_chatlog(chatlog, estimate_tokens(text))[1]
+    return compact_chatlog(chatlog, estimate_tokens(text))
+
+
+def split_legend(text):
+    """拆分精简后聊天记录开头的成员对照表，返回 (对照表, 其余内容)"""
+    if text.startswith(LEGEND_PREFIX):
+        legend, _, body = text.partition("\n")
+        return legend, body.lstrip("\n")
+    return "", text
+
+
+def format_token_savings(stats):
+    """精简前后token数的简短说明"""
+    before = stats["tokens_before"]
+    after = stats["tokens_after"]
+    saved = 1 - after / before if before else 0.0
+    return f"聊天记录约 {before} → {after} tokens（节省 {saved:.0%}）"
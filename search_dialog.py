@@ -0,0 +1,250 @@
+import time
+
+from PyQt5.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QLabel, QLineEdit, QPushButton,
+                             QTableWidget, QTableWidgetItem, QDateEdit, QCheckBox, QHeaderView,
+                             QAbstractItemView, QMessageBox)
+from PyQt5.QtCore import QDate, QTimer, pyqtSignal
+
+from chat_search import get_search_index, hits_to_chatlog, MAX_SEARCH_RESULTS
+from chatlog_cache import get_chatlog_cache
+from workers import SearchIndexSyncThread
+
+TABLE_HEADERS = ["日期", "时间", "联系人", "发送者", "内容"]
+
+# 输入停止多久后再搜索
+SEARCH_DELAY_MS = 300
+
+
+class ChatSearchDialog(QDialog):
+    """在本地缓存的全部聊天记录中搜索消息内容
+
+    打开时在后台按聊天记录缓存增量更新全文索引，不需要重新下载聊天记录。
+    双击搜索结果跳转到聊天记录中的对应消息，"总结搜索结果"把匹配的消息按时间顺序交给DeepSeek总结。
+    """
+    hit_activated = pyqtSignal(object)  # SearchHit
+    summarize_requested = pyqtSignal(object, str)  # 搜索结果组成的ChatLog, 说明
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("全文搜索")
+        self.setMinimumWidth(1000)
+        self.setMinimumHeight(650)
+
+        self.index = get_search_index()
+        self.hits = []
+        self.truncated = False
+        self.contact_names = {}
+        self.current_talker = None
+        self.sync_thread = None
+        self._sync_threads = set()  # 保留线程引用直到其结束，避免线程运行中被回收
+
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(SEARCH_DELAY_MS)
+        self.search_timer.timeout.connect(self.run_search)
+
+        layout = QVBoxLayout(self)
+
+        # 关键词和筛选条件
+        filter_layout = QHBoxLayout()
+        self.search_input = QLineEdit()
+        self.search_input.setPlaceholderText("输入关键词搜索已缓存的聊天记录...")
+        self.search_input.textChanged.connect(self.search_timer.start)
+        self.search_input.returnPressed.connect(self.run_search)
+        # 默认搜索本周（周一到今天）
+        today = QDate.currentDate()
+        self.start_date_edit = QDateEdit(today.addDays(1 - today.dayOfWeek()))
+        self.start_date_edit.setCalendarPopup(True)
+        self.end_date_edit = QDateEdit(today)
+        self.end_date_edit.setCalendarPopup(True)
+        self.all_days_checkbox = QCheckBox("不限日期")
+        self.all_days_checkbox.toggled.connect(self.on_all_days_toggled)
+        self.current_only_checkbox = QCheckBox("仅当前联系人")
+        for widget in (self.start_date_edit, self.end_date_edit):
+            widget.dateChanged.connect(self.search_timer.start)
+        self.current_only_checkbox.toggled.connect(self.run_search)
+        filter_layout.addWidget(self.search_input, 1)
+        filter_layout.addWidget(self.start_date_edit)
+        filter_layout.addWidget(QLabel("至"))
+        filter_layout.addWidget(self.end_date_edit)
+        filter_layout.addWidget(self.all_days_checkbox)
+        filter_layout.addWidget(self.current_only_checkbox)
+
+        self.table = QTableWidget(0, len(TABLE_HEADERS))
+        self.table.setHorizontalHeaderLabels(TABLE_HEADERS)
+        self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.table.setWordWrap(False)
+        self.table.horizontalHeader().setSectionResizeMode(4, QHeaderView.Stretch)
+        self.table.verticalHeader().setVisible(False)
+        self.table.cellDoubleClicked.connect(self.on_hit_double_clicked)
+
+        # 按钮和状态
+        button_layout = QHBoxLayout()
+        self.status_label = QLabel("")
+        self.status_label.setStyleSheet("color: #666666;")
+        self.summarize_button = QPushButton("总结搜索结果")
+        self.summarize_button.setToolTip("把匹配的消息按时间顺序组成聊天记录，使用当前提示词总结")
+        self.summarize_button.clicked.connect(self.summarize_hits)
+        self.summarize_button.setEnabled(False)
+        self.close_button = QPushButton("关闭")
+        self.close_button.clicked.connect(self.reject)
+        button_layout.addWidget(self.status_label, 1)
+        button_layout.addWidget(self.summarize_button)
+        button_layout.addWidget(self.close_button)
+
+        layout.addLayout(filter_layout)
+        layout.addWidget(self.table, 1)
+        layout.addLayout(button_layout)
+
+        # 设置样式
+        self.setStyleSheet("""
+            QTableWidget {
+                border: 1px solid #cccccc;
+                border-radius: 4px;
+                background-color: #ffffff;
+            }
+            QPushButton {
+                background-color: #4a86e8;
+                color: white;
+                border: none;
+                padding: 8px 16px;
+                border-radius: 4px;
+                font-weight: bold;
+            }
+            QPushButton:hover {
+                background-color: #3a76d8;
+            }
+            QPushButton:disabled {
+                background-color: #cccccc;
+                color: #666666;
+            }
+        """)
+
+    def set_contacts(self, store, current_talker=None):
+        """更新联系人名称（用于显示搜索结果）和当前查看的联系人"""
+        self.contact_names = {store.user_names[row]: store.display_name(row) for row in range(len(store))}
+        self.current_talker = current_talker
+        self.current_only_checkbox.setEnabled(bool(current_talker))
+        if not current_talker:
+            self.current_only_checkbox.setChecked(False)
+
+    def sync_index(self):
+        """在后台按聊天记录缓存更新索引，更新完成后重新搜索"""
+        if self.sync_thread is not None and not self.sync_thread.isFinished():
+            return
+        thread = SearchIndexSyncThread(self.index, get_chatlog_cache())
+        thread.progress_signal.connect(self.on_sync_progress)
+        thread.finished_signal.connect(self.on_sync_finished)
+        thread.error_signal.connect(self.on_sync_error)
+        thread.finished.connect(lambda: self.on_sync_thread_finished(thread))
+        self.sync_thread = thread
+        self._sync_threads.add(thread)
+        thread.start()
+        self.status_label.setText("正在更新索引...")
+
+    def on_sync_progress(self, done, total):
+        self.status_label.setText(f"正在更新索引: {done}/{total} 天")
+
+    def on_sync_finished(self, result):
+        self.sync_thread = None
+        print(f"全文索引已更新: 新索引 {result['indexed']} 天（{result['messages']} 条消息），"
+              f"删除 {result['removed']} 天")  # 调试信息
+        if result['indexed'] or result['removed'] or not self.search_input.text().strip():
+            self.run_search()
+
+    def on_sync_error(self, error_msg):
+        self.sync_thread = None
+        self.status_label.setText(error_msg)
+
+    def on_sync_thread_finished(self, thread):
+        self._sync_threads.discard(thread)
+        if self.sync_thread is thread:
+            self.sync_thread = None
+        thread.deleteLater()
+
+    def on_all_days_toggled(self, checked):
+        self.start_date_edit.setEnabled(not checked)
+        self.end_date_edit.setEnabled(not checked)
+        self.run_search()
+
+    def search_args(self):
+        """当前的搜索条件：(联系人列表, 开始日期, 结束日期)"""
+        talkers = [self.current_talker] if self.current_only_checkbox.isChecked() and self.current_talker else None
+        if self.all_days_checkbox.isChecked():
+            return talkers, None, None
+        return (talkers, self.start_date_edit.date().toString("yyyy-MM-dd"),
+                self.end_date_edit.date().toString("yyyy-MM-dd"))
+
+    def run_search(self):
+        """搜索并显示结果"""
+        self.search_timer.stop()
+        keyword = self.search_input.text().strip()
+        if not keyword:
+            self.show_hits([], False)
+            days, messages = self.index.stats()
+            if self.sync_thread is None:
+                self.status_label.setText(f"已索引 {days} 天的聊天记录，共 {messages} 条消息")
+            return
+        talkers, start_day, end_day = self.search_args()
+        started = time.perf_counter()
+        try:
+            hits, truncated = self.index.search(keyword, talkers, start_day, end_day)
+        except Exception as e:
+            self.show_hits([], False)
+            self.status_label.setText(f"搜索出错: {str(e)}")
+            return
+        elapsed = (time.perf_counter() - started) * 1000
+        self.show_hits(hits, truncated)
+        text = f"找到 {len(hits)} 条消息" if not truncated else f"只显示最新的 {MAX_SEARCH_RESULTS} 条消息"
+        text += f"，耗时 {elapsed:.0f}ms"
+        if self.sync_thread is not None:
+            text += "（索引更新中，结果可能不完整）"
+        self.status_label.setText(text)
+
+    def show_hits(self, hits, truncated):
+        """显示搜索结果"""
+        self.hits = hits
+        self.truncated = truncated
+        self.summarize_button.setEnabled(bool(hits))
+        self.table.setUpdatesEnabled(False)
+        self.table.setRowCount(len(hits))
+        for row, hit in enumerate(hits):
+            values = [hit.day, hit.clock, self.contact_names.get(hit.talker) or hit.talker,
+                      hit.sender, hit.content.replace("\n", " ")]
+            for column, value in enumerate(values):
+                cell = QTableWidgetItem(value)
+                if column == 4:
+                    cell.setToolTip(hit.content)
+                self.table.setItem(row, column, cell)
+        self.table.setUpdatesEnabled(True)
+        if hits:
+            self.table.scrollToTop()
+
+    def on_hit_double_clicked(self, row, column):
+        if 0 <= row < len(self.hits):
+            self.hit_activated.emit(self.hits[row])
+
+    def summarize_hits(self):
+        """总结当前的搜索结果"""
+        if not self.hits:
+            return
+        keyword = self.search_input.text().strip()
+        _, start_day, end_day = self.search_args()
+        description = f"包含\"{keyword}\"的消息"
+        if start_day:
+            description += f"（{start_day} 至 {end_day}）"
+        if self.truncated:
+            reply = QMessageBox.question(
+                self, "提示", f"搜索结果超过 {MAX_SEARCH_RESULTS} 条，只总结最新的 {MAX_SEARCH_RESULTS} 条，是否继续？",
+                QMessageBox.Yes | QMessageBox.No, QMessageBox.Yes)
+            if reply != QMessageBox.Yes:
+                return
+        self.summarize_requested.emit(hits_to_chatlog(self.hits, self.contact_names), description)
+
+    def reject(self):
+        """关闭时停止更新索引，已索引的日期会保留"""
+        if self.sync_thread is not None and not self.sync_thread.isFinished():
+            self.sync_thread.stop_request()
+            self.sync_thread.wait()
+        super().reject()
@@ -0,0 +1,82 @@
+import codecs
+
+
+class SSEEvent:
+    """一个Server-Sent Events事件"""
+    __slots__ = ("event", "data", "id")
+
+    def __init__(self, event="message", data="", id=""):
+        self.event = event
+        self.data = data
+        self.id = id
+
+
+class SSEParser:
+    """增量解析Server-Sent Events流
+
+    feed() 接收任意切分的原始字节，返回其中已经完整的事件：
+    - 多字节UTF-8字符被切分在两次读取之间时留到下一次解码
+    - 支持 \\r\\n、\\n 和 \\r 三种换行
+    - 同一事件的多行 data 以换行连接，空行表示事件结束
+    - 以冒号开头的注释行（如 ": keep-alive"）不产生事件，但计入 comments，用于判断连接仍然活跃
+    """
+
+    def __init__(self):
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        self._pending = ""
+        self._event = ""
+        self._data = []
+        self._has_data = False
+        self.last_event_id = ""
+        self.retry = None  # 服务端建议的重连间隔（毫秒）
+        self.comments = 0
+
+    def _dispatch(self, events):
+        if self._has_data:
+            events.append(SSEEvent(self._event or "message", "\n".join(self._data), self.last_event_id))
+        self._event = ""
+        self._data = []
+        self._has_data = False
+
+    def _feed_line(self, line, events):
+        if not line:
+            self._dispatch(events)
+            return
+        if line.startswith(":"):
+            self.comments += 1
+            return
+        field, _, value = line.partition(":")
+        if value.startswith(" "):
+            value = value[1:]
+        if field == "data":
+            self._data.append(value)
+            self._has_data = True
+        elif field == "event":
+            self._event = value
+        elif field == "id":
+            if "\0" not in value:
+                self.last_event_id = value
+        elif field == "retry":
+            if value.isdigit():
+                self.retry = int(value)
+
+    def feed(self, data):
+        """解析一段原始字节，返回完整的事件列表"""
+        text = self._pending + self._decoder.decode(data)
+        # 末尾的 \r 可能和下一段开头的 \n 组成一个换行，留到下一次
+        cut = len(text) - 1 if text.endswith("\r") else len(text)
+        lines = text[:cut].replace("\r\n", "\n").replace("\r", "\n").split("\n")
+        self._pending = lines.pop() + text[cut:]
+        events = []
+        for line in lines:
+            self._feed_line(line, events)
+        return events
+
+    def close(self):
+        """流结束：解析剩余内容，返回最后的事件（没有以空行结束的事件按规范丢弃）"""
+        text = self._pending + self._decoder.decode(b"", final=True)
+        self._pending = ""
+        events = []
+        for line in text.replace("\r\n", "\n").replace("\r", "\n").split("\n")[:-1]:
+            self._feed_line(line, events)
+        return events
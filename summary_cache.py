@@ -0,0 +1,148 @@
+import hashlib
+import sqlite3
+import threading
+import time
+
+from app_config import get_data_path, DEFAULT_SUMMARY_CACHE_MAX_MB, DEFAULT_SUMMARY_CACHE_MAX_DAYS
+
+CACHE_FILENAME = "summary_cache.db"
+
+
+def make_summary_key(chat_content, prompt, system_prompt, model):
+    """根据聊天记录、提示词、系统消息和模型计算缓存键"""
+    digest = hashlib.sha256()
+    for part in (model, system_prompt, prompt, chat_content):
+        data = part.encode("utf-8")
+        # 写入长度前缀，避免不同字段拼接后产生相同内容
+        digest.update(len(data).to_bytes(8, "big"))
+        digest.update(data)
+    return digest.hexdigest()
+
+
+class SummaryCache:
+    """总结结果的本地SQLite缓存
+
+    超过保存天数的记录和超出容量时最久未使用的记录会被淘汰。
+    命中和未命中次数持久化保存，用于统计命中率。
+    """
+
+    def __init__(self, path, max_bytes=DEFAULT_SUMMARY_CACHE_MAX_MB * 1024 * 1024,
+                 max_age_days=DEFAULT_SUMMARY_CACHE_MAX_DAYS):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_age_days = max_age_days
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS summary (
+                key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                summary TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+        """)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS stats (
+                name TEXT PRIMARY KEY,
+                value INTEGER NOT NULL
+            )
+        """)
+        self._conn.commit()
+
+    def _count(self, name):
+        self._conn.execute(
+            "INSERT INTO stats (name, value) VALUES (?, 1) "
+            "ON CONFLICT(name) DO UPDATE SET value = value + 1",
+            (name,)
+        )
+
+    def get(self, key):
+        """查询缓存，命中返回总结文本，否则返回None"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT summary, created_at FROM summary WHERE key = ?", (key,)).fetchone()
+            if row and time.time() - row[1] > self.max_age_days * 86400:
+                self._conn.execute("DELETE FROM summary WHERE key = ?", (key,))
+                row = None
+            if row:
+                self._conn.execute(
+                    "UPDATE summary SET accessed_at = ? WHERE key = ?", (time.time(), key))
+                self._count("hits")
+            else:
+                self._count("misses")
+            self._conn.commit()
+        return row[0] if row else None
+
+    def put(self, key, model, summary):
+        """写入总结结果，并按保存天数和容量淘汰旧记录"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO summary (key, model, summary, size, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, model, summary, len(summary.encode("utf-8")), now, now)
+            )
+            self._evict_locked()
+            self._conn.commit()
+
+    def _evict_locked(self):
+        # 按保存天数淘汰
+        self._conn.execute(
+            "DELETE FROM summary WHERE created_at < ?", (time.time() - self.max_age_days * 86400,))
+
+        # 按容量淘汰最久未使用的记录
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM summary").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in self._conn.execute(
+                "SELECT key, size FROM summary ORDER BY accessed_at").fetchall():
+            self._conn.execute("DELETE FROM summary WHERE key = ?", (key,))
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def evict(self):
+        """立即按保存天数和容量执行淘汰"""
+        with self._lock:
+            self._evict_locked()
+            self._conn.commit()
+
+    def purge(self):
+        """清空全部总结缓存和命中统计"""
+        with self._lock:
+            self._conn.execute("DELETE FROM summary")
+            self._conn.execute("DELETE FROM stats")
+            self._conn.commit()
+            self._conn.execute("VACUUM")
+
+    def stats(self):
+        """返回缓存条数、总字节数、命中次数、未命中次数和命中率"""
+        with self._lock:
+            count, total = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM summary").fetchone()
+            counters = dict(self._conn.execute("SELECT name, value FROM stats").fetchall())
+        hits = counters.get("hits", 0)
+        misses = counters.get("misses", 0)
+        lookups = hits + misses
+        return {
+            "entries": count,
+            "bytes": total,
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / lookups if lookups else 0.0,
+        }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_summary_cache():
+    """获取全局共享的总结缓存"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = SummaryCache(get_data_path(CACHE_FILENAME))
+        return _cache
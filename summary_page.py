@@ -1,99 +1,36 @@
-import json
-import requests
-import urllib.parse
 from datetime import datetime, timedelta
 from PyQt5.QtWidgets import (QWidget, QLabel, QLineEdit, QVBoxLayout, QHBoxLayout, 
-                             QPushButton, QDateEdit, QListWidget, QTextEdit, 
+                             QPushButton, QDateEdit, QListWidget, QListView, QTextEdit, 
                              QMessageBox, QListWidgetItem, QSplitter, QComboBox,
                              QFrame, QGroupBox, QTextBrowser, QDialog, QDialogButtonBox,
-                             QApplication)
-from PyQt5.QtCore import Qt, QThread, pyqtSignal, QDate, QTimer
-from PyQt5.QtGui import QFont, QColor, QPalette, QIcon
+                             QApplication, QCheckBox, QDateTimeEdit, QShortcut)
+from PyQt5.QtCore import Qt, QDate, QDateTime, QTimer
+from PyQt5.QtGui import QFont, QColor, QPalette, QIcon, QTextCursor, QKeySequence
 
-class DeepSeekThread(QThread):
-    """处理DeepSeek API请求的线程"""
-    update_signal = pyqtSignal(str)
-    finished_signal = pyqtSignal()
-    error_signal = pyqtSignal(str)
-    
-    def __init__(self, api_key, api_url, model, messages):
-        super().__init__()
-        self.api_key = api_key
-        self.api_url = api_url
-        self.model = model
-        self.messages = messages
-        self._stop_requested = False  # 添加停止标志
-    
-    def stop_request(self):
-        """请求停止线程"""
-        self._stop_requested = True
-    
-    def run(self):
-        try:
-            # 检查是否已请求停止
-            if self._stop_requested:
-                return
-                
-            headers = {
-                "Content-Type": "application/json",
-                "Authorization": f"Bearer {self.api_key}"
-            }
-            
-            data = {
-                "model": self.model,
-                "messages": self.messages,
-                "stream": True
-            }
-            
-            # 使用流式API，添加超时设置
-            response = requests.post(
-                f"{self.api_url}/chat/completions",
-                headers=headers,
-                json=data,
-                stream=True,
-                timeout=(10, 60)  # 连接超时10秒，读取超时60秒
-            )
-            
-            if response.status_code != 200:
-                error_msg = f"API请求失败: {response.status_code} - {response.text}"
-                self.error_signal.emit(error_msg)
-                return
-            
-            # 处理流式响应
-            for line in response.iter_lines():
-                # 在每次迭代时检查停止请求
-                if self._stop_requested:
-                    response.close()  # 关闭连接
-                    return
-                    
-                if line:
-                    line = line.decode('utf-8')
-                    if line.startswith('data: '):
-                        line = line[6:]
-                        if line == "[DONE]":
-                            break
-                        try:
-                            chunk = json.loads(line)
-                            if 'choices' in chunk and len(chunk['choices']) > 0:
-                                delta = chunk['choices'][0].get('delta', {})
-                                content = delta.get('content', '')
-                                if content:
-                                    self.update_signal.emit(content)
-                        except json.JSONDecodeError:
-                            pass
-            
-            # 只有在没有被停止的情况下才发出完成信号
-            if not self._stop_requested:
-                self.finished_signal.emit()
-        except requests.exceptions.Timeout:
-            if not self._stop_requested:
-                self.error_signal.emit("API请求超时，请检查网络连接或稍后重试")
-        except requests.exceptions.ConnectionError:
-            if not self._stop_requested:
-                self.error_signal.emit("连接错误，请检查网络连接或API地址是否正确")
-        except Exception as e:
-            if not self._stop_requested:
-                self.error_signal.emit(f"处理请求时出错: {str(e)}")
+from app_config import (DEFAULT_CHATLOG_URL, DEFAULT_CHUNK_TOKEN_BUDGET, DEFAULT_MAX_CONCURRENCY,
+                        DEFAULT_CHATLOG_CACHE_MAX_MB, DEFAULT_SUMMARY_CACHE_MAX_MB,
+                        DEFAULT_SUMMARY_CACHE_MAX_DAYS, DEFAULT_COMPACT_TRANSCRIPT,
+                        DEFAULT_CHATLOG_FETCH_CONCURRENCY)
+from chatlog_cache import get_chatlog_cache
+from deepseek_client import build_messages, format_usage, merge_usage, SYSTEM_PROMPT
+from summary_cache import get_summary_cache, make_summary_key
+from map_reduce import needs_chunking
+from preflight import estimate_summary, format_estimate, over_budget
+from tracing import tracer
+from preprocess import compact_chatlog, format_token_savings
+from chat_parser import ChatLog, TYPE_TEXT, TYPE_MEDIA
+from contact_index import ContactStore, ContactDelta
+from contact_model import ContactListModel
+from chat_model import ChatLogModel
+from batch_dialog import BatchSummaryDialog
+from multi_prompt_dialog import MultiPromptDialog
+from search_dialog import ChatSearchDialog
+from prompts import PRESET_PROMPTS, DEFAULT_PROMPT
+from workers import (ContactFetchThread, ChatlogFetchThread, ContactIndexThread,
+                     DeepSeekThread, MapReduceSummaryThread)
+
+# 日期或联系人变化后等待多久再加载聊天记录，连续变化时只加载最后一次
+CHAT_RELOAD_DELAY_MS = 300
 
 
 class PromptSelectionDialog(QDialog):
@@ -113,53 +50,7 @@ class PromptSelectionDialog(QDialog):
         self.prompt_list.setSelectionMode(QListWidget.SingleSelection)
         
         # 预设提示词
-        prompts = [
-"""你是一个中文的群聊总结的助手，你可以为一个微信的群聊记录，提取并总结每个时间段大家在重点讨论的话题内容。
-请帮我将群聊内容总结成一个群聊报告，包含不多于5个的话题的总结（如果还有更多话题，可以在后面简单补充）。每个话题包含以下内容：
-- 话题名(50字以内，带数字序号比如1、2、3，同时附带热度，以🔥数量表示）
-- 参与者(不超过5个人，将重复的人名去重)
-- 时间段(从几点到几点)
-- 过程(50到200字左右）
-- 评价(50字以下)
-- 分割线： ------------
-
-另外有以下要求：
-1. 每个话题结束使用 ------------ 分割
-2. 使用中文冒号
-3. 无需大标题
-4. 开始给出本群讨论风格的整体评价，例如活跃、太水、太黄、太暴力、话题不集中、无聊诸如此类
-
-最后总结下最活跃的前五个发言者。 """,
-"""你作为一个专业的技术讨论分析者，请对聊天记录进行分析和结构化总结:
-1. 基础信息提取：
-- 将每个主题分成独立的问答对
-- 保持原始对话的时间顺序
-
-1. 问题分析要点：
-- 提取问题的具体场景和背景
-- 识别问题的核心技术难点
-- 突出问题的实际影响
-
-1. 解决方案总结：
-- 列出具体的解决步骤
-- 提取关键工具和资源
-- 包含实践经验和注意事项
-- 保留重要的链接和参考资料
-
-1. 输出格式：
-- 不要输出"日期:YYYY-MM-DD"这一行，直接从问题1开始 
-- 问题1：<简明扼要的问题描述>
-- 回答1：<完整的解决方案>
-- 补充：<额外的讨论要点或注意事项>
-
-1. 额外要求(严格执行)：
-- 如果有多个相关问题，保持逻辑顺序
-- 标记重要的警告和建议、突出经验性的分享内容、保留有价值的专业术语解释、移除"我来分析"等过渡语确保链接的完整性
-- 直接以日期开始，不要添加任何开场白""",
-            "请总结微信聊天记录的主要内容",
-            "请提取微信聊天记录中的关键信息",
-            "请分析微信聊天记录并提取重要事项",
-        ]
+        prompts = PRESET_PROMPTS
         
         for i, prompt in enumerate(prompts):
             # 创建简化的显示文本
@@ -338,15 +229,56 @@ class SummaryPage(QWidget):
     def __init__(self, config_page):
         super().__init__()
         self.config_page = config_page
-        self.contacts = []
+        self.all_contacts = ContactStore()  # 全部联系人，用于本地搜索
+        self.contact_index = None  # 本地联系人搜索索引
+        self._contact_index_version = 0
+        self._index_thread = None
         self.selected_contact = None  # 添加当前选中的联系人记录
         self.deepseek_thread = None  # 添加线程引用
         
+        # 后台请求状态：请求编号用于丢弃过期结果
+        self._contact_request_id = 0
+        self._contact_mode = "load"
+        self._keep_contacts_on_error = False  # 列表显示的是快照或已加载的联系人，更新失败时保留
+        self._applying_contact_delta = False  # 更新列表时行号变化引起的选中项变化不加载聊天记录
+        self._chat_request_id = 0
+        self.current_chatlog = None  # 当前联系人解析后的聊天记录，加载中或失败时为None
+        self.displayed_chatlog = None  # 按筛选条件显示的聊天记录，总结时使用
+        self._chat_loading = False  # 聊天记录正在边下载边显示
+        self._chat_incomplete = False  # 下载被取消，只显示了部分聊天记录
+        self._pending_hit = None  # (请求编号, SearchHit)：加载完成后跳转到的搜索结果
+        self.search_dialog = None
+        self._active_fetch = {}
+        self._fetch_threads = set()
+        
         # 初始化自动搜索定时器
         self.search_timer = QTimer()
         self.search_timer.setSingleShot(True)  # 只触发一次
         self.search_timer.timeout.connect(self.auto_search_contacts)
         
+        # 聊天记录重新加载定时器，日期和联系人停止变化后再请求
+        self.chat_reload_timer = QTimer()
+        self.chat_reload_timer.setSingleShot(True)
+        self.chat_reload_timer.setInterval(CHAT_RELOAD_DELAY_MS)
+        self.chat_reload_timer.timeout.connect(self.reload_chat)
+        
+        # 聊天记录筛选定时器，输入停止后再重新显示
+        self.chat_filter_timer = QTimer()
+        self.chat_filter_timer.setSingleShot(True)
+        self.chat_filter_timer.setInterval(200)
+        self.chat_filter_timer.timeout.connect(self.apply_chat_filter)
+        
+        # 流式总结输出缓冲：按帧合并token后再追加到文档末尾
+        self._summary_buffer = []
+        self._summary_parts = []  # 本次总结的完整输出，用于写入缓存
+        self._pending_summary = None
+        self._token_savings = ""  # 本次总结聊天记录精简前后的token数
+        self._summary_usage = {}  # 本次总结API返回的token用量（含上下文缓存命中数）
+        self._summary_span = None  # 本次总结的整体耗时span
+        self.summary_flush_timer = QTimer()
+        self.summary_flush_timer.setInterval(30)  # 约30ms刷新一次
+        self.summary_flush_timer.timeout.connect(self.flush_summary_buffer)
+        
         self.init_ui()
         self.setup_style()
         self.setup_auto_search()
@@ -355,65 +287,184 @@ class SummaryPage(QWidget):
         self.load_all_contacts()
     
     def load_all_contacts(self):
-        """页面初始化时自动加载所有联系人"""
+        """页面初始化时自动加载所有联系人（后台线程）"""
+        self.request_contacts("", mode="load")
+    
+    def request_contacts(self, keyword, mode="search"):
+        """在后台线程中请求联系人列表，新请求会取代尚未完成的旧请求"""
         # 获取chatlog服务URL
         config = self.config_page.get_config()
-        chatlog_base_url = config.get('chatlog_service_url', 'http://127.0.0.1:5030/api/v1')
+        chatlog_base_url = config.get('chatlog_service_url', DEFAULT_CHATLOG_URL)
         
         # 显示加载状态
-        self.contact_list.clear()
-        item = QListWidgetItem("正在加载联系人列表...")
-        item.setFlags(item.flags() & ~Qt.ItemIsEnabled)  # 禁用该项
-        self.contact_list.addItem(item)
-        QApplication.processEvents()  # 立即更新UI
-        
-        try:
-            # 不带参数查询所有联系人
-            url = f"{chatlog_base_url}/contact?format=json"
-            
-            # 添加超时设置
-            response = requests.get(url, timeout=(5, 30))  # 连接超时5秒，读取超时30秒
-            
-            if response.status_code == 200:
-                data = response.json()
-                self.contacts = data.get('items', [])
-                
-                # 更新联系人列表
-                self.contact_list.clear()
-                for contact in self.contacts:
-                    display_name = contact.get('nickName') or contact.get('remark') or contact.get('userName')
-                    item = QListWidgetItem(display_name)
-                    item.setData(Qt.UserRole, contact)  # 存储完整联系人数据
-                    self.contact_list.addItem(item)
-                
-                if not self.contacts:
-                    item = QListWidgetItem("暂无联系人数据")
-                    item.setFlags(item.flags() & ~Qt.ItemIsEnabled)  # 禁用该项
-                    self.contact_list.addItem(item)
+        if mode == "load":
+            loading_text = "正在加载联系人列表..."
+        else:
+            loading_text = "正在搜索联系人..." if keyword else "正在加载全部联系人..."
+        self.show_contact_message(loading_text)
+        
+        self._contact_request_id += 1
+        self._contact_mode = mode
+        self._keep_contacts_on_error = False
+        # 加载全部联系人时先显示本地快照，最新的列表在后台获取
+        thread = ContactFetchThread(self._contact_request_id, chatlog_base_url, keyword,
+                                    use_snapshot=(mode == "load"))
+        thread.snapshot_signal.connect(self.on_contacts_snapshot)
+        self._start_fetch_thread("contact", thread, self.on_contacts_loaded, self.on_contacts_error)
+    
+    def _start_fetch_thread(self, kind, thread, on_result, on_error):
+        """启动后台请求线程，并取消同类型的旧请求"""
+        old_thread = self._active_fetch.get(kind)
+        if old_thread is not None:
+            old_thread.stop_request()
+        self._active_fetch[kind] = thread
+        
+        # 保留线程引用直到其结束，避免线程运行中被回收
+        self._fetch_threads.add(thread)
+        thread.result_signal.connect(on_result)
+        thread.error_signal.connect(on_error)
+        thread.finished.connect(lambda: self._on_fetch_thread_finished(kind, thread))
+        thread.start()
+    
+    def _on_fetch_thread_finished(self, kind, thread):
+        """后台请求线程结束后释放引用"""
+        self._fetch_threads.discard(thread)
+        if self._active_fetch.get(kind) is thread:
+            self._active_fetch[kind] = None
+        thread.deleteLater()
+    
+    def show_contact_message(self, text):
+        """在联系人列表中显示一条不可选择的提示信息"""
+        self.contact_model.set_message(text)
+    
+    def on_contacts_snapshot(self, request_id, contacts):
+        """显示本地保存的联系人快照，最新的联系人列表稍后由 on_contacts_loaded 替换"""
+        if request_id != self._contact_request_id:
+            return
+        self._keep_contacts_on_error = True
+        self.show_all_contacts(contacts)
+    
+    def on_contacts_loaded(self, request_id, contacts):
+        """联系人列表加载完成"""
+        if request_id != self._contact_request_id:
+            return  # 已被新请求取代
+        
+        if self._contact_mode == "load":
+            self._keep_contacts_on_error = False
+            if isinstance(contacts, ContactDelta):
+                self.apply_contact_delta(contacts)
             else:
-                # 加载失败时显示信息
-                self.contact_list.clear()
-                item = QListWidgetItem("加载联系人失败")
-                item.setFlags(item.flags() & ~Qt.ItemIsEnabled)  # 禁用该项
-                self.contact_list.addItem(item)
-        except requests.exceptions.Timeout:
-            self.contact_list.clear()
-            item = QListWidgetItem("加载超时")
-            item.setFlags(item.flags() & ~Qt.ItemIsEnabled)  # 禁用该项
-            self.contact_list.addItem(item)
-        except requests.exceptions.ConnectionError:
-            self.contact_list.clear()
-            item = QListWidgetItem("连接错误")
-            item.setFlags(item.flags() & ~Qt.ItemIsEnabled)  # 禁用该项
-            self.contact_list.addItem(item)
-        except Exception as e:
-            self.contact_list.clear()
-            item = QListWidgetItem("加载出错")
-            item.setFlags(item.flags() & ~Qt.ItemIsEnabled)  # 禁用该项
-            self.contact_list.addItem(item)
-        finally:
-            # 确保UI响应
-            QApplication.processEvents()
+                self.show_all_contacts(contacts)
+        else:
+            self.show_contacts(contacts, "未找到匹配的联系人")
+    
+    def show_all_contacts(self, contacts):
+        """更换全部联系人并显示，搜索框中有关键词时按关键词筛选"""
+        # 全部联系人变化后，在后台重建本地搜索索引
+        self.all_contacts = contacts
+        self.rebuild_contact_index()
+        
+        keyword = self.contact_search_input.text().strip()
+        if keyword and self.contact_index is not None:
+            self.apply_local_search(keyword)
+        else:
+            self.show_contacts(contacts, "暂无联系人数据")
+    
+    def apply_contact_delta(self, delta):
+        """只把新增、删除和变化的联系人更新到列表中，不重建整个列表"""
+        print(f"联系人列表更新: {delta.describe()}")  # 调试信息
+        if not delta:
+            return
+        if self.contact_model.store() is self.all_contacts:
+            # 选中的联系人被删除时，视图会把选中项移到相邻的联系人上，不能因此加载其他人的聊天记录
+            current = self.contact_list.currentIndex().data(Qt.UserRole)
+            self._applying_contact_delta = True
+            try:
+                self.all_contacts = self.contact_model.apply_delta(delta)
+            finally:
+                self._applying_contact_delta = False
+            if current and current['userName'] in delta.removed_names:
+                self.contact_list.selectionModel().clear()
+        else:
+            store = self.all_contacts.copy()
+            store.apply_delta(delta)
+            self.all_contacts = store
+        # 搜索索引建立完成后会按当前关键词重新筛选
+        self.rebuild_contact_index()
+        if not len(self.all_contacts):
+            self.show_contact_message("暂无联系人数据")
+    
+    def refresh_contacts(self):
+        """在后台重新获取全部联系人，只更新变化的部分，列表保持显示"""
+        config = self.config_page.get_config()
+        chatlog_base_url = config.get('chatlog_service_url', DEFAULT_CHATLOG_URL)
+        self._contact_request_id += 1
+        self._contact_mode = "load"
+        self._keep_contacts_on_error = True
+        thread = ContactFetchThread(self._contact_request_id, chatlog_base_url, base=self.all_contacts)
+        self._start_fetch_thread("contact", thread, self.on_contacts_loaded, self.on_contacts_error)
+    
+    def show_contacts(self, store, empty_text, rows=None):
+        """显示联系人列表，rows 为要显示的行号，默认显示全部"""
+        if self.contact_model.store() is store and rows is not None:
+            self.contact_model.set_rows(rows)
+        else:
+            self.contact_model.set_store(store, rows)
+        
+        if not self.contact_model.contact_count():
+            self.show_contact_message(empty_text)
+    
+    def rebuild_contact_index(self):
+        """在后台线程中为全部联系人建立搜索索引"""
+        self._contact_index_version += 1
+        thread = ContactIndexThread(self._contact_index_version, self.all_contacts)
+        thread.index_ready.connect(self.on_contact_index_ready)
+        thread.finished.connect(thread.deleteLater)
+        # 保留线程引用直到其结束
+        self._fetch_threads.add(thread)
+        thread.finished.connect(lambda: self._fetch_threads.discard(thread))
+        thread.start()
+    
+    def on_contact_index_ready(self, version, index):
+        """搜索索引建立完成"""
+        if version != self._contact_index_version:
+            return  # 联系人列表已再次变化
+        self.contact_index = index
+        
+        keyword = self.contact_search_input.text().strip()
+        if keyword:
+            self.apply_local_search(keyword)
+    
+    def apply_local_search(self, keyword):
+        """使用本地索引筛选联系人，只替换显示的行号，无需请求chatlog服务"""
+        with tracer.span("contacts.search", "contacts", keyword=keyword) as span:
+            rows = self.contact_index.search_rows(keyword)
+            self.show_contacts(self.contact_index.store, "未找到匹配的联系人", rows)
+            span.args["results"] = len(rows)
+    
+    def on_contacts_error(self, request_id, error_type, error_msg):
+        """联系人列表加载失败，只在列表中显示错误信息"""
+        if request_id != self._contact_request_id:
+            return
+        
+        if self._contact_mode == "load":
+            if self._keep_contacts_on_error:
+                # 已显示本地快照或之前加载的联系人，保留列表，只在日志中记录错误
+                print(f"更新联系人列表失败，继续显示当前列表: {error_msg}")  # 调试信息
+                return
+            messages = {
+                "status": "加载联系人失败",
+                "timeout": "加载超时",
+                "connection": "连接错误",
+            }
+            self.show_contact_message(messages.get(error_type, "加载出错"))
+        else:
+            messages = {
+                "status": "搜索失败",
+                "timeout": "搜索超时",
+                "connection": "连接错误",
+            }
+            self.show_contact_message(messages.get(error_type, "搜索出错"))
     
     def setup_auto_search(self):
         """设置自动搜索功能"""
@@ -429,13 +480,20 @@ class SummaryPage(QWidget):
         text = self.contact_search_input.text().strip()
         
         if text:
-            # 如果有文本，设置500ms延迟后搜索
-            self.search_timer.start(500)
+            if self.contact_index is not None:
+                # 本地索引已就绪时，每次输入立即筛选
+                self.apply_local_search(text)
+            else:
+                # 索引尚未建立时，设置500ms延迟后请求chatlog服务搜索
+                self.search_timer.start(500)
         else:
-            # 如果文本为空，清空联系人列表
-            self.contact_list.clear()
+            # 如果文本为空，显示全部联系人
+            if self.contact_index is not None:
+                self.show_contacts(self.all_contacts, "暂无联系人数据")
+            else:
+                self.contact_model.set_store(ContactStore())
             # 清空聊天记录显示
-            self.chat_display.clear()
+            self.show_chat_message("")
             # 清除选中的联系人
             self.selected_contact = None
     
@@ -497,17 +555,17 @@ class SummaryPage(QWidget):
         
         # 设置列表样式
         list_style = """
-            QListWidget {
+            QListView {
                 border: 1px solid #cccccc;
                 border-radius: 4px;
                 padding: 2px;
                 background-color: #ffffff;
             }
-            QListWidget::item {
+            QListView::item {
                 padding: 6px;
                 border-bottom: 1px solid #eeeeee;
             }
-            QListWidget::item:selected {
+            QListView::item:selected {
                 background-color: #e6f0ff;
                 color: #000000;
             }
@@ -549,6 +607,10 @@ class SummaryPage(QWidget):
         # 应用样式
         self.search_button.setStyleSheet(button_style)
         self.summary_button.setStyleSheet(button_style)
+        self.regenerate_button.setStyleSheet(button_style)
+        self.batch_button.setStyleSheet(button_style)
+        self.multi_prompt_button.setStyleSheet(button_style)
+        self.full_text_search_button.setStyleSheet(button_style)
         self.add_prompt_button.setStyleSheet(add_button_style)
         self.select_prompt_button.setStyleSheet(button_style)
         
@@ -576,7 +638,13 @@ class SummaryPage(QWidget):
         self.stop_button.setStyleSheet(stop_button_style)
         
         self.contact_list.setStyleSheet(list_style)
-        self.chat_display.setStyleSheet(textedit_style)
+        # 聊天记录列表 - 字体与原来的文本框一致
+        self.chat_view.setStyleSheet(list_style + """
+            QListView {
+                font-size: 26px;
+                font-family: "微软雅黑", "Segoe UI", Arial, sans-serif;
+            }
+        """)
         self.summary_display.setStyleSheet(textedit_style)
         self.contact_search_input.setStyleSheet(search_input_style)
         
@@ -646,8 +714,15 @@ class SummaryPage(QWidget):
         self.search_button.setToolTip("点击进行手动搜索，或直接在输入框中输入进行自动搜索")
         
         # 联系人列表 - 放在最下方
-        self.contact_list = QListWidget()
-        self.contact_list.itemClicked.connect(self.on_contact_selected)
+        # 使用模型/视图，只绘制可见的联系人，所有项高度相同
+        self.contact_model = ContactListModel(self)
+        self.contact_list = QListView()
+        self.contact_list.setModel(self.contact_model)
+        self.contact_list.setUniformItemSizes(True)
+        self.contact_list.setEditTriggers(QListView.NoEditTriggers)
+        self.contact_list.clicked.connect(self.on_contact_selected)
+        # 用方向键切换联系人时同样加载聊天记录（与点击合并为一次请求）
+        self.contact_list.selectionModel().currentChanged.connect(self.on_contact_selected)
         
         # 添加到左侧布局
         left_layout.addLayout(date_layout)
@@ -663,10 +738,44 @@ class SummaryPage(QWidget):
         # 聊天记录显示
         chat_group = QGroupBox("聊天记录")
         chat_layout = QVBoxLayout(chat_group)
-        self.chat_display = QTextEdit()
-        self.chat_display.setReadOnly(True)
-        self.chat_display.setLineWrapMode(QTextEdit.WidgetWidth)  # 设置自动换行
-        chat_layout.addWidget(self.chat_display)
+        chat_filter_layout = QHBoxLayout()
+        self.chat_filter_input = QLineEdit()
+        self.chat_filter_input.setPlaceholderText("按关键词或发送者筛选消息，总结时只使用筛选后的消息")
+        self.chat_filter_input.textChanged.connect(self.chat_filter_timer.start)
+        self.hide_noise_checkbox = QCheckBox("隐藏系统消息和表情")
+        self.hide_noise_checkbox.toggled.connect(self.apply_chat_filter)
+        self.chat_count_label = QLabel("")
+        self.chat_count_label.setStyleSheet("color: #666666;")
+        chat_filter_layout.addWidget(self.chat_filter_input)
+        chat_filter_layout.addWidget(self.hide_noise_checkbox)
+        chat_filter_layout.addWidget(self.chat_count_label)
+        # 跳转到指定时间
+        self.jump_time_edit = QDateTimeEdit()
+        self.jump_time_edit.setDisplayFormat("yyyy-MM-dd HH:mm")
+        self.jump_time_edit.setCalendarPopup(True)
+        self.jump_button = QPushButton("跳转")
+        self.jump_button.clicked.connect(self.jump_to_time)
+        chat_filter_layout.addWidget(self.jump_time_edit)
+        chat_filter_layout.addWidget(self.jump_button)
+        self.cancel_load_button = QPushButton("取消加载")
+        self.cancel_load_button.clicked.connect(self.cancel_chat_load)
+        self.cancel_load_button.setVisible(False)
+        chat_filter_layout.addWidget(self.cancel_load_button)
+        # 聊天记录使用分页加载的列表显示，只有可见的消息才会排版，长聊天记录也不会卡顿
+        self.chat_model = ChatLogModel(self)
+        self.chat_model.rows_shifted.connect(self.on_chat_rows_shifted)
+        self.chat_view = QListView()
+        self.chat_view.setModel(self.chat_model)
+        self.chat_view.setWordWrap(True)  # 设置自动换行
+        self.chat_view.setResizeMode(QListView.Adjust)
+        self.chat_view.setVerticalScrollMode(QListView.ScrollPerItem)
+        self.chat_view.setSelectionMode(QListView.ExtendedSelection)
+        self.chat_view.verticalScrollBar().valueChanged.connect(self.on_chat_scrolled)
+        self.chat_copy_shortcut = QShortcut(QKeySequence.Copy, self.chat_view)
+        self.chat_copy_shortcut.setContext(Qt.WidgetShortcut)
+        self.chat_copy_shortcut.activated.connect(self.copy_selected_messages)
+        chat_layout.addLayout(chat_filter_layout)
+        chat_layout.addWidget(self.chat_view)
         
         # 总结提示词
         prompt_group = QGroupBox("总结设置")
@@ -694,22 +803,7 @@ class SummaryPage(QWidget):
         self.current_prompt_display.setMaximumHeight(200)
         self.current_prompt_display.setReadOnly(True)
         # 设置默认提示词为第一个预设提示词
-        default_prompt = """你是一个中文的群聊总结的助手，你可以为一个微信的群聊记录，提取并总结每个时间段大家在重点讨论的话题内容。
-请帮我将群聊内容总结成一个群聊报告，包含不多于5个的话题的总结（如果还有更多话题，可以在后面简单补充）。每个话题包含以下内容：
-- 话题名(50字以内，带数字序号比如1、2、3，同时附带热度，以🔥数量表示）
-- 参与者(不超过5个人，将重复的人名去重)
-- 时间段(从几点到几点)
-- 过程(50到200字左右）
-- 评价(50字以下)
-- 分割线： ------------
-
-另外有以下要求：
-1. 每个话题结束使用 ------------ 分割
-2. 使用中文冒号
-3. 无需大标题
-4. 开始给出本群讨论风格的整体评价，例如活跃、太水、太黄、太暴力、话题不集中、无聊诸如此类
-
-最后总结下最活跃的前五个发言者。 """
+        default_prompt = DEFAULT_PROMPT
         self.current_prompt_display.setPlainText(default_prompt)
         self.current_prompt = default_prompt
         
@@ -722,20 +816,47 @@ class SummaryPage(QWidget):
         self.summary_button.setMinimumHeight(40)
         self.summary_button.clicked.connect(self.summarize_chat)
         
+        self.regenerate_button = QPushButton("重新生成")
+        self.regenerate_button.setMinimumHeight(40)
+        self.regenerate_button.setToolTip("忽略缓存的总结结果，重新请求DeepSeek")
+        self.regenerate_button.clicked.connect(self.regenerate_summary)
+        
         self.stop_button = QPushButton("停止总结")
         self.stop_button.setMinimumHeight(40)
         self.stop_button.clicked.connect(self.stop_summary)
         self.stop_button.setVisible(False)  # 初始时隐藏
         
+        self.batch_button = QPushButton("批量总结")
+        self.batch_button.setMinimumHeight(40)
+        self.batch_button.setToolTip("选择多个联系人或群聊，按日期范围批量总结并保存到文件")
+        self.batch_button.clicked.connect(self.open_batch_dialog)
+        
         button_layout.addWidget(self.summary_button)
+        button_layout.addWidget(self.regenerate_button)
         button_layout.addWidget(self.stop_button)
+        self.multi_prompt_button = QPushButton("多提示词总结")
+        self.multi_prompt_button.setMinimumHeight(40)
+        self.multi_prompt_button.setToolTip("使用多个提示词并行总结当前聊天记录，结果分别显示在标签页中")
+        self.multi_prompt_button.clicked.connect(self.open_multi_prompt_dialog)
+        
+        self.full_text_search_button = QPushButton("全文搜索")
+        self.full_text_search_button.setMinimumHeight(40)
+        self.full_text_search_button.setToolTip("在本地缓存的全部聊天记录中搜索消息内容，不需要重新下载")
+        self.full_text_search_button.clicked.connect(self.open_search_dialog)
+        
+        button_layout.addWidget(self.batch_button)
+        button_layout.addWidget(self.multi_prompt_button)
+        button_layout.addWidget(self.full_text_search_button)
         
         # 总结结果
         summary_group = QGroupBox("总结结果")
         summary_layout = QVBoxLayout(summary_group)
         self.summary_display = QTextBrowser()  # 使用QTextBrowser支持富文本
         self.summary_display.setOpenExternalLinks(True)  # 允许打开外部链接
+        self.summary_status_label = QLabel("")
+        self.summary_status_label.setStyleSheet("color: #666666;")
         summary_layout.addWidget(self.summary_display)
+        summary_layout.addWidget(self.summary_status_label)
         
         # 添加到右侧布局
         right_layout.addWidget(chat_group)
@@ -773,8 +894,7 @@ class SummaryPage(QWidget):
         if self.end_date_edit.date() < self.start_date_edit.date():
             self.end_date_edit.setDate(self.start_date_edit.date())
         
-        if self.selected_contact:
-            self.load_chat_for_contact(self.selected_contact)
+        self.schedule_chat_reload()
     
     def on_end_date_changed(self):
         """结束日期变化时的处理"""
@@ -782,8 +902,7 @@ class SummaryPage(QWidget):
         if self.end_date_edit.date() < self.start_date_edit.date():
             self.start_date_edit.setDate(self.end_date_edit.date())
         
-        if self.selected_contact:
-            self.load_chat_for_contact(self.selected_contact)
+        self.schedule_chat_reload()
     
     def add_custom_prompt(self):
         """添加自定义提示词"""
@@ -802,224 +921,450 @@ class SummaryPage(QWidget):
     
     def perform_search(self, keyword):
         """执行搜索操作"""
-        # 获取chatlog服务URL
-        config = self.config_page.get_config()
-        chatlog_base_url = config.get('chatlog_service_url', 'http://127.0.0.1:5030/api/v1')
-        
-        # 清空之前的列表
-        self.contact_list.clear()
-        
-        # 显示加载状态
-        loading_text = "正在搜索联系人..." if keyword else "正在加载全部联系人..."
-        item = QListWidgetItem(loading_text)
-        item.setFlags(item.flags() & ~Qt.ItemIsEnabled)  # 禁用该项
-        self.contact_list.addItem(item)
-        QApplication.processEvents()  # 立即更新UI
-        
-        try:
-            # 构建URL
-            if keyword:
-                # 有关键词时进行搜索
-                encoded_keyword = urllib.parse.quote(keyword)
-                url = f"{chatlog_base_url}/contact?keyword={encoded_keyword}&format=json"
-            else:
-                # 无关键词时查询全部联系人
-                url = f"{chatlog_base_url}/contact?format=json"
-            
-            # 添加超时设置
-            response = requests.get(url, timeout=(5, 30))  # 连接超时5秒，读取超时30秒
-            
-            if response.status_code == 200:
-                data = response.json()
-                self.contacts = data.get('items', [])
-                
-                # 更新联系人列表
-                self.contact_list.clear()
-                for contact in self.contacts:
-                    display_name = contact.get('nickName') or contact.get('remark') or contact.get('userName')
-                    item = QListWidgetItem(display_name)
-                    item.setData(Qt.UserRole, contact)  # 存储完整联系人数据
-                    self.contact_list.addItem(item)
-                
-                if not self.contacts:
-                    item = QListWidgetItem("未找到匹配的联系人")
-                    item.setFlags(item.flags() & ~Qt.ItemIsEnabled)  # 禁用该项
-                    self.contact_list.addItem(item)
-            else:
-                error_msg = f"请求失败: {response.status_code}"
-                if hasattr(response, 'text'):
-                    error_msg += f" - {response.text}"
-                # 不再显示错误弹窗，只在列表中显示错误信息
-                self.contact_list.clear()
-                item = QListWidgetItem("搜索失败")
-                item.setFlags(item.flags() & ~Qt.ItemIsEnabled)  # 禁用该项
-                self.contact_list.addItem(item)
-        except requests.exceptions.Timeout:
-            # 不再显示超时弹窗，只在列表中显示信息
-            self.contact_list.clear()
-            item = QListWidgetItem("搜索超时")
-            item.setFlags(item.flags() & ~Qt.ItemIsEnabled)  # 禁用该项
-            self.contact_list.addItem(item)
-        except requests.exceptions.ConnectionError:
-            # 不再显示连接错误弹窗，只在列表中显示信息
-            self.contact_list.clear()
-            item = QListWidgetItem("连接错误")
-            item.setFlags(item.flags() & ~Qt.ItemIsEnabled)  # 禁用该项
-            self.contact_list.addItem(item)
-        except Exception as e:
-            # 不再显示错误弹窗，只在列表中显示信息
-            self.contact_list.clear()
-            item = QListWidgetItem("搜索出错")
-            item.setFlags(item.flags() & ~Qt.ItemIsEnabled)  # 禁用该项
-            self.contact_list.addItem(item)
-        finally:
-            # 确保UI响应
-            QApplication.processEvents()
-    
-    def on_contact_selected(self, item):
+        if not keyword and len(self.all_contacts):
+            # 没有关键词时显示已加载的全部联系人，并在后台获取变化的部分
+            if (self.contact_model.store() is not self.all_contacts
+                    or self.contact_model.contact_count() != len(self.all_contacts)):
+                self.show_contacts(self.all_contacts, "暂无联系人数据")
+            self.refresh_contacts()
+            return
+        self.request_contacts(keyword, mode="search")
+    
+    def on_contact_selected(self, index):
         """当联系人被选中时获取聊天记录"""
-        contact = item.data(Qt.UserRole)
+        if self._applying_contact_delta:
+            return
+        contact = index.data(Qt.UserRole)
         if not contact:
             return
         
         self.selected_contact = contact  # 保存当前选中的联系人
-        self.load_chat_for_contact(contact)
+        self.schedule_chat_reload()
+    
+    def schedule_chat_reload(self):
+        """日期或联系人变化后重新加载聊天记录
+
+        立即取消正在进行的加载，等待 CHAT_RELOAD_DELAY_MS 内没有新的变化后再请求，
+        因此连续滚动日期或切换联系人只会发出最后一次请求。
+        """
+        if not self.selected_contact:
+            return
+        self.cancel_chat_fetch()
+        self.show_chat_message("正在加载聊天记录，请稍候...")
+        self.chat_reload_timer.start()
+    
+    def reload_chat(self):
+        """按当前选中的联系人和日期加载聊天记录"""
+        self.chat_reload_timer.stop()
+        if self.selected_contact:
+            self.load_chat_for_contact(self.selected_contact)
+    
+    def cancel_chat_fetch(self):
+        """停止正在进行的聊天记录请求，已发出但尚未处理的结果也会被丢弃"""
+        thread = self._active_fetch.get("chatlog")
+        if thread is not None:
+            thread.stop_request()
+        self._chat_request_id += 1
+        self.set_chat_loading(False)
     
     def load_chat_for_contact(self, contact):
-        """为指定联系人加载聊天记录"""
+        """为指定联系人加载聊天记录（后台线程）"""
         # 获取chatlog服务URL
         config = self.config_page.get_config()
-        chatlog_base_url = config.get('chatlog_service_url', 'http://127.0.0.1:5030/api/v1')
+        chatlog_base_url = config.get('chatlog_service_url', DEFAULT_CHATLOG_URL)
         
         # 显示加载状态
-        self.chat_display.setHtml("<p style='text-align:center; margin-top:50px;'><b>正在加载聊天记录，请稍候...</b></p>")
-        QApplication.processEvents()  # 立即更新UI
+        self.show_chat_message("正在加载聊天记录，请稍候...")
         
         # 构建日期范围参数
         start_date = self.start_date_edit.date().toString("yyyy-MM-dd")
         end_date = self.end_date_edit.date().toString("yyyy-MM-dd")
         
-        # 如果开始日期和结束日期相同，只传单个日期；否则传日期范围
-        if start_date == end_date:
-            date_param = start_date
-        else:
-            date_param = f"{start_date}~{end_date}"
-        
-        talker = urllib.parse.quote(contact.get('userName', ''))
-        
-        try:
-            url = f"{chatlog_base_url}/chatlog?time={date_param}&talker={talker}"
-            # 添加超时设置
-            response = requests.get(url, timeout=(5, 30))  # 连接超时5秒，读取超时30秒
-            
-            if response.status_code == 200:
-                # 获取聊天记录内容
-                chat_content = response.text
-                if not chat_content.strip():
-                    self.chat_display.setHtml("<p style='text-align:center; margin-top:50px;'><b>该日期没有聊天记录</b></p>")
-                else:
-                    # 检查返回内容是否为HTML格式
-                    if chat_content.strip().startswith('<') and 'html' in chat_content.lower():
-                        # 如果是HTML格式，直接设置HTML内容
-                        self.chat_display.setHtml(chat_content)
-                    else:
-                        # 如果是纯文本格式，保持原始格式显示
-                        self.chat_display.setPlainText(chat_content)
+        # 历史日期优先使用本地缓存
+        cache = get_chatlog_cache()
+        cache.max_bytes = config.get('chatlog_cache_max_mb', DEFAULT_CHATLOG_CACHE_MAX_MB) * 1024 * 1024
+        
+        self._chat_request_id += 1
+        self.set_chat_loading(True)
+        thread = ChatlogFetchThread(self._chat_request_id, chatlog_base_url,
+                                    contact.get('userName', ''), start_date, end_date, cache,
+                                    config.get('chatlog_fetch_concurrency', DEFAULT_CHATLOG_FETCH_CONCURRENCY))
+        thread.messages_signal.connect(self.on_chat_messages)
+        self._start_fetch_thread("chatlog", thread, self.on_chatlog_loaded, self.on_chatlog_error)
+    
+    def set_chat_loading(self, loading):
+        """切换聊天记录加载状态，加载中显示取消按钮"""
+        self._chat_loading = loading
+        if loading:
+            self._chat_incomplete = False
+        self.cancel_load_button.setVisible(loading)
+    
+    def cancel_chat_load(self):
+        """取消正在下载的聊天记录，保留已显示的部分"""
+        if not self._chat_loading:
+            return
+        self.cancel_chat_fetch()
+        if self.current_chatlog is None:
+            self.show_chat_message("已取消加载")
+            return
+        self._chat_incomplete = True
+        self.update_chat_count()
+    
+    def show_chat_message(self, text, error=False):
+        """在聊天记录区域显示提示信息，同时清除当前聊天记录，避免被用于总结"""
+        self.current_chatlog = None
+        self.displayed_chatlog = None
+        self.chat_count_label.clear()
+        self.chat_model.set_message(text, error)
+    
+    def on_chatlog_loaded(self, request_id, chatlog):
+        """聊天记录加载完成（已在后台线程中解析）"""
+        if request_id != self._chat_request_id:
+            return  # 已被新请求取代
+        
+        self.set_chat_loading(False)
+        if chatlog.is_empty():
+            self.show_chat_message("该日期没有聊天记录")
+            return
+        # 消息已经在下载过程中分批显示，这里只补充无法解析为消息的开头内容
+        if self.current_chatlog is None:
+            self.current_chatlog = ChatLog()
+            self.apply_chat_filter()
+        self.current_chatlog.preamble = chatlog.preamble
+        if not len(self.current_chatlog):
+            self.chat_model.set_message(chatlog.preamble)
+        self.update_chat_count()
+        if self._pending_hit is not None and self._pending_hit[0] == request_id:
+            self.scroll_to_hit(self._pending_hit[1])
+        self._pending_hit = None
+    
+    def on_chat_messages(self, request_id, messages):
+        """下载过程中新解析出的消息，追加到聊天记录末尾"""
+        if request_id != self._chat_request_id:
+            return
+        if self.current_chatlog is None:
+            self.current_chatlog = ChatLog(list(messages))
+            self.apply_chat_filter()
+            self.init_jump_time()
+            return
+        with tracer.span("chat.render", "ui", appended=len(messages)):
+            self.current_chatlog.messages.extend(messages)
+            if self.displayed_chatlog is not self.current_chatlog:
+                keyword, types = self.chat_filter_args()
+                self.displayed_chatlog.messages.extend(ChatLog(messages).filter(keyword, types=types).messages)
+            scroll_bar = self.chat_view.verticalScrollBar()
+            self.chat_model.messages_appended(at_bottom=scroll_bar.value() == scroll_bar.maximum())
+            self.update_chat_count()
+    
+    def init_jump_time(self):
+        """跳转时间默认为第一条消息的时间"""
+        chatlog = self.current_chatlog
+        first = chatlog.messages[0] if len(chatlog) else None
+        if first is not None and first.day:
+            day = first.day if len(first.day) > 5 else f"{self.start_date_edit.date().year()}-{first.day}"
+            jump_time = QDateTime.fromString(f"{day} {first.clock()}", "yyyy-MM-dd HH:mm:ss")
+            if jump_time.isValid():
+                self.jump_time_edit.setDateTime(jump_time)
+    
+    def apply_chat_filter(self):
+        """按筛选条件显示聊天记录"""
+        self.chat_filter_timer.stop()
+        if self.current_chatlog is None:
+            return
+        keyword, types = self.chat_filter_args()
+        with tracer.span("chat.render", "ui", messages=len(self.current_chatlog), filtered=bool(keyword or types)):
+            if keyword or types:
+                self.displayed_chatlog = self.current_chatlog.filter(keyword, types=types)
             else:
-                error_msg = f"获取聊天记录失败: {response.status_code}"
-                if hasattr(response, 'text'):
-                    error_msg += f" - {response.text}"
-                QMessageBox.warning(self, "错误", error_msg)
-                self.chat_display.setHtml("<p style='color:red; text-align:center; margin-top:50px;'><b>获取聊天记录失败</b></p>")
-        except requests.exceptions.Timeout:
+                self.displayed_chatlog = self.current_chatlog
+            self.chat_model.set_chatlog(self.displayed_chatlog)
+            self.chat_view.scrollToTop()
+            self.update_chat_count()
+    
+    def chat_filter_args(self):
+        """当前的筛选条件：(关键词, 消息类型)"""
+        keyword = self.chat_filter_input.text().strip()
+        types = (TYPE_TEXT, TYPE_MEDIA) if self.hide_noise_checkbox.isChecked() else None
+        return keyword, types
+    
+    def update_chat_count(self):
+        """显示消息条数和加载状态"""
+        if self.current_chatlog is None:
+            self.chat_count_label.clear()
+            return
+        total = len(self.current_chatlog)
+        shown = len(self.displayed_chatlog)
+        text = f"{shown}/{total} 条" if shown != total else f"共 {total} 条"
+        if self._chat_loading:
+            text += "，加载中..."
+        elif self._chat_incomplete:
+            text += "（已取消加载，记录不完整）"
+        self.chat_count_label.setText(text)
+    
+    def on_chat_scrolled(self, value):
+        """滚动到列表顶部时加载前一页消息"""
+        if value == self.chat_view.verticalScrollBar().minimum() and self.chat_model.can_fetch_previous():
+            self.chat_model.fetch_previous()
+    
+    def on_chat_rows_shifted(self, delta):
+        """列表开头插入或移除消息后保持当前看到的消息不动（逐条滚动时滚动条的值就是行号）"""
+        scroll_bar = self.chat_view.verticalScrollBar()
+        scroll_bar.setValue(scroll_bar.value() + delta)
+    
+    def jump_to_time(self):
+        """滚动到不早于指定时间的第一条消息"""
+        chatlog = self.displayed_chatlog
+        if chatlog is None or not len(chatlog):
+            return
+        target = self.jump_time_edit.dateTime()
+        self.scroll_to_message(chatlog.find_time(target.toString("yyyy-MM-dd"), target.toString("HH:mm:00")))
+    
+    def scroll_to_message(self, position):
+        """滚动到显示的聊天记录中第position条消息并选中"""
+        row = self.chat_model.row_for_position(position)
+        index = self.chat_model.index(row)
+        self.chat_view.scrollTo(index, QListView.PositionAtTop)
+        self.chat_view.setCurrentIndex(index)
+    
+    def copy_selected_messages(self):
+        """复制选中的消息（chatlog纯文本格式）"""
+        rows = sorted(index.row() for index in self.chat_view.selectionModel().selectedIndexes())
+        if rows:
+            QApplication.clipboard().setText("\n\n".join(self.chat_model.message_text(row) for row in rows))
+    
+    def on_chatlog_error(self, request_id, error_type, error_msg):
+        """聊天记录加载失败"""
+        if request_id != self._chat_request_id:
+            return
+        self.set_chat_loading(False)
+        
+        if error_type == "status":
+            QMessageBox.warning(self, "错误", f"获取聊天记录失败: {error_msg}")
+            self.show_chat_message("获取聊天记录失败", error=True)
+        elif error_type == "timeout":
             QMessageBox.warning(self, "超时", "获取聊天记录超时，请检查网络连接或稍后重试")
-            self.chat_display.setHtml("<p style='color:red; text-align:center; margin-top:50px;'><b>获取聊天记录超时</b></p>")
-        except requests.exceptions.ConnectionError:
+            self.show_chat_message("获取聊天记录超时", error=True)
+        elif error_type == "connection":
             QMessageBox.warning(self, "连接错误", "连接错误，请检查网络连接或chatlog服务是否正常运行")
-            self.chat_display.setHtml("<p style='color:red; text-align:center; margin-top:50px;'><b>连接错误，无法获取聊天记录</b></p>")
-        except Exception as e:
-            QMessageBox.critical(self, "错误", f"获取聊天记录时出错: {str(e)}")
-            self.chat_display.setHtml("<p style='color:red; text-align:center; margin-top:50px;'><b>获取聊天记录时出错</b></p>")
-        finally:
-            # 确保UI响应
-            QApplication.processEvents()
+            self.show_chat_message("连接错误，无法获取聊天记录", error=True)
+        else:
+            QMessageBox.critical(self, "错误", f"获取聊天记录时出错: {error_msg}")
+            self.show_chat_message("获取聊天记录时出错", error=True)
     
     def summarize_chat(self):
-        """使用DeepSeek API总结聊天记录"""
+        """使用DeepSeek API总结聊天记录，相同内容优先使用缓存结果"""
+        self.run_summary(use_cache=True)
+    
+    def regenerate_summary(self):
+        """忽略缓存，重新总结聊天记录"""
+        self.run_summary(use_cache=False)
+    
+    def set_summary_running(self, running):
+        """更新总结相关按钮的状态"""
+        self.summary_button.setEnabled(not running)
+        self.summary_button.setText("正在总结..." if running else "一键总结")
+        self.regenerate_button.setEnabled(not running)
+        self.stop_button.setVisible(running)
+    
+    def update_summary_cache_status(self, prefix):
+        """在总结结果下方显示缓存命中率"""
+        stats = get_summary_cache().stats()
+        lookups = stats['hits'] + stats['misses']
+        text = f"{prefix}（缓存命中率 {stats['hit_rate']:.0%}，命中 {stats['hits']}/{lookups} 次）"
+        if self._token_savings:
+            text += f"  {self._token_savings}"
+        if self._summary_usage:
+            text += f"  {format_usage(self._summary_usage)}"
+        self.summary_status_label.setText(text)
+    
+    def prepare_chat_content(self, config):
+        """检查能否总结并生成发送给DeepSeek的聊天记录文本，不能总结时提示并返回None"""
+        if not config.get('api_key'):
+            QMessageBox.warning(self, "配置错误", "请先在配置页面设置DeepSeek API密钥")
+            return None
+        
+        if self._chat_loading:
+            QMessageBox.warning(self, "提示", "聊天记录正在加载，请等待加载完成或取消加载后再总结")
+            return None
+        
+        # 使用解析后的聊天记录（按当前筛选条件），加载失败时为None
+        chatlog = self.displayed_chatlog
+        if chatlog is None or chatlog.is_empty():
+            QMessageBox.warning(self, "提示", "没有可总结的聊天记录")
+            return None
+        
+        # 发送前精简聊天记录
+        self._token_savings = ""
+        with tracer.span("summary.prepare", "summary", messages=len(chatlog)) as span:
+            if config.get('compact_transcript', DEFAULT_COMPACT_TRANSCRIPT):
+                chat_content, compact_stats = compact_chatlog(chatlog)
+                self._token_savings = format_token_savings(compact_stats)
+                print(f"{self._token_savings}，丢弃 {compact_stats['dropped']} 条，"
+                      f"合并 {compact_stats['collapsed']} 条，去重 {compact_stats['deduplicated']} 条")  # 调试信息
+            else:
+                chat_content = chatlog.to_text()
+            span.args["chars"] = len(chat_content)
+        return chat_content
+    
+    def run_summary(self, use_cache):
+        """总结聊天记录"""
         # 获取配置
         config = self.config_page.get_config()
         api_key = config.get('api_key')
         api_url = config.get('api_url')
         model = config.get('model')
         
-        if not api_key:
-            QMessageBox.warning(self, "配置错误", "请先在配置页面设置DeepSeek API密钥")
-            return
-        
-        # 获取聊天内容
-        chat_content = self.chat_display.toPlainText()
-        if not chat_content:
-            QMessageBox.warning(self, "提示", "没有可总结的聊天记录")
-            return
-        
-        # 检查聊天内容是否为错误提示
-        if "正在加载聊天记录" in chat_content or "获取聊天记录失败" in chat_content or "获取聊天记录时出错" in chat_content:
-            QMessageBox.warning(self, "提示", "当前显示的不是有效的聊天记录，无法进行总结")
+        chat_content = self.prepare_chat_content(config)
+        if chat_content is None:
             return
         
         # 获取提示词
         prompt = self.current_prompt_display.toPlainText()
         
-        # 准备消息
-        messages = [
-            {"role": "system", "content": "你是一个专业的聊天记录总结助手，擅长提取关键信息并进行简洁总结。使用纯文本格式，不要使用markdown格式。"},
-            {"role": "user", "content": f"{prompt}\n\n{chat_content}"}
-        ]
-        
         # 清空之前的总结
-        self.summary_display.clear()
+        self.reset_summary_display()
+        self.summary_status_label.setText(self._token_savings)
+        self._summary_usage = {}
+        
+        # 查询总结缓存
+        summary_cache = get_summary_cache()
+        summary_cache.max_bytes = config.get('summary_cache_max_mb', DEFAULT_SUMMARY_CACHE_MAX_MB) * 1024 * 1024
+        summary_cache.max_age_days = config.get('summary_cache_max_days', DEFAULT_SUMMARY_CACHE_MAX_DAYS)
+        summary_key = make_summary_key(chat_content, prompt, SYSTEM_PROMPT, model)
+        if use_cache:
+            cached_summary = summary_cache.get(summary_key)
+            if cached_summary is not None:
+                self.summary_display.setPlainText(cached_summary)
+                self.update_summary_cache_status("结果来自缓存")
+                return
+        
+        # 发送前估算token数、费用和耗时，超出费用预算时需要确认
+        with tracer.span("summary.preflight", "summary", chars=len(chat_content)):
+            estimate = estimate_summary(prompt, chat_content, config)
+        estimate_text = format_estimate(estimate)
+        print(estimate_text)  # 调试信息
+        self.summary_status_label.setText(f"{self._token_savings}  {estimate_text}".strip())
+        budget = over_budget(estimate, config)
+        if budget is not None:
+            reply = QMessageBox.question(
+                self, "超出费用预算",
+                f"{estimate_text}\n\n预计费用超出预算 ¥{budget:.2f}，是否继续总结？",
+                QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
+            if reply != QMessageBox.Yes:
+                return
+        self._pending_summary = (summary_key, model)
+        self._summary_parts = []
+        # 从发出请求到总结完成的整体耗时，在完成、出错或停止时结束
+        self._summary_span = tracer.begin("summary", "summary", model=model,
+                                          input_tokens=estimate["input_tokens"], chunked=estimate["chunked"])
         
         try:
-            # 创建并启动线程
-            self.deepseek_thread = DeepSeekThread(api_key, api_url, model, messages)
+            # 创建并启动线程，超出token预算时分段总结
+            max_tokens = config.get('chunk_token_budget', DEFAULT_CHUNK_TOKEN_BUDGET)
+            if needs_chunking(prompt, chat_content, max_tokens):
+                self.deepseek_thread = MapReduceSummaryThread(
+                    api_key, api_url, model, prompt, chat_content, max_tokens,
+                    config.get('max_concurrency', DEFAULT_MAX_CONCURRENCY)
+                )
+                self.deepseek_thread.progress_signal.connect(self.on_summary_progress)
+            else:
+                with tracer.span("summary.build_request", "summary"):
+                    messages = build_messages(prompt, chat_content)
+                self.deepseek_thread = DeepSeekThread(api_key, api_url, model, messages)
             self.deepseek_thread.update_signal.connect(self.update_summary)
+            self.deepseek_thread.usage_signal.connect(self.on_summary_usage)
             self.deepseek_thread.finished_signal.connect(self.on_summary_finished)
             self.deepseek_thread.error_signal.connect(self.on_summary_error)
             self.deepseek_thread.start()
             
             # 更新按钮状态
-            self.summary_button.setEnabled(False)
-            self.summary_button.setText("正在总结...")
-            self.stop_button.setVisible(True)
+            self.set_summary_running(True)
         except Exception as e:
             QMessageBox.critical(self, "错误", f"启动总结线程时出错: {str(e)}")
-            self.summary_button.setEnabled(True)
-            self.summary_button.setText("一键总结")
-            self.stop_button.setVisible(False)
+            self._pending_summary = None
+            self.finish_summary_span(error=str(e))
+            self.set_summary_running(False)
+    
+    def on_summary_progress(self, stage, done, total):
+        """分段总结的进度，最终合并开始前在总结结果区域显示进度"""
+        if stage == "final":
+            self.reset_summary_display()
+            self.summary_button.setText("正在合并总结...")
+            return
+        
+        if stage == "map":
+            progress_text = f"聊天记录较长，已切分为 {total} 段并行总结：已完成 {done}/{total}"
+        else:
+            progress_text = f"正在合并分段总结：已完成 {done}/{total}"
+        self.summary_display.setPlainText(progress_text)
+        self.summary_button.setText(f"正在总结 {done}/{total}...")
+    
+    def on_summary_usage(self, usage):
+        """累计API返回的token用量，总结完成后显示在总结结果下方"""
+        merge_usage(self._summary_usage, usage)
+        print(f"DeepSeek用量: {format_usage(usage)}")  # 调试信息
     
     def update_summary(self, text):
-        """更新总结内容（打字机效果）"""
-        # 纯文本模式
-        current_text = self.summary_display.toPlainText()
-        self.summary_display.setPlainText(current_text + text)
+        """更新总结内容（打字机效果），token先进入缓冲区，由定时器批量追加"""
+        self._summary_buffer.append(text)
+        self._summary_parts.append(text)
+        if not self.summary_flush_timer.isActive():
+            self.summary_flush_timer.start()
+    
+    def flush_summary_buffer(self):
+        """将缓冲区中的文本追加到总结结果末尾"""
+        if not self._summary_buffer:
+            self.summary_flush_timer.stop()
+            return
+        
+        text = "".join(self._summary_buffer)
+        self._summary_buffer.clear()
+        
+        # 只在文档末尾插入新文本，避免整篇文档复制和重新排版
+        cursor = QTextCursor(self.summary_display.document())
+        cursor.movePosition(QTextCursor.End)
+        cursor.insertText(text)
         
         # 滚动到底部
         self.summary_display.verticalScrollBar().setValue(
             self.summary_display.verticalScrollBar().maximum()
         )
     
+    def reset_summary_display(self):
+        """清空总结结果和未刷新的缓冲"""
+        self.summary_flush_timer.stop()
+        self._summary_buffer.clear()
+        self.summary_display.clear()
+    
+    def finish_summary_span(self, **args):
+        """结束本次总结的整体耗时span"""
+        if self._summary_span is not None:
+            tracer.finish(self._summary_span, output_chars=sum(len(text) for text in self._summary_parts), **args)
+            self._summary_span = None
+    
     def on_summary_finished(self):
         """总结完成时的处理"""
-        self.summary_button.setEnabled(True)
-        self.summary_button.setText("一键总结")
-        self.stop_button.setVisible(False)
+        self.flush_summary_buffer()
+        self.finish_summary_span()
+        self.set_summary_running(False)
+        
+        # 写入总结缓存
+        if self._pending_summary and self._summary_parts:
+            summary_key, model = self._pending_summary
+            try:
+                get_summary_cache().put(summary_key, model, "".join(self._summary_parts))
+                self.update_summary_cache_status("总结结果已缓存")
+            except Exception as e:
+                print(f"写入总结缓存失败: {str(e)}")
+        self._pending_summary = None
     
     def on_summary_error(self, error_msg):
         """处理总结过程中的错误"""
+        self.flush_summary_buffer()
+        self._pending_summary = None
+        self.finish_summary_span(error=error_msg)
         QMessageBox.critical(self, "总结错误", error_msg)
-        self.summary_button.setEnabled(True)
-        self.summary_button.setText("一键总结")
-        self.stop_button.setVisible(False)
+        self.set_summary_running(False)
 
     def select_prompt(self):
         """打开提示词选择对话框"""
@@ -1028,10 +1373,97 @@ class SummaryPage(QWidget):
             self.current_prompt = dialog.get_selected_prompt()
             self.current_prompt_display.setPlainText(self.current_prompt)
 
+    def open_batch_dialog(self):
+        """打开批量总结对话框"""
+        if len(self.all_contacts) == 0:
+            QMessageBox.warning(self, "提示", "联系人列表尚未加载，请稍后再试")
+            return
+        dialog = BatchSummaryDialog(self, self.all_contacts, self.contact_index, self.current_prompt,
+                                    self.config_page.get_config(),
+                                    self.start_date_edit.date(), self.end_date_edit.date())
+        dialog.exec_()
+    
+    def open_multi_prompt_dialog(self):
+        """打开多提示词总结对话框，聊天记录只精简一次，所有提示词共用"""
+        config = self.config_page.get_config()
+        chat_content = self.prepare_chat_content(config)
+        if chat_content is None:
+            return
+        dialog = MultiPromptDialog(self, chat_content, config,
+                                   self.current_prompt_display.toPlainText(), self._token_savings)
+        dialog.exec_()
+    
+    def open_search_dialog(self):
+        """打开全文搜索对话框（非模态，可以边搜索边查看聊天记录）"""
+        if self.search_dialog is None:
+            self.search_dialog = ChatSearchDialog(self)
+            self.search_dialog.hit_activated.connect(self.open_search_hit)
+            self.search_dialog.summarize_requested.connect(self.summarize_search_results)
+        talker = self.selected_contact.get('userName') if self.selected_contact else None
+        self.search_dialog.set_contacts(self.all_contacts, talker)
+        self.search_dialog.show()
+        self.search_dialog.raise_()
+        self.search_dialog.activateWindow()
+        self.search_dialog.sync_index()
+    
+    def open_search_hit(self, hit):
+        """加载搜索结果所在联系人当天的聊天记录，加载完成后跳转到该消息"""
+        try:
+            contact = self.all_contacts.contact(self.all_contacts.user_names.index(hit.talker))
+        except ValueError:
+            contact = {'userName': hit.talker, 'nickName': '', 'remark': ''}
+        day = QDate.fromString(hit.day, "yyyy-MM-dd")
+        # 直接加载，不经过日期变化的延迟加载
+        for date_edit in (self.start_date_edit, self.end_date_edit):
+            date_edit.blockSignals(True)
+            date_edit.setDate(day)
+            date_edit.blockSignals(False)
+        # 清除筛选条件，保证匹配的消息会显示出来
+        self.chat_filter_input.clear()
+        self.chat_filter_timer.stop()
+        self.selected_contact = contact
+        self.chat_reload_timer.stop()
+        self.cancel_chat_fetch()
+        self.load_chat_for_contact(contact)
+        self._pending_hit = (self._chat_request_id, hit)
+    
+    def scroll_to_hit(self, hit):
+        """跳转到搜索结果对应的消息：优先按序号定位，聊天记录有变化时按时间和内容查找"""
+        chatlog = self.current_chatlog
+        if chatlog is None or not len(chatlog):
+            return
+        messages = chatlog.messages
+        if hit.seq < len(messages) and (messages[hit.seq].clock(), messages[hit.seq].content) == (hit.clock, hit.content):
+            target = messages[hit.seq]
+        else:
+            target = next((message for message in messages
+                           if message.clock() == hit.clock and message.content == hit.content), None)
+        displayed = self.displayed_chatlog
+        if target is not None and target in displayed.messages:
+            position = displayed.messages.index(target)
+        else:
+            position = displayed.find_time(hit.day, hit.clock)
+        self.scroll_to_message(position)
+    
+    def summarize_search_results(self, chatlog, description):
+        """把全文搜索的结果作为聊天记录显示并总结"""
+        self.chat_reload_timer.stop()
+        self.cancel_chat_fetch()
+        self._pending_hit = None
+        self.selected_contact = None
+        self.contact_list.clearSelection()
+        self.chat_filter_input.clear()
+        self.chat_filter_timer.stop()
+        self.current_chatlog = chatlog
+        self.apply_chat_filter()
+        self.chat_count_label.setText(f"{description}，共 {len(chatlog)} 条")
+        self.summarize_chat()
+    
     def stop_summary(self):
         """停止总结"""
         if self.deepseek_thread:
             self.deepseek_thread.stop_request()
-            self.stop_button.setVisible(False)
-            self.summary_button.setEnabled(True)
-            self.summary_button.setText("一键总结")
\ No newline at end of file
+            self.flush_summary_buffer()
+            self._pending_summary = None
+            self.finish_summary_span(stopped=True)
+            self.set_summary_running(False)
\ No newline at end of file
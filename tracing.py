@@ -0,0 +1,148 @@
+import json
+import os
+import threading
+import time
+from collections import deque
+
+# 环形缓冲区保留的最近span数
+TRACE_BUFFER_SIZE = 5000
+
+
+class Span:
+    """一次耗时操作的记录，args 保存附加信息（如token数、消息数）"""
+    __slots__ = ("name", "category", "start", "duration", "thread_id", "thread_name", "args")
+
+    def __init__(self, name, category, start, thread_id, thread_name, args):
+        self.name = name
+        self.category = category
+        self.start = start  # 相对于 Tracer 创建时间的秒数
+        self.duration = 0.0
+        self.thread_id = thread_id
+        self.thread_name = thread_name
+        self.args = args
+
+
+class _SpanContext:
+    def __init__(self, tracer, span):
+        self._tracer = tracer
+        self.span = span
+
+    def __enter__(self):
+        return self.span
+
+    def __exit__(self, exc_type, exc, tb):
+        # 生成器被提前关闭（调用方停止迭代）不算出错
+        if exc_type is not None and not issubclass(exc_type, GeneratorExit):
+            self.span.args["error"] = f"{exc_type.__name__}: {exc}"
+        self._tracer.finish(self.span)
+        return False
+
+
+class Tracer:
+    """轻量级耗时追踪：记录各操作的span到环形缓冲区，可导出为Chrome trace JSON
+
+    用法：
+        with tracer.span("chatlog.fetch", "chatlog", talker=talker) as span:
+            ...
+            span.args["messages"] = len(messages)
+
+    线程安全，记录一个span只有几微秒开销，可以在任意线程中使用。
+    """
+
+    def __init__(self, max_spans=TRACE_BUFFER_SIZE):
+        self._lock = threading.Lock()
+        self._spans = deque(maxlen=max_spans)
+        self._origin = time.perf_counter()
+
+    def now(self):
+        """相对于 Tracer 创建时间的秒数"""
+        return time.perf_counter() - self._origin
+
+    def begin(self, name, category="", **args):
+        """开始一个span，需要调用 finish() 结束，适合开始和结束不在同一个函数中的操作"""
+        thread = threading.current_thread()
+        return Span(name, category, self.now(), thread.ident, thread.name, args)
+
+    def finish(self, span, **args):
+        """结束span并记录到缓冲区"""
+        span.duration = self.now() - span.start
+        span.args.update(args)
+        with self._lock:
+            self._spans.append(span)
+        return span
+
+    def span(self, name, category="", **args):
+        """以 with 语句记录一个span"""
+        return _SpanContext(self, self.begin(name, category, **args))
+
+    def add(self, name, category, start, duration, **args):
+        """直接记录一个已知起止时间的span（start为 now() 返回的时间）"""
+        thread = threading.current_thread()
+        span = Span(name, category, start, thread.ident, thread.name, args)
+        span.duration = duration
+        with self._lock:
+            self._spans.append(span)
+        return span
+
+    def spans(self):
+        """按开始时间排序的全部span"""
+        with self._lock:
+            spans = list(self._spans)
+        spans.sort(key=lambda span: span.start)
+        return spans
+
+    def clear(self):
+        with self._lock:
+            self._spans.clear()
+
+    def summary(self):
+        """按名称汇总：次数、平均、P95和最大耗时（秒），按总耗时降序"""
+        groups = {}
+        for span in self.spans():
+            groups.setdefault(span.name, []).append(span.duration)
+        rows = []
+        for name, durations in groups.items():
+            durations.sort()
+            rows.append({
+                "name": name,
+                "count": len(durations),
+                "total": sum(durations),
+                "avg": sum(durations) / len(durations),
+                "p95": durations[min(len(durations) - 1, int(len(durations) * 0.95))],
+                "max": durations[-1],
+            })
+        rows.sort(key=lambda row: row["total"], reverse=True)
+        return rows
+
+    def to_chrome_trace(self):
+        """转换为Chrome trace格式（chrome://tracing 或 Perfetto 可以打开）"""
+        pid = os.getpid()
+        events = []
+        threads = {}
+        for span in self.spans():
+            threads.setdefault(span.thread_id, span.thread_name)
+            events.append({
+                "name": span.name,
+                "cat": span.category,
+                "ph": "X",
+                "ts": round(span.start * 1_000_000, 1),
+                "dur": round(span.duration * 1_000_000, 1),
+                "pid": pid,
+                "tid": span.thread_id,
+                "args": {key: value if isinstance(value, (int, float, bool)) else str(value)
+                         for key, value in span.args.items()},
+            })
+        for thread_id, thread_name in threads.items():
+            events.append({"name": "thread_name", "ph": "M", "pid": pid, "tid": thread_id,
+                           "args": {"name": thread_name}})
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def export_chrome_trace(self, path):
+        """导出Chrome trace JSON文件，返回导出的span数"""
+        trace = self.to_chrome_trace()
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(trace, f, ensure_ascii=False)
+        return sum(1 for event in trace["traceEvents"] if event["ph"] == "X")
+
+
+tracer = Tracer()
@@ -0,0 +1,368 @@
+import time
+
+import requests
+from PyQt5.QtCore import QThread, pyqtSignal
+
+import chatlog_client
+import deepseek_client
+from chatlog_client import ChatlogServiceError
+from deepseek_client import DeepSeekAPIError, StreamInterruptedError
+from batch_summary import BatchSummaryJob
+from chat_parser import ChatLogParser, is_html, parse_chatlog
+from contact_cache import get_contact_cache
+from contact_index import ContactIndex, ContactStore, diff_contacts
+from map_reduce import MapReduceSummarizer
+from tracing import tracer
+
+
+def classify_error(error):
+    """将请求异常归类为 timeout / connection / status / error"""
+    if isinstance(error, requests.exceptions.Timeout):
+        return "timeout"
+    if isinstance(error, requests.exceptions.ConnectionError):
+        return "connection"
+    if isinstance(error, ChatlogServiceError):
+        return "status"
+    return "error"
+
+
+def summary_error_message(error):
+    """将总结请求中的异常转换为提示信息"""
+    if isinstance(error, DeepSeekAPIError):
+        return str(error)
+    if isinstance(error, StreamInterruptedError):
+        return "DeepSeek响应多次中断，请检查网络连接或稍后重试"
+    if isinstance(error, requests.exceptions.Timeout):
+        return "API请求超时，请检查网络连接或稍后重试"
+    if isinstance(error, requests.exceptions.ConnectionError):
+        return "连接错误，请检查网络连接或API地址是否正确"
+    return f"处理请求时出错: {str(error)}"
+
+
+class FetchThread(QThread):
+    """在后台请求chatlog服务的线程基类
+
+    每个请求带有编号，界面只处理最新编号的结果；被取代的线程调用
+    stop_request() 后不再发出任何信号。
+    """
+    result_signal = pyqtSignal(int, object)  # 请求编号, 结果
+    error_signal = pyqtSignal(int, str, str)  # 请求编号, 错误类型, 错误信息
+
+    def __init__(self, request_id):
+        super().__init__()
+        self.request_id = request_id
+        self._stop_requested = False
+
+    def stop_request(self):
+        """请求停止线程（结果将被丢弃）"""
+        self._stop_requested = True
+
+    def fetch(self):
+        raise NotImplementedError
+
+    def run(self):
+        if self._stop_requested:
+            return
+        try:
+            result = self.fetch()
+        except Exception as e:
+            if not self._stop_requested:
+                self.error_signal.emit(self.request_id, classify_error(e), str(e))
+            return
+        if not self._stop_requested:
+            self.result_signal.emit(self.request_id, result)
+
+
+class ContactFetchThread(FetchThread):
+    """获取联系人列表的线程
+
+    use_snapshot 为True时（加载全部联系人），先通过 snapshot_signal 发出本地保存的联系人快照，
+    界面可以立即显示。有快照或传入了界面当前显示的全部联系人 base 时，结果是最新列表相对于它们的
+    ContactDelta，界面只更新变化的联系人；否则结果是完整的 ContactStore。
+    加载全部联系人时，快照只写入变化的部分。
+    """
+    snapshot_signal = pyqtSignal(int, object)  # 请求编号, 联系人快照(ContactStore)
+
+    def __init__(self, request_id, base_url, keyword="", use_snapshot=False, base=None):
+        super().__init__(request_id)
+        self.base_url = base_url
+        self.keyword = keyword
+        self.use_snapshot = use_snapshot and not keyword
+        self.base = base if not keyword else None
+
+    def _load_snapshot(self):
+        try:
+            with tracer.span("contacts.snapshot_load", "contacts") as span:
+                store, saved_at = get_contact_cache().load(self.base_url)
+                span.args["contacts"] = len(store) if store is not None else 0
+        except Exception as e:
+            print(f"读取联系人快照失败: {str(e)}")  # 调试信息
+            return None
+        if store is not None and not self._stop_requested:
+            print(f"显示联系人快照: {len(store)} 个联系人，"
+                  f"保存于 {time.strftime('%Y-%m-%d %H:%M', time.localtime(saved_at))}")  # 调试信息
+            self.snapshot_signal.emit(self.request_id, store)
+        return store
+
+    def _save_snapshot(self, store, delta):
+        try:
+            with tracer.span("contacts.snapshot_save", "contacts", contacts=len(store)) as span:
+                cache = get_contact_cache()
+                if delta is not None and cache.apply_delta(self.base_url, delta, len(store)):
+                    span.args["delta"] = delta.describe()
+                else:
+                    cache.save(self.base_url, store)
+        except Exception as e:
+            print(f"保存联系人快照失败: {str(e)}")  # 调试信息
+
+    def fetch(self):
+        base = self.base
+        if self.use_snapshot:
+            snapshot = self._load_snapshot()
+            if snapshot is not None:
+                base = snapshot
+        # 在后台线程中转换为按列存储，界面线程不再处理原始字典列表
+        with tracer.span("contacts.load", "contacts", keyword=self.keyword) as span:
+            store = ContactStore(chatlog_client.fetch_contacts(self.base_url, self.keyword))
+            span.args["contacts"] = len(store)
+        if self.keyword or self._stop_requested:
+            return store
+
+        # 快照按微信号唯一保存，内存中的列表同样去重，二者的行号保持一致
+        store = store.unique()
+        delta = None
+        if base is not None:
+            with tracer.span("contacts.diff", "contacts") as span:
+                delta = diff_contacts(base, store)
+                span.args["delta"] = delta.describe()
+        self._save_snapshot(store, delta)
+        return delta if delta is not None else store
+
+
+class ChatlogFetchThread(FetchThread):
+    """流式获取聊天记录并解析为ChatLog的线程
+
+    下载过程中通过 messages_signal 分批发出新解析出的消息，界面可以立即显示；
+    全部下载完成后通过 result_signal 发出完整的ChatLog。
+    """
+    messages_signal = pyqtSignal(int, object)  # 请求编号, 新消息列表
+
+    # 两次发出新消息之间的最短间隔（秒），避免每个网络分块都触发界面更新
+    EMIT_INTERVAL = 0.1
+
+    def __init__(self, request_id, base_url, talker, start_date, end_date, cache=None, max_workers=1):
+        super().__init__(request_id)
+        self.base_url = base_url
+        self.talker = talker
+        self.start_date = start_date
+        self.end_date = end_date
+        self.cache = cache
+        self.max_workers = max_workers  # 多天时并行下载的分片数
+
+    def _emit_messages(self, messages, emitted):
+        if len(messages) > emitted and not self._stop_requested:
+            self.messages_signal.emit(self.request_id, messages[emitted:])
+        return len(messages)
+
+    def fetch(self):
+        with tracer.span("chatlog.fetch", "chatlog", talker=self.talker,
+                         start=self.start_date, end=self.end_date) as span:
+            chatlog = self._fetch(span)
+            if chatlog is not None:
+                span.args["messages"] = len(chatlog)
+            return chatlog
+
+    def _fetch(self, span):
+        parser = ChatLogParser()
+        html_parts = None  # HTML格式无法逐行解析，下载完成后整体转换
+        emitted = 0
+        last_emit = 0.0
+        chars = 0
+        # 解析与下载交替进行，累计解析耗时，结束时记录为一个span
+        parse_start = None
+        parse_time = 0.0
+        for text in chatlog_client.iter_chatlog(self.base_url, self.talker, self.start_date,
+                                                self.end_date, self.cache,
+                                                should_stop=lambda: self._stop_requested,
+                                                max_workers=self.max_workers):
+            if not chars:
+                span.args["first_chunk_ms"] = round((tracer.now() - span.start) * 1000, 1)
+            chars += len(text)
+            if html_parts is not None:
+                html_parts.append(text)
+                continue
+            if not len(parser.chatlog) and is_html(text):
+                html_parts = [text]
+                continue
+            started = tracer.now()
+            if parse_start is None:
+                parse_start = started
+            messages = parser.feed(text).messages
+            parse_time += tracer.now() - started
+            now = time.monotonic()
+            if now - last_emit >= self.EMIT_INTERVAL:
+                emitted = self._emit_messages(messages, emitted)
+                last_emit = now
+        span.args["chars"] = chars
+        if self._stop_requested:
+            return None
+
+        if html_parts is not None:
+            with tracer.span("chatlog.parse", "chatlog", format="html"):
+                chatlog = parse_chatlog("".join(html_parts))
+        else:
+            started = tracer.now()
+            chatlog = parser.close()
+            parse_time += tracer.now() - started
+            tracer.add("chatlog.parse", "chatlog", parse_start if parse_start is not None else started,
+                       parse_time, messages=len(chatlog), note="下载过程中各次解析的累计耗时")
+        self._emit_messages(chatlog.messages, emitted)
+        return chatlog
+
+
+class ContactIndexThread(QThread):
+    """在后台为联系人列表建立搜索索引"""
+    index_ready = pyqtSignal(int, object)  # 版本号, ContactIndex
+    
+    def __init__(self, version, store):
+        super().__init__()
+        self.version = version
+        self.store = store
+    
+    def run(self):
+        with tracer.span("contacts.index", "contacts", contacts=len(self.store)):
+            index = ContactIndex(self.store)
+        self.index_ready.emit(self.version, index)
+
+
+class SearchIndexSyncThread(QThread):
+    """在后台按聊天记录缓存增量更新全文索引"""
+    progress_signal = pyqtSignal(int, int)  # 已索引天数, 需要索引的天数
+    finished_signal = pyqtSignal(object)  # sync() 返回的统计
+    error_signal = pyqtSignal(str)
+
+    def __init__(self, index, cache):
+        super().__init__()
+        self.index = index
+        self.cache = cache
+        self._stop_requested = False
+
+    def stop_request(self):
+        """请求停止线程，已索引的日期会保留，下次同步时继续"""
+        self._stop_requested = True
+
+    def run(self):
+        try:
+            result = self.index.sync(self.cache, should_stop=lambda: self._stop_requested,
+                                     on_progress=self.progress_signal.emit)
+        except Exception as e:
+            self.error_signal.emit(f"更新全文索引出错: {str(e)}")
+            return
+        self.finished_signal.emit(result)
+
+
+class DeepSeekThread(QThread):
+    """处理DeepSeek API请求的线程"""
+    update_signal = pyqtSignal(str)
+    usage_signal = pyqtSignal(object)  # API返回的token用量
+    finished_signal = pyqtSignal()
+    error_signal = pyqtSignal(str)
+    
+    def __init__(self, api_key, api_url, model, messages):
+        super().__init__()
+        self.api_key = api_key
+        self.api_url = api_url
+        self.model = model
+        self.messages = messages
+        self._stop_requested = False  # 添加停止标志
+    
+    def stop_request(self):
+        """请求停止线程"""
+        self._stop_requested = True
+    
+    def run(self):
+        try:
+            # 检查是否已请求停止
+            if self._stop_requested:
+                return
+            
+            # 使用流式API，停止请求时关闭连接
+            for content in deepseek_client.stream_chat_completion(
+                    self.api_key, self.api_url, self.model, self.messages,
+                    should_stop=lambda: self._stop_requested,
+                    on_usage=self.usage_signal.emit):
+                self.update_signal.emit(content)
+            
+            # 只有在没有被停止的情况下才发出完成信号
+            if not self._stop_requested:
+                self.finished_signal.emit()
+        except Exception as e:
+            if not self._stop_requested:
+                self.error_signal.emit(summary_error_message(e))
+
+
+class MapReduceSummaryThread(QThread):
+    """超长聊天记录的分段总结线程：分段并行总结后合并，最终结果流式输出"""
+    update_signal = pyqtSignal(str)
+    progress_signal = pyqtSignal(str, int, int)  # 阶段, 已完成数, 总数
+    usage_signal = pyqtSignal(object)  # 每次请求返回的token用量
+    finished_signal = pyqtSignal()
+    error_signal = pyqtSignal(str)
+    
+    def __init__(self, api_key, api_url, model, prompt, chat_content, max_tokens, max_workers):
+        super().__init__()
+        self.prompt = prompt
+        self.chat_content = chat_content
+        self._stop_requested = False
+        self.summarizer = MapReduceSummarizer(
+            api_key, api_url, model, max_tokens, max_workers,
+            on_progress=self.progress_signal.emit,
+            on_token=self.update_signal.emit,
+            should_stop=lambda: self._stop_requested,
+            on_usage=self.usage_signal.emit
+        )
+    
+    def stop_request(self):
+        """请求停止线程"""
+        self._stop_requested = True
+    
+    def run(self):
+        try:
+            if self._stop_requested:
+                return
+            result = self.summarizer.summarize(self.prompt, self.chat_content)
+            if result is not None and not self._stop_requested:
+                self.finished_signal.emit()
+        except Exception as e:
+            if not self._stop_requested:
+                self.error_signal.emit(summary_error_message(e))
+
+
+class BatchSummaryThread(QThread):
+    """批量总结线程"""
+    item_updated = pyqtSignal(int, object)  # 序号, BatchItem
+    finished_signal = pyqtSignal()
+    error_signal = pyqtSignal(str)
+    
+    def __init__(self, items, start_date, end_date, prompt, config, output_dir,
+                 chatlog_cache=None, summary_cache=None):
+        super().__init__()
+        self._stop_requested = False
+        self.job = BatchSummaryJob(
+            items, start_date, end_date, prompt, config, output_dir,
+            on_update=self.item_updated.emit,
+            should_stop=lambda: self._stop_requested,
+            chatlog_cache=chatlog_cache,
+            summary_cache=summary_cache
+        )
+    
+    def stop_request(self):
+        """请求停止线程，已开始的请求完成后不再开始新的总结"""
+        self._stop_requested = True
+    
+    def run(self):
+        try:
+            self.job.run()
+            self.finished_signal.emit()
+        except Exception as e:
+            self.error_signal.emit(f"批量总结出错: {str(e)}")